@@ -0,0 +1,115 @@
+"""Microbenchmark for IntentDetector.detect on long message bodies.
+
+Run from the repo root:
+
+    python -m benchmarks.bench_intents --messages 200 --words 5000
+"""
+import argparse
+import random
+import re
+import time
+from typing import List
+
+from email_behavior_detection.intents import DetectedIntent, IntentDetector
+from email_behavior_detection.models import Message
+
+
+_FILLER = (
+    "hi team thanks for the update regarding the corporate stay plan we reviewed the "
+    "proposal with our manager and will share feedback on dates rooms and the schedule "
+    "for next quarter kind regards front desk sunrise hotel"
+).split()
+
+_PHRASES = [
+    "Interested.", "Please share the pricing?", "breakfast and Wi-Fi", "Adding Arun from our team.",
+    "Please confirm your billing contact name and email.", "Please proceed.", "Please pause reminders.",
+    "Not interested, thanks.", "I'm out of office until Monday.", "write to sales@sunrisehotel.com",
+]
+
+
+def _legacy_detect(detector: IntentDetector, msg: Message) -> List[DetectedIntent]:
+    # Per-call re.search implementation that the compiled scanner replaced.
+    text = f"{msg.from_name}\n{msg.body}".lower()
+    intents: List[DetectedIntent] = []
+
+    def add(name: str, conf: float, ev: str):
+        intents.append(DetectedIntent(name=name, confidence=conf, evidence=ev))
+
+    if re.search(r"out of office|ooo|auto[- ]?reply|vacation responder", text):
+        add("auto_reply_ooo", 0.95, "OOO/auto-reply patterns")
+    if re.search(r"write to|contact|reach (out )?to", text) and re.search(r"@", text):
+        add("redirect", 0.7, "Mentions contacting another email")
+    if re.search(r"interested|sounds good|please proceed|go ahead", text):
+        add("interest", 0.7, "Interest keywords")
+    if re.search(r"price|pricing|rate|cost", text):
+        add("ask_pricing", 0.65, "Price keywords")
+    if re.search(r"breakfast|wi[- ]?fi|late checkout|late check[- ]?out", text):
+        add("ask_inclusions", 0.6, "Inclusion keywords")
+    if re.search(r"adding|cc'ing|ccing|looping|include|add (.+?) from our team", text):
+        add("add_teammate", 0.6, "Add teammate phrasing")
+    if re.search(r"billing|invoice|bill to|payment details", text) and re.search(r"confirm|provide|name|email", text):
+        add("ask_billing_info", 0.75, "Billing info request")
+    if re.search(r"please proceed|we aim to confirm|confirm by|let's move forward|go ahead", text):
+        add("proceed", 0.7, "Proceed phrasing")
+    if re.search(r"pause reminders|stop reminders|hold off|we'll reply", text):
+        add("pause_reminders", 0.8, "Pause reminders phrasing")
+    if re.search(r"not interested|no thanks|pass for now", text):
+        add("not_interested", 0.9, "Not interested phrasing")
+    if re.search(r"\?", msg.body):
+        add("question", 0.4, "Contains question mark")
+    from_domain = msg.from_email.split("@")[-1].lower() if "@" in msg.from_email else ""
+    if msg.from_email.lower() in detector.team_addresses or from_domain in detector.team_domains:
+        add("from_internal_team", 1.0, "Sender is internal")
+    return intents
+
+
+def _corpus(n: int, words: int, seed: int) -> List[Message]:
+    rng = random.Random(seed)
+    msgs = []
+    for _ in range(n):
+        tokens = [rng.choice(_FILLER) for _ in range(words)]
+        for phrase in rng.sample(_PHRASES, 2):
+            tokens.insert(rng.randrange(len(tokens) + 1), phrase)
+        msgs.append(Message(
+            timestamp="",
+            from_name="Sales (Ananya)",
+            from_email="ananya@sunrisehotel.com",
+            to=["reply-team@yourcompany.com"],
+            cc=[],
+            body=" ".join(tokens),
+        ))
+    return msgs
+
+
+def _rate(fn, msgs: List[Message], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for m in msgs:
+            fn(m)
+        best = min(best, time.perf_counter() - start)
+    return len(msgs) / best
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="IntentDetector microbenchmark")
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--words", type=int, default=5000, help="Words per message body")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    detector = IntentDetector(rules={}, team_domains=["yourcompany.com"], team_addresses=["reply-team@yourcompany.com"])
+    msgs = _corpus(args.messages, args.words, args.seed)
+    for m in msgs:
+        assert _legacy_detect(detector, m) == detector.detect(m)
+
+    before = _rate(lambda m: _legacy_detect(detector, m), msgs, args.repeat)
+    after = _rate(detector.detect, msgs, args.repeat)
+    print(f"messages={len(msgs)} words/body={args.words}")
+    print(f"before: {before:,.0f} msgs/sec")
+    print(f"after:  {after:,.0f} msgs/sec ({after / before:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
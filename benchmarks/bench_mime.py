@@ -0,0 +1,118 @@
+"""Benchmark for MIME body extraction on large multipart and HTML messages.
+
+Run from the repo root:
+
+    python -m benchmarks.bench_mime --messages 50
+"""
+import argparse
+import email
+import random
+import re
+import time
+from email import policy
+from email.message import EmailMessage
+from html import unescape
+from typing import Callable, List
+
+from email_behavior_detection.ingest_imap import _extract_body
+
+from .bench_intents import _FILLER
+
+
+def _legacy_html_to_text(html: str) -> str:
+    if not html:
+        return ""
+    text = re.sub(r"<style[\s\S]*?</style>", " ", html, flags=re.I)
+    text = re.sub(r"<script[\s\S]*?</script>", " ", text, flags=re.I)
+    text = re.sub(r"<[^>]+>", " ", text)
+    return re.sub(r"\s+", " ", unescape(text) or " ").strip()
+
+
+def _legacy_extract_body(msg: email.message.EmailMessage) -> str:
+    # Two-walk, get_content() based implementation the current one replaced
+    if msg.is_multipart():
+        for part in msg.walk():
+            disp = (part.get("Content-Disposition") or "").lower()
+            if part.get_content_type() == "text/plain" and "attachment" not in disp:
+                return part.get_content().strip()
+        for part in msg.walk():
+            disp = (part.get("Content-Disposition") or "").lower()
+            if part.get_content_type() == "text/html" and "attachment" not in disp:
+                return _legacy_html_to_text(part.get_content())
+        return ""
+    content = msg.get_content()
+    if msg.get_content_type() == "text/html":
+        return _legacy_html_to_text(content)
+    return content.strip()
+
+
+def _words(rng: random.Random, n: int) -> str:
+    return " ".join(rng.choice(_FILLER) for _ in range(n))
+
+
+def _html(rng: random.Random, paragraphs: int, quoted: int) -> str:
+    body = "".join(f"<p style='margin:0'>{_words(rng, 40)} &amp; <b>{_words(rng, 3)}</b></p>\n" for _ in range(paragraphs))
+    quote = "".join(f"<p>{_words(rng, 40)}</p>" for _ in range(quoted))
+    return (
+        "<html><head><style>p { color: #333 }</style></head><body>"
+        f"{body}<div class='gmail_quote'>On Mon, someone wrote:<blockquote>{quote}</blockquote></div>"
+        "</body></html>"
+    )
+
+
+def _corpus(n: int, seed: int) -> List[bytes]:
+    rng = random.Random(seed)
+    raws = []
+    for i in range(n):
+        m = EmailMessage()
+        m["Subject"] = f"Corporate plan {i}"
+        m["From"] = "Sales <sales@sunrisehotel.com>"
+        m["To"] = "reply-team@yourcompany.com"
+        kind = i % 3
+        if kind == 0:
+            # HTML only, long quoted history
+            m.set_content(_html(rng, 200, 400), subtype="html")
+        elif kind == 1:
+            # Attachments first, then an HTML-only body with quoted history
+            m.set_content(_html(rng, 100, 200), subtype="html")
+            m.add_attachment(rng.randbytes(512 * 1024), maintype="application", subtype="pdf", filename="rates.pdf")
+            m.add_attachment(rng.randbytes(256 * 1024), maintype="image", subtype="png", filename="logo.png")
+        else:
+            # multipart/alternative plus an attachment
+            m.set_content(_words(rng, 2000))
+            m.add_alternative(_html(rng, 50, 50), subtype="html")
+            m.add_attachment(rng.randbytes(512 * 1024), maintype="application", subtype="pdf", filename="rates.pdf")
+        raws.append(m.as_bytes())
+    return raws
+
+
+def _rate(fn: Callable[[email.message.EmailMessage], str], msgs: List[email.message.EmailMessage], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for m in msgs:
+            fn(m)
+        best = min(best, time.perf_counter() - start)
+    return len(msgs) / best
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="MIME body extraction benchmark")
+    parser.add_argument("--messages", type=int, default=30)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    raws = _corpus(args.messages, args.seed)
+    msgs = [email.message_from_bytes(r, policy=policy.default) for r in raws]
+    before = _rate(_legacy_extract_body, msgs, args.repeat)
+    after = _rate(_extract_body, msgs, args.repeat)
+    before_chars = sum(len(_legacy_extract_body(m)) for m in msgs)
+    after_chars = sum(len(_extract_body(m)) for m in msgs)
+    print(f"messages={len(msgs)} avg size={sum(map(len, raws)) // len(raws):,} bytes")
+    print(f"before: {before:,.1f} msgs/sec, {before_chars:,} body chars")
+    print(f"after:  {after:,.1f} msgs/sec, {after_chars:,} body chars ({after / before:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""Memory footprint of Message/Thread representations (tracemalloc).
+
+Builds the same synthetic mailbox three ways -- the previous plain dataclasses,
+the slotted/interned models, and a columnar ThreadStore -- and reports the memory
+each one holds once built. Run from the repo root:
+
+    python -m benchmarks.bench_models --messages 1000000
+"""
+import argparse
+import gc
+import random
+import time
+import tracemalloc
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterator, List, Tuple
+
+from email_behavior_detection.models import Message, Thread
+from email_behavior_detection.thread_store import ThreadStore
+
+from .bench_intents import _FILLER, _PHRASES
+
+
+@dataclass
+class _LegacyMessage:
+    # models.Message before slots and address interning
+    timestamp: str
+    from_name: str
+    from_email: str
+    to: List[str]
+    cc: List[str]
+    body: str
+    meta: Dict[str, str] = field(default_factory=dict)
+
+
+@dataclass
+class _LegacyThread:
+    subject: str
+    messages: List[_LegacyMessage]
+
+
+Row = Tuple[str, str, str, List[str], List[str], str, Dict[str, str]]
+
+
+def _rows(messages: int, per_thread: int, words: int, seed: int) -> Iterator[Tuple[str, List[Row]]]:
+    # Fresh string objects for every field, as a parser would produce them
+    rng = random.Random(seed)
+    people = [(f"Contact {i}", f"contact{i}@example{i % 37}.com") for i in range(500)]
+    for t in range(0, messages, per_thread):
+        rows = []
+        for i in range(min(per_thread, messages - t)):
+            name, email = rng.choice(people)
+            tokens = [rng.choice(_FILLER) for _ in range(words)]
+            tokens.insert(rng.randrange(len(tokens) + 1), rng.choice(_PHRASES))
+            rows.append((
+                f"2024-01-{1 + i % 28:02d}T09:{i % 60:02d}:00",
+                "".join(name), "".join(email),
+                ["".join(rng.choice(people)[1])], [],
+                " ".join(tokens),
+                {"message_id": f"<{t + i}@example.com>"} if i else {},
+            ))
+        yield f"Thread {t // per_thread}", rows
+
+
+def _measure(build: Callable[[], object]) -> Tuple[int, float]:
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    obj = build()
+    elapsed = time.perf_counter() - start
+    gc.collect()
+    held = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del obj
+    gc.collect()
+    return held, elapsed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Message/Thread memory benchmark")
+    parser.add_argument("--messages", type=int, default=1_000_000)
+    parser.add_argument("--per-thread", type=int, default=10)
+    parser.add_argument("--words", type=int, default=30, help="Words per message body")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    def corpus():
+        return _rows(args.messages, args.per_thread, args.words, args.seed)
+
+    def legacy():
+        return [_LegacyThread(s, [_LegacyMessage(*r) for r in rows]) for s, rows in corpus()]
+
+    def slotted():
+        return [Thread(s, [Message(*r) for r in rows]) for s, rows in corpus()]
+
+    def store():
+        return ThreadStore.from_threads(Thread(s, [Message(*r) for r in rows]) for s, rows in corpus())
+
+    text_bytes = sum(len(r[5].encode("utf-8")) for _, rows in corpus() for r in rows)
+    print(f"messages={args.messages:,} body text={text_bytes / 1e6:,.1f} MB")
+    base = None
+    for label, build in (("plain dataclasses", legacy), ("slotted + interned", slotted), ("ThreadStore", store)):
+        held, elapsed = _measure(build)
+        base = base or held
+        print(f"{label:<20} {held / 1e6:>9,.1f} MB  ({held / base:.2f}x, {held / text_bytes:.1f}x text)  built in {elapsed:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""Scaling benchmark for classify_parallel (threads/sec by worker count).
+
+Run from the repo root:
+
+    python -m benchmarks.bench_parallel --threads 2000 --workers 1 2 4 8
+"""
+import argparse
+import json
+import random
+import time
+from typing import List
+
+from email_behavior_detection.parallel import classify_parallel
+
+from .bench_intents import _FILLER, _PHRASES
+
+
+def _thread_lines(n: int, messages: int, words: int, seed: int) -> List[str]:
+    rng = random.Random(seed)
+    lines = []
+    for t in range(n):
+        msgs = []
+        for i in range(messages):
+            tokens = [rng.choice(_FILLER) for _ in range(words)]
+            tokens.insert(rng.randrange(len(tokens) + 1), rng.choice(_PHRASES))
+            msgs.append({
+                "timestamp": f"Day {i}",
+                "from_name": "Sales",
+                "from_email": "sales@sunrisehotel.com" if i % 2 else "reply-team@yourcompany.com",
+                "to": [],
+                "cc": [],
+                "body": " ".join(tokens),
+            })
+        lines.append(json.dumps({"subject": f"Thread {t}", "messages": msgs}))
+    return lines
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Parallel classification scaling benchmark")
+    parser.add_argument("--threads", type=int, default=2000)
+    parser.add_argument("--messages", type=int, default=8, help="Messages per thread")
+    parser.add_argument("--words", type=int, default=300, help="Words per message body")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--unordered", action="store_true")
+    parser.add_argument("--config", default="configs/default_config.yaml")
+    parser.add_argument("--templates", default="templates/default_templates.yaml")
+    args = parser.parse_args(argv)
+
+    lines = _thread_lines(args.threads, args.messages, args.words, seed=0)
+    base = None
+    for workers in args.workers:
+        start = time.perf_counter()
+        count = sum(1 for _ in classify_parallel(
+            lines, args.config, args.templates, workers, ordered=not args.unordered
+        ))
+        rate = count / (time.perf_counter() - start)
+        base = base or rate
+        print(f"workers={workers:<3} {rate:>10,.0f} threads/sec  ({rate / base:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
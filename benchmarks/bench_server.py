@@ -0,0 +1,74 @@
+"""Benchmark the HTTP service against one CLI process per thread.
+
+Run from the repo root:
+
+    python -m benchmarks.bench_server --requests 500 --concurrency 8 --cli-runs 10
+"""
+import argparse
+import json
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+
+from email_behavior_detection.server import ClassificationService, make_server
+
+CONFIG = "configs/default_config.yaml"
+TEMPLATES = "templates/default_templates.yaml"
+THREAD = "examples/thread_example.json"
+
+
+def _cli(runs: int) -> float:
+    cmd = [sys.executable, "-m", "email_behavior_detection.cli", "--thread", THREAD, "--config", CONFIG, "--templates", TEMPLATES]
+    start = time.perf_counter()
+    for _ in range(runs):
+        subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL)
+    return (time.perf_counter() - start) / runs
+
+
+def _server(requests: int, concurrency: int) -> dict:
+    service = ClassificationService(CONFIG, TEMPLATES, reload_interval=0)
+    server = make_server(service, port=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/classify"
+    with open(THREAD, "r", encoding="utf-8") as f:
+        body = f.read().encode("utf-8")
+
+    def client(n: int) -> None:
+        for _ in range(n):
+            req = urllib.request.Request(url, data=body, method="POST")
+            with urllib.request.urlopen(req) as r:
+                r.read()
+
+    per_client = max(1, requests // concurrency)
+    clients = [threading.Thread(target=client, args=(per_client,)) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for t in clients:
+        t.start()
+    for t in clients:
+        t.join()
+    elapsed = time.perf_counter() - start
+    server.shutdown()
+    server.server_close()
+    summary = service.latency["classify"].summary()
+    summary["throughput"] = per_client * concurrency / elapsed
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="HTTP service vs per-thread CLI benchmark")
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--cli-runs", type=int, default=10, help="CLI invocations to average (0 to skip)")
+    args = parser.parse_args(argv)
+
+    s = _server(args.requests, args.concurrency)
+    print(f"server:  {s['throughput']:9.1f} threads/sec  p50 {s['p50_ms']:.2f} ms  p99 {s['p99_ms']:.2f} ms  ({json.dumps(s)})")
+    if args.cli_runs:
+        per = _cli(args.cli_runs)
+        print(f"cli:     {1 / per:9.1f} threads/sec  {1e3 * per:.1f} ms per process")
+
+
+if __name__ == "__main__":
+    main()
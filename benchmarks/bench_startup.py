@@ -0,0 +1,95 @@
+"""Cold-start benchmark for the CLI's --thread path, driven by `python -X importtime`.
+
+Run from the repo root:
+
+    python -m benchmarks.bench_startup --runs 5 --max-import-ms 150
+
+Reports the median wall time of a full `--thread` run and the median cumulative
+import time, lists the slowest top-level imports, and fails if any module that only
+the IMAP, archive or OAuth paths need was loaded.
+"""
+import argparse
+import re
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict, List, Tuple
+
+CMD = [
+    "-m", "email_behavior_detection.cli",
+    "--thread", "examples/thread_example.json",
+    "--config", "configs/default_config.yaml",
+    "--templates", "templates/default_templates.yaml",
+]
+
+# Not needed to classify a thread file
+FORBIDDEN = (
+    "google", "google_auth_oauthlib", "requests", "imaplib", "ssl", "email.parser",
+    "multiprocessing", "sqlite3", "email_behavior_detection.ingest_imap",
+    "email_behavior_detection.gmail_oauth", "email_behavior_detection.archive",
+)
+
+_LINE_RE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+
+def _parse(stderr: str) -> List[Tuple[str, int, int]]:
+    # (module, cumulative us, nesting depth) per line of -X importtime output
+    rows = []
+    for line in stderr.splitlines():
+        m = _LINE_RE.match(line)
+        if m:
+            rows.append((m.group(4), int(m.group(2)), len(m.group(3))))
+    return rows
+
+
+def _run_once() -> Tuple[float, List[Tuple[str, int, int]]]:
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-X", "importtime", *CMD], capture_output=True, text=True)
+    elapsed = time.perf_counter() - start
+    if proc.returncode != 0:
+        sys.exit(f"CLI failed:\n{proc.stderr[-2000:]}")
+    return elapsed, _parse(proc.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="CLI --thread cold-start benchmark")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10, help="Slowest top-level imports to list")
+    parser.add_argument("--max-import-ms", type=float, help="Exit non-zero if median import time exceeds this")
+    args = parser.parse_args(argv)
+
+    walls: List[float] = []
+    totals: List[float] = []
+    per_module: Dict[str, List[int]] = {}
+    loaded = set()
+    for _ in range(max(1, args.runs)):
+        wall, rows = _run_once()
+        walls.append(wall)
+        top_level = [(name, cum) for name, cum, depth in rows if depth == 1]
+        totals.append(sum(cum for _, cum in top_level) / 1e3)
+        for name, cum in top_level:
+            per_module.setdefault(name, []).append(cum)
+        loaded.update(name for name, _, _ in rows)
+
+    print(f"wall time (median of {len(walls)}): {1e3 * statistics.median(walls):8.1f} ms")
+    print(f"import time (median):       {statistics.median(totals):8.1f} ms")
+    print()
+    slowest = sorted(per_module.items(), key=lambda kv: -statistics.median(kv[1]))[:args.top]
+    for name, values in slowest:
+        print(f"  {statistics.median(values) / 1e3:8.2f} ms  {name}")
+
+    failed = False
+    unexpected = sorted(m for m in loaded if any(m == f or m.startswith(f + ".") for f in FORBIDDEN))
+    if unexpected:
+        print(f"\nunexpected imports on the --thread path: {', '.join(unexpected)}")
+        failed = True
+    if args.max_import_ms is not None and statistics.median(totals) > args.max_import_ms:
+        print(f"\nimport time above budget of {args.max_import_ms:.1f} ms")
+        failed = True
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
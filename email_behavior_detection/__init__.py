@@ -1,6 +1,9 @@
+# Kept free of imports: `python -m email_behavior_detection.cli` and the other entry
+# points load only the submodules they use.
 __all__ = [
     "models",
     "intents",
     "policy",
     "templating",
+    "pipeline",
 ]
@@ -0,0 +1,341 @@
+import json
+import mmap
+import os
+import re
+from codecs import getincrementaldecoder
+from email import policy
+from email.parser import BytesHeaderParser
+from typing import Any, Iterator, List, Optional, Tuple, Union
+
+from .conversations import ThreadKey, strip_reply_prefix, thread_indices, thread_key
+from .ingest_imap import _parse_headers, _parse_message
+from .models import Thread
+from .pipeline import thread_from_dict
+
+# Byte ranges (offset, length) making up one thread: a single record for JSON/JSONL,
+# one per message for mbox
+Spans = List[Tuple[int, int]]
+
+_FORMATS = {".jsonl": "jsonl", ".ndjson": "jsonl", ".json": "json", ".mbox": "mbox", ".mbx": "mbox"}
+_INDEX_VERSION = 1
+_WS = b" \t\r\n"
+# Errors that make one record unusable without affecting the others
+_RECORD_ERRORS = (ValueError, TypeError, KeyError, AttributeError)
+# Marks a record the scan located but did not decode
+_UNREAD = object()
+# Bytes that open or close a JSON value or string, the ones that matter inside a
+# string, and the end of a bare scalar
+_STRUCTURAL_RE = re.compile(rb'[{}\[\]"]')
+_STRING_RE = re.compile(rb'["\\]')
+_SCALAR_END_RE = re.compile(rb"[\s,\]]")
+
+
+def detect_format(path: str) -> str:
+    ext = os.path.splitext(path)[1].lower()
+    if ext not in _FORMATS:
+        raise ValueError(f"cannot tell archive format of {path!r}; pass format='json', 'jsonl' or 'mbox'")
+    return _FORMATS[ext]
+
+
+class ThreadArchive:
+    # Read-only view of a thread archive on disk: a JSON file (one thread object or an
+    # array of them), JSONL (one thread per line) or an mbox. The file is memory-mapped
+    # and threads are parsed one at a time, so memory stays flat however large the file
+    # is. Iteration yields (offset, Thread); pass the offset back as `start` to resume.
+    # records() yields records that aren't valid threads as errors instead of stopping.
+    # With an index (build_index / index_path), len() and thread(i) give random access
+    # without parsing anything else; without one they raise rather than scan the file.
+
+    def __init__(
+        self,
+        path: str,
+        format: Optional[str] = None,
+        index_path: Optional[str] = None,
+        max_record_bytes: int = 64 << 20,
+    ):
+        self.path = path
+        self.format = format or detect_format(path)
+        self.index_path = index_path
+        # Largest JSON array element read before giving up on finding its end
+        self.max_record_bytes = max_record_bytes
+        self._file = open(path, "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        self._mm: Any = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        self._index: Optional[List[Spans]] = None
+        # Decode window for the next JSON value, adapted to the size of the last one
+        self._window = 1 << 12
+        if index_path:
+            self._index = self._load_index(index_path)
+
+    def close(self) -> None:
+        if isinstance(self._mm, mmap.mmap):
+            self._mm.close()
+        self._file.close()
+
+    def __enter__(self) -> "ThreadArchive":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    # -- sequential access --------------------------------------------------------
+
+    def __iter__(self) -> Iterator[Tuple[int, Thread]]:
+        return self.iter_threads()
+
+    def iter_threads(self, start: int = 0) -> Iterator[Tuple[int, Thread]]:
+        for offset, item in self.records(start):
+            if isinstance(item, Exception):
+                raise item
+            yield offset, item
+
+    def records(self, start: int = 0) -> Iterator[Tuple[int, Union[Thread, Exception]]]:
+        # Like iter_threads, but a record that isn't a valid thread (malformed JSON, wrong
+        # types) comes back as its exception in place of the Thread, and the records after
+        # it are still read
+        if self._index is not None or self.format == "mbox":
+            # mbox messages of one conversation are scattered, so without an index threads
+            # are grouped from a headers-only pass over the whole file first (a reply after
+            # `start` may belong to a thread already emitted); bodies are parsed a thread at
+            # a time, and threads are resumed by their first message's offset
+            spans = self._index if self._index is not None else self._scan_mbox()
+            for thread_spans in spans:
+                offset = min(o for o, _ in thread_spans)
+                if offset >= start:
+                    yield offset, self._thread(thread_spans)
+            return
+        for offset, length, value in self._records(start):
+            # JSON array elements were already decoded to find where they end
+            yield offset, self._thread([(offset, length)], value)
+
+    def _thread(self, spans: Spans, value: Any = _UNREAD) -> Union[Thread, Exception]:
+        try:
+            if isinstance(value, Exception):
+                return value
+            return self._read(spans) if value is _UNREAD else _from_json(value)
+        except _RECORD_ERRORS as e:
+            return e
+
+    def _records(self, start: int) -> Iterator[Tuple[int, int, Any]]:
+        # (offset, length, decoded value, its decoding error, or _UNREAD when the scan
+        # didn't decode it)
+        if self.format == "jsonl":
+            return ((offset, length, _UNREAD) for offset, length in self._jsonl_records(start))
+        return self._json_records(start)
+
+    def _jsonl_records(self, start: int) -> Iterator[Tuple[int, int]]:
+        mm = self._mm
+        pos, size = start, len(mm)
+        while pos < size:
+            end = mm.find(b"\n", pos)
+            if end < 0:
+                end = size
+            if mm[pos:end].strip():
+                yield pos, end - pos
+            pos = end + 1
+
+    def _json_records(self, start: int) -> Iterator[Tuple[int, int, Any]]:
+        mm = self._mm
+        size = len(mm)
+        pos = self._skip(0, _WS)
+        if pos >= size:
+            return
+        if mm[pos:pos + 1] != b"[":
+            # A single thread object
+            if start <= pos:
+                try:
+                    yield (pos, *self._decode_value(pos))
+                except ValueError as e:
+                    yield pos, size - pos, e
+            return
+        pos = self._skip(pos + 1, _WS)
+        if start > pos:
+            # Resuming: `start` is the offset of a value previously yielded
+            pos = start
+        while pos < size and mm[pos:pos + 1] != b"]":
+            try:
+                length, value = self._decode_value(pos)
+            except ValueError as e:
+                # No end in sight, so nothing after this point can be located
+                yield pos, size - pos, e
+                return
+            yield pos, length, value
+            pos = self._skip(pos + length, _WS + b",")
+
+    def _skip(self, pos: int, chars: bytes) -> int:
+        mm = self._mm
+        size = len(mm)
+        while pos < size and mm[pos] in chars:
+            pos += 1
+        return pos
+
+    def _decode_value(self, pos: int) -> Tuple[int, Any]:
+        # Length in bytes and decoded value of the JSON value starting at `pos`: decode a
+        # growing window until the value parses, so only that value is ever held as text.
+        # A value that is complete but invalid comes back as its JSONDecodeError, so the
+        # values after it can still be read; ValueError is raised when no end is found
+        # before the end of the file or max_record_bytes.
+        mm = self._mm
+        size = len(mm)
+        decoder = json.JSONDecoder()
+        window = min(self._window, self.max_record_bytes)
+        while True:
+            chunk = mm[pos:pos + window]
+            text = getincrementaldecoder("utf-8")().decode(chunk, final=False)
+            try:
+                value, end = decoder.raw_decode(text)
+            except json.JSONDecodeError as e:
+                # Checked on failure only: a value that ends inside the window won't
+                # parse with more data either
+                end = self._value_end(pos, pos + len(chunk))
+                if end is not None:
+                    return end - pos, e
+                if pos + window >= size:
+                    raise
+                if window >= self.max_record_bytes:
+                    raise ValueError(f"JSON value at offset {pos} is larger than {self.max_record_bytes} bytes")
+                window = min(window * 4, self.max_record_bytes)
+                continue
+            length = end if text.isascii() else len(text[:end].encode("utf-8"))
+            self._window = max(1 << 12, 2 * length)
+            return length, value
+
+    def _value_end(self, pos: int, limit: int) -> Optional[int]:
+        # Offset just past the JSON value starting at `pos` by matching brackets outside
+        # strings, without checking anything else; None if it doesn't end before `limit`
+        mm = self._mm
+        first = mm[pos:pos + 1]
+        if first == b'"':
+            return self._string_end(pos + 1, limit)
+        if first not in (b"{", b"["):
+            m = _SCALAR_END_RE.search(mm, pos, limit)
+            return m.start() if m else None
+        depth = 0
+        i = pos
+        while True:
+            m = _STRUCTURAL_RE.search(mm, i, limit)
+            if m is None:
+                return None
+            i = m.end()
+            c = mm[m.start()]
+            if c == 0x22:  # '"'
+                end = self._string_end(i, limit)
+                if end is None:
+                    return None
+                i = end
+            elif c in (0x7B, 0x5B):  # '{' '['
+                depth += 1
+            else:
+                depth -= 1
+                if depth == 0:
+                    return i
+
+    def _string_end(self, pos: int, limit: int) -> Optional[int]:
+        # Offset just past the closing quote of a string whose body starts at `pos`
+        mm = self._mm
+        while True:
+            m = _STRING_RE.search(mm, pos, limit)
+            if m is None:
+                return None
+            if mm[m.start()] == 0x5C:  # backslash: the next byte is escaped
+                pos = m.end() + 1
+                continue
+            return m.end()
+
+    def _scan_mbox(self) -> List[Spans]:
+        # Headers-only pass: split on "From " separator lines, thread by Message-ID /
+        # In-Reply-To / References and remember where each message lives. Only the
+        # span and threading headers of each message are kept until threads are built.
+        mm = self._mm
+        size = len(mm)
+        parser = BytesHeaderParser(policy=policy.default)
+        spans: List[Tuple[int, int]] = []
+        keys: List[ThreadKey] = []
+        pos = 0 if mm[:5] == b"From " else mm.find(b"\nFrom ") + 1
+        if pos == 0 and mm[:5] != b"From ":
+            return []
+        while True:
+            nxt = mm.find(b"\nFrom ", pos + 1)
+            end = size if nxt < 0 else nxt + 1
+            head_end = min((i for i in (mm.find(b"\n\n", pos, end), mm.find(b"\n\r\n", pos, end)) if i >= 0), default=end)
+            _, _, msg = _parse_headers(parser.parsebytes(mm[pos:head_end + 1]))
+            spans.append((pos, end - pos))
+            keys.append(thread_key(msg))
+            if nxt < 0:
+                break
+            pos = end
+        return [[spans[i] for i in group] for group in thread_indices(keys)]
+
+    # -- random access -------------------------------------------------------------
+
+    def _read(self, spans: Spans) -> Thread:
+        mm = self._mm
+        if self.format != "mbox":
+            offset, length = spans[0]
+            return _from_json(json.loads(mm[offset:offset + length]))
+        # Spans are stored in conversation order
+        messages = [_parse_message(mm[offset:offset + length])[2] for offset, length in spans]
+        subject = messages[0].meta.get("subject", "") if messages else ""
+        return Thread(subject=strip_reply_prefix(subject), messages=messages)
+
+    def build_index(self, path: Optional[str] = None) -> int:
+        # Scans the archive once; returns the number of threads. Written to `path`
+        # (default: the archive path + ".idx") unless path is "".
+        if self.format == "mbox":
+            index = self._scan_mbox()
+        else:
+            index = [[(offset, length)] for offset, length, _ in self._records(0)]
+        self._index = index
+        target = (self.index_path or f"{self.path}.idx") if path is None else path
+        if target:
+            st = os.stat(self.path)
+            data = {"version": _INDEX_VERSION, "format": self.format, "size": st.st_size,
+                    "mtime": st.st_mtime, "threads": index}
+            tmp = f"{target}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(data, f, separators=(",", ":"))
+            os.replace(tmp, target)
+            self.index_path = target
+        return len(index)
+
+    def _load_index(self, path: str) -> Optional[List[Spans]]:
+        # A missing or stale index (archive changed since it was built) is ignored
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        st = os.stat(self.path)
+        if (data.get("version"), data.get("format"), data.get("size"), data.get("mtime")) != (
+            _INDEX_VERSION, self.format, st.st_size, st.st_mtime
+        ):
+            return None
+        return [[tuple(span) for span in spans] for spans in data["threads"]]
+
+    @property
+    def indexed(self) -> bool:
+        return self._index is not None
+
+    def _require_index(self) -> List[Spans]:
+        if self._index is None:
+            raise ValueError(f"{self.path} has no index; call build_index() first")
+        return self._index
+
+    def __len__(self) -> int:
+        # TypeError, not ValueError: list(archive) asks for a length hint and only falls
+        # back to plain iteration on TypeError
+        if self._index is None:
+            raise TypeError(f"{self.path} has no index; call build_index() first")
+        return len(self._index)
+
+    def thread(self, i: int) -> Thread:
+        return self._read(self._require_index()[i])
+
+    def offset(self, i: int) -> int:
+        return self._require_index()[i][0][0]
+
+
+def _from_json(value: Any) -> Thread:
+    if not isinstance(value, dict):
+        raise TypeError(f"expected a thread object, got {type(value).__name__}")
+    return thread_from_dict(value)
@@ -0,0 +1,211 @@
+import asyncio
+import imaplib
+from concurrent.futures import Executor
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, List, Optional, Tuple
+
+from .imap_pool import ImapPool, connect
+from .ingest_imap import TextPart, _decode_body, _fetch_headers, _fetch_text_parts, _uid
+from .intents import DetectedIntent, IntentDetector
+from .models import Message
+
+
+@dataclass
+class MailboxSource:
+    host: str
+    username: str
+    password: str
+    mailbox: str = "INBOX"
+    port: int = 993
+    subject: Optional[str] = None
+    limit: Optional[int] = None
+
+
+@dataclass
+class IngestResult:
+    source: MailboxSource
+    uid: int
+    message: Message
+    intents: List[DetectedIntent]
+
+
+_DONE = object()
+
+
+class _Discard(Exception):
+    # Thrown into a pooled session to have the pool log it out instead of reusing it
+    pass
+
+
+class _Connection:
+    # A blocking imaplib session driven from executor threads, one command at a time
+    def __init__(self, source: MailboxSource, pool: Optional[ImapPool]):
+        self.source = source
+        self.pool = pool
+        self.imap: Optional[imaplib.IMAP4] = None
+        self._cm: Any = None
+
+    def open(self) -> imaplib.IMAP4:
+        s = self.source
+        if self.pool is not None:
+            self._cm = self.pool.session(s.host, s.port, s.username, s.password, s.mailbox)
+            self.imap = self._cm.__enter__()
+        else:
+            self.imap = connect(s.host, s.port, s.username, s.password)
+            self.imap.select(s.mailbox)
+        return self.imap
+
+    def close(self, exc: Optional[BaseException] = None) -> None:
+        # The producer's own exception is never passed into the pool's cleanup, where it
+        # would be raised a second time; after an error the session is discarded instead
+        if self._cm is not None:
+            cm, self._cm = self._cm, None
+            if exc is None:
+                cm.__exit__(None, None, None)
+                return
+            try:
+                cm.__exit__(_Discard, _Discard(), None)
+            except _Discard:
+                pass
+        elif self.imap is not None:
+            try:
+                self.imap.logout()
+            except Exception:
+                pass
+
+
+def _search(imap: imaplib.IMAP4, subject: Optional[str]) -> List[bytes]:
+    criteria = ("SUBJECT", f'"{subject}"') if subject else ("ALL",)
+    typ, data = _uid(imap, "SEARCH", None, *criteria)
+    return data[0].split() if typ == "OK" and data and data[0] else []
+
+
+def _fetch_chunk(
+    imap: imaplib.IMAP4,
+    uids: List[bytes],
+    subject: Optional[str],
+) -> List[Tuple[bytes, Message, TextPart, Optional[bytes]]]:
+    # Network stage: headers, subject filter, then the raw text part of the survivors.
+    # A message whose body the server didn't return still gets a row (payload None), so
+    # every fetched header produces a result, as in the synchronous path.
+    by_uid = {
+        uid: msg
+        for uid, _, sub, msg in _fetch_headers(imap, uids, len(uids))
+        if not subject or subject.lower() in sub.lower()
+    }
+    rows: List[Tuple[bytes, Message, TextPart, Optional[bytes]]] = [
+        (uid, by_uid[uid], part, payload) for uid, part, payload in _fetch_text_parts(imap, list(by_uid), len(uids))
+    ]
+    returned = {uid for uid, _, _, _ in rows}
+    for uid, msg in by_uid.items():
+        if uid not in returned:
+            msg.meta["body_unavailable"] = "1"
+            rows.append((uid, msg, None, None))
+    return rows
+
+
+async def _produce(
+    source: MailboxSource,
+    raw_q: "asyncio.Queue[Any]",
+    pool: Optional[ImapPool],
+    chunk_size: int,
+    executor: Optional[Executor],
+) -> None:
+    loop = asyncio.get_running_loop()
+    conn = _Connection(source, pool)
+    error: Optional[BaseException] = None
+    try:
+        imap = await loop.run_in_executor(executor, conn.open)
+        uids = await loop.run_in_executor(executor, _search, imap, source.subject)
+        if source.limit:
+            uids = uids[-source.limit:]
+        for i in range(0, len(uids), chunk_size):
+            # The next chunk is requested while earlier ones are decoded and detected
+            rows = await loop.run_in_executor(executor, _fetch_chunk, imap, uids[i:i + chunk_size], source.subject)
+            for uid, msg, part, payload in rows:
+                await raw_q.put((source, uid, msg, part, payload))
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        await loop.run_in_executor(executor, conn.close, error)
+
+
+async def _decode(raw_q: "asyncio.Queue[Any]", msg_q: "asyncio.Queue[Any]", executor: Optional[Executor]) -> None:
+    loop = asyncio.get_running_loop()
+    while True:
+        item = await raw_q.get()
+        if item is _DONE:
+            await raw_q.put(_DONE)
+            return
+        source, uid, msg, part, payload = item
+        if payload is not None:
+            msg.body = await loop.run_in_executor(executor, _decode_body, part, payload)
+        await msg_q.put((source, uid, msg))
+
+
+async def _detect(
+    msg_q: "asyncio.Queue[Any]",
+    out_q: "asyncio.Queue[Any]",
+    detector: IntentDetector,
+    executor: Optional[Executor],
+) -> None:
+    loop = asyncio.get_running_loop()
+    while True:
+        item = await msg_q.get()
+        if item is _DONE:
+            await msg_q.put(_DONE)
+            return
+        source, uid, msg = item
+        intents = await loop.run_in_executor(executor, detector.detect, msg)
+        await out_q.put(IngestResult(source=source, uid=int(uid), message=msg, intents=intents))
+
+
+async def classify_mailboxes(
+    sources: List[MailboxSource],
+    detector: IntentDetector,
+    pool: Optional[ImapPool] = None,
+    chunk_size: int = 50,
+    queue_size: int = 256,
+    decoders: int = 2,
+    detectors: int = 2,
+    executor: Optional[Executor] = None,
+) -> AsyncIterator[IngestResult]:
+    # Streams detections for every message in `sources` (several mailboxes or accounts
+    # at once). Each source gets its own connection; fetching, MIME decoding and
+    # detection run as separate stages joined by bounded queues, so a slow stage
+    # applies back-pressure instead of buffering the mailbox in memory. Results are
+    # yielded in completion order.
+    raw_q: "asyncio.Queue[Any]" = asyncio.Queue(queue_size)
+    msg_q: "asyncio.Queue[Any]" = asyncio.Queue(queue_size)
+    out_q: "asyncio.Queue[Any]" = asyncio.Queue(queue_size)
+
+    producers = [asyncio.ensure_future(_produce(s, raw_q, pool, chunk_size, executor)) for s in sources]
+    decode_tasks = [asyncio.ensure_future(_decode(raw_q, msg_q, executor)) for _ in range(max(1, decoders))]
+    detect_tasks = [asyncio.ensure_future(_detect(msg_q, out_q, detector, executor)) for _ in range(max(1, detectors))]
+
+    async def shutdown() -> None:
+        # Drain stage by stage so every fetched message reaches the output
+        try:
+            await asyncio.gather(*producers)
+        finally:
+            await raw_q.put(_DONE)
+            await asyncio.gather(*decode_tasks)
+            await msg_q.put(_DONE)
+            await asyncio.gather(*detect_tasks)
+            await out_q.put(_DONE)
+
+    closer = asyncio.ensure_future(shutdown())
+    tasks = producers + decode_tasks + detect_tasks + [closer]
+    try:
+        while True:
+            item = await out_q.get()
+            if item is _DONE:
+                break
+            yield item
+        await closer
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,195 @@
+"""Stage and end-to-end benchmarks on a synthetic corpus.
+
+    python -m email_behavior_detection.bench --threads 200 --languages en=0.6,de=0.2,fr=0.2 \\
+        --quote-depth 3 --html-ratio 0.5 --attachments 1 --output bench.json
+
+    # later, fail if any stage got more than 20% slower per item
+    python -m email_behavior_detection.bench --baseline bench.json --max-regression 0.2
+"""
+import argparse
+import email
+import json
+import platform
+import sys
+import time
+from dataclasses import asdict
+from email import policy as email_policy
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from ..config import load_config
+from ..ingest_imap import _extract_body, _parse_message
+from ..models import Message, Thread
+from ..pipeline import build_detector, classify_thread
+from ..policy import build_policy, choose_next_action
+from ..segmentation import split_reply
+from ..templating import load_templates, render_template
+from .synthetic import CorpusSpec, SyntheticThread, generate, parse_languages
+
+
+# A stage is (setup, run): setup builds fresh inputs outside the timed region (so
+# per-message memos never carry over between repeats) and run does the measured work
+Stage = Tuple[Callable[[], Any], Callable[[Any], Any]]
+
+
+def _copy(thread: Thread) -> Thread:
+    return Thread(
+        subject=thread.subject,
+        messages=[
+            Message(m.timestamp, m.from_name, m.from_email, list(m.to), list(m.cc), m.body, dict(m.meta))
+            for m in thread.messages
+        ],
+    )
+
+
+def _stages(corpus: List[SyntheticThread], cfg: Dict[str, Any], templates: Dict[str, str]) -> Dict[str, Tuple[int, Stage]]:
+    detector = build_detector(cfg)
+    policy = build_policy(cfg)
+    threads = [c.thread for c in corpus]
+    raws = [r for c in corpus for r in c.raw]
+    bodies = [m.body for t in threads for m in t.messages]
+    parsed = [email.message_from_bytes(r, policy=email_policy.default) for r in raws]
+    latest = [detector.detect(t.messages[-1]) for t in threads if t.messages]
+    decisions = [choose_next_action(i, policy) for i in latest]
+    contexts = [
+        {"subject": t.subject, "latest_from": t.messages[-1].from_name, "latest_email": t.messages[-1].from_email}
+        for t in threads if t.messages
+    ]
+
+    def fresh_messages():
+        return [m for t in threads for m in _copy(t).messages]
+
+    def from_mime(raw_threads):
+        for raw in raw_threads:
+            msgs = [_parse_message(r)[2] for r in raw]
+            classify_thread(Thread(subject=msgs[0].meta.get("subject", ""), messages=msgs), detector, templates, None, policy)
+
+    return {
+        "mime_parse": (len(raws), (lambda: raws, lambda rs: [email.message_from_bytes(r, policy=email_policy.default) for r in rs])),
+        "extract_body": (len(parsed), (lambda: parsed, lambda ps: [_extract_body(p) for p in ps])),
+        "segment": (len(bodies), (lambda: bodies, lambda bs: [split_reply(b) for b in bs])),
+        "detect": (len(bodies), (fresh_messages, lambda ms: [detector.detect(m) for m in ms])),
+        "detect_batch": (len(bodies), (fresh_messages, detector.detect_batch)),
+        "policy": (len(latest), (lambda: latest, lambda ls: [choose_next_action(i, policy) for i in ls])),
+        "render": (len(decisions), (
+            lambda: list(zip(decisions, contexts)),
+            lambda pairs: [render_template(templates, d.get("template", "ack_general"), c) for d, c in pairs],
+        )),
+        "pipeline": (len(threads), (
+            lambda: [_copy(t) for t in threads],
+            lambda ts: [classify_thread(t, detector, templates, None, policy) for t in ts],
+        )),
+        "pipeline_from_mime": (len(corpus), (lambda: [c.raw for c in corpus], from_mime)),
+    }
+
+
+def _time(stage: Stage, repeat: int) -> float:
+    setup, run = stage
+    best = float("inf")
+    for _ in range(repeat):
+        data = setup()
+        start = time.perf_counter()
+        run(data)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run(spec: CorpusSpec, config_path: str, templates_path: str, repeat: int = 3, only: Optional[List[str]] = None) -> Dict[str, Any]:
+    corpus = generate(spec)
+    stages = _stages(corpus, load_config(config_path), load_templates(templates_path))
+    results: Dict[str, Dict[str, float]] = {}
+    for name, (items, stage) in stages.items():
+        if only and name not in only:
+            continue
+        seconds = _time(stage, repeat)
+        results[name] = {
+            "items": items,
+            "seconds": seconds,
+            "items_per_sec": items / seconds if seconds else 0.0,
+            "us_per_item": 1e6 * seconds / items if items else 0.0,
+        }
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "repeat": repeat,
+            "corpus": asdict(spec),
+        },
+        "stages": results,
+    }
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any]) -> Dict[str, float]:
+    # Per-item time relative to the baseline for each stage both runs measured (>1 is slower)
+    ratios = {}
+    for name, now in current["stages"].items():
+        base = baseline.get("stages", {}).get(name)
+        if base and base.get("us_per_item"):
+            ratios[name] = now["us_per_item"] / base["us_per_item"]
+    return ratios
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m email_behavior_detection.bench", description=__doc__.splitlines()[0])
+    parser.add_argument("--threads", type=int, default=200)
+    parser.add_argument("--messages", type=int, default=8, help="Messages per thread")
+    parser.add_argument("--words", type=int, default=120, help="Newly written words per message")
+    parser.add_argument("--languages", default="en", help="Language mix, e.g. en=0.6,de=0.2,fr=0.1,es=0.1")
+    parser.add_argument("--quote-depth", type=int, default=2, help="Quoted earlier messages below each reply")
+    parser.add_argument("--html-ratio", type=float, default=0.3, help="Share of messages sent as HTML")
+    parser.add_argument("--attachments", type=int, default=0, help="Attachments per message")
+    parser.add_argument("--attachment-kb", type=int, default=64)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per stage; the best is reported")
+    parser.add_argument("--stage", action="append", help="Only run this stage (repeatable)")
+    parser.add_argument("--config", default="configs/default_config.yaml")
+    parser.add_argument("--templates", default="templates/default_templates.yaml")
+    parser.add_argument("--output", help="Write JSON results here instead of stdout")
+    parser.add_argument("--baseline", help="Earlier JSON results to compare against")
+    parser.add_argument("--max-regression", type=float, help="With --baseline, exit 1 if any stage is this much slower (0.2 = 20%%)")
+    args = parser.parse_args(argv)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    spec = CorpusSpec(
+        threads=args.threads,
+        messages=args.messages,
+        words=args.words,
+        languages=parse_languages(args.languages),
+        quote_depth=args.quote_depth,
+        html_ratio=args.html_ratio,
+        attachments=args.attachments,
+        attachment_kb=args.attachment_kb,
+        seed=args.seed,
+    )
+    result = run(spec, args.config, args.templates, repeat=args.repeat, only=args.stage)
+
+    text = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    for name, r in result["stages"].items():
+        sys.stderr.write(f"{name:<20} {r['items_per_sec']:>12,.0f} items/sec  {r['us_per_item']:>10.1f} us/item\n")
+    if baseline is None:
+        return
+    if baseline.get("meta", {}).get("corpus") != result["meta"]["corpus"]:
+        sys.stderr.write("warning: baseline was measured on a different corpus\n")
+    ratios = compare(result, baseline)
+    regressed = []
+    for name, ratio in ratios.items():
+        flag = ""
+        if args.max_regression is not None and ratio > 1 + args.max_regression:
+            regressed.append(name)
+            flag = "  REGRESSION"
+        sys.stderr.write(f"{name:<20} {ratio:>6.2f}x baseline time{flag}\n")
+    if regressed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
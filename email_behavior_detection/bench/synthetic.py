@@ -0,0 +1,161 @@
+import random
+from dataclasses import dataclass, field
+from email.message import EmailMessage
+from html import escape
+from typing import Dict, List, Sequence, Tuple
+
+from ..models import Message, Thread
+
+
+# Small per-language vocabularies: filler words and the reply attribution line each
+# mail client writes in that language
+_LANGUAGES: Dict[str, Tuple[Sequence[str], str]] = {
+    "en": (
+        "hi team thanks for the update regarding the corporate stay plan we reviewed the proposal "
+        "with our manager and will share feedback on dates rooms and the schedule for next quarter".split(),
+        "On {date}, {name} <{email}> wrote:",
+    ),
+    "de": (
+        "hallo zusammen vielen dank für die rückmeldung zum firmenaufenthalt wir haben das angebot "
+        "geprüft und melden uns zu terminen zimmern und dem zeitplan für das nächste quartal".split(),
+        "Am {date} schrieb {name} <{email}>:",
+    ),
+    "fr": (
+        "bonjour équipe merci pour la mise à jour concernant le séjour entreprise nous avons étudié "
+        "la proposition et reviendrons vers vous pour les dates les chambres et le planning".split(),
+        "Le {date}, {name} <{email}> a écrit :",
+    ),
+    "es": (
+        "hola equipo gracias por la actualización sobre el plan de estancia corporativa revisamos "
+        "la propuesta y compartiremos comentarios sobre fechas habitaciones y el calendario".split(),
+        "El {date}, {name} <{email}> escribió:",
+    ),
+}
+
+# Phrases that trigger the built-in intents (English, as the rules are)
+_PHRASES = (
+    "Interested.", "Please share the pricing?", "Do you include breakfast and Wi-Fi?",
+    "Adding Arun from our team.", "Please confirm your billing contact name and email.",
+    "Please proceed.", "Please pause reminders.", "Not interested, thanks.",
+    "I'm out of office until Monday.", "Please write to sales@sunrisehotel.com.",
+)
+
+_PEOPLE = (
+    ("Email Reply Team", "reply-team@yourcompany.com"),
+    ("Sales (Ananya)", "ananya@sunrisehotel.com"),
+    ("Front Desk", "frontdesk@sunrisehotel.com"),
+    ("Arun", "arun@sunrisehotel.com"),
+)
+
+
+@dataclass
+class CorpusSpec:
+    threads: int = 200
+    messages: int = 8            # per thread
+    words: int = 120             # newly written words per message
+    languages: Dict[str, float] = field(default_factory=lambda: {"en": 1.0})
+    quote_depth: int = 2         # earlier messages quoted below each reply
+    html_ratio: float = 0.3      # share of messages sent as HTML
+    attachments: int = 0         # attachments per MIME message
+    attachment_kb: int = 64
+    seed: int = 0
+
+
+@dataclass
+class SyntheticThread:
+    thread: Thread
+    raw: List[bytes]             # one RFC 822 message per thread message
+
+
+def parse_languages(value: str) -> Dict[str, float]:
+    # "en=0.7,de=0.3" -> {"en": 0.7, "de": 0.3}; a bare name counts as weight 1
+    mix: Dict[str, float] = {}
+    for item in filter(None, (p.strip() for p in value.split(","))):
+        name, _, weight = item.partition("=")
+        if name not in _LANGUAGES:
+            raise ValueError(f"unknown language {name!r}; choose from {', '.join(sorted(_LANGUAGES))}")
+        mix[name] = float(weight) if weight else 1.0
+    return mix or {"en": 1.0}
+
+
+def _quote(text: str, depth: int) -> str:
+    prefix = ">" * depth + " "
+    return "\n".join(prefix + line if line else ">" * depth for line in text.splitlines())
+
+
+def _mime(msg: Message, new: str, quoted: str, html: bool, spec: CorpusSpec, rng: random.Random) -> bytes:
+    em = EmailMessage()
+    em["Subject"] = msg.meta["subject"]
+    em["From"] = f"{msg.from_name} <{msg.from_email}>"
+    em["To"] = ", ".join(msg.to)
+    em["Message-ID"] = msg.meta["message_id"]
+    if "in_reply_to" in msg.meta:
+        em["In-Reply-To"] = msg.meta["in_reply_to"]
+        em["References"] = msg.meta["references"]
+    if html:
+        attribution, _, history = quoted.partition("\n")
+        em.set_content(
+            "<html><head><style>p { margin: 0 }</style></head><body>"
+            + f"<p>{escape(new)}</p>"
+            + (f"<div class='gmail_quote'>{escape(attribution)}<blockquote>{escape(history)}</blockquote></div>"
+               if quoted else "")
+            + "</body></html>",
+            subtype="html",
+        )
+    else:
+        em.set_content(msg.body)
+    for i in range(spec.attachments):
+        em.add_attachment(
+            rng.randbytes(spec.attachment_kb * 1024), maintype="application", subtype="pdf", filename=f"doc{i}.pdf"
+        )
+    return em.as_bytes()
+
+
+def generate(spec: CorpusSpec) -> List[SyntheticThread]:
+    rng = random.Random(spec.seed)
+    names = list(spec.languages)
+    weights = [spec.languages[n] for n in names]
+    out: List[SyntheticThread] = []
+    for t in range(spec.threads):
+        subject = f"Corporate stay plan #{t}"
+        messages: List[Message] = []
+        raw: List[bytes] = []
+        # history[i][d]: message i with d levels of quoted replies below it
+        history: List[List[str]] = []
+        for i in range(spec.messages):
+            words, attribution = _LANGUAGES[rng.choices(names, weights)[0]]
+            name, email = _PEOPLE[(i + t) % len(_PEOPLE)]
+            tokens = [rng.choice(words) for _ in range(spec.words)]
+            tokens.insert(rng.randrange(len(tokens) + 1), rng.choice(_PHRASES))
+            new = " ".join(tokens)
+            timestamp = f"2024-01-{1 + i % 28:02d}T09:{i % 60:02d}:00+00:00"
+            levels = [new]
+            for d in range(1, spec.quote_depth + 1):
+                # Reply below the previous message, which carries its own quoted history
+                if not messages:
+                    break
+                prev = messages[-1]
+                attr = prev_attribution.format(date=prev.timestamp, name=prev.from_name, email=prev.from_email)
+                levels.append(f"{new}\n\n{attr}\n{_quote(history[-1][min(d - 1, len(history[-1]) - 1)], 1)}")
+            history.append(levels)
+            body = levels[-1]
+            quoted = body[len(new) + 2:]
+            msg_id = f"<t{t}.m{i}@synthetic.example>"
+            meta = {"subject": subject if i == 0 else f"Re: {subject}", "message_id": msg_id}
+            if messages:
+                meta["in_reply_to"] = messages[-1].meta["message_id"]
+                meta["references"] = " ".join(m.meta["message_id"] for m in messages)
+            msg = Message(
+                timestamp=timestamp,
+                from_name=name,
+                from_email=email,
+                to=[_PEOPLE[(i + t + 1) % len(_PEOPLE)][1]],
+                cc=[],
+                body=body,
+                meta=meta,
+            )
+            messages.append(msg)
+            raw.append(_mime(msg, new, quoted, rng.random() < spec.html_ratio, spec, rng))
+            prev_attribution = attribution
+        out.append(SyntheticThread(thread=Thread(subject=subject, messages=messages), raw=raw))
+    return out
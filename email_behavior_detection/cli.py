@@ -1,32 +1,92 @@
 import argparse
 import json
-from typing import Dict, Any
+import sys
+from typing import Dict, Any, Iterator, Optional, TextIO, Tuple
 
+from . import instrumentation
 from .config import load_config
-from .models import Thread, Message
+from .models import Thread
 from .intents import IntentDetector
-from .policy import choose_next_action
-from .templating import load_templates, render_template
-from .ingest_imap import fetch_thread_by_subject
-from .gmail_oauth import get_access_token
+from .templating import load_templates
+from .detection_cache import DetectionCache
+from .policy import Policy, build_policy
+from .pipeline import THREAD_FIELDS, build_detector, classify_item, classify_thread, thread_from_dict
+from .thread_state import ThreadState
+
+# The archive, IMAP, Gmail OAuth and worker-pool modules (and with them email, imaplib,
+# ssl, google-auth and multiprocessing) are imported only on the paths that use them,
+# so --thread and --batch start without loading them.
 
 
 def _load_thread(path: str) -> Thread:
     with open(path, "r", encoding="utf-8") as f:
         data = json.load(f)
-    messages = [
-        Message(
-            timestamp=m.get("timestamp", ""),
-            from_name=m.get("from_name", ""),
-            from_email=m.get("from_email", ""),
-            to=m.get("to", []),
-            cc=m.get("cc", []),
-            body=m.get("body", ""),
-            meta=m.get("meta", {}),
-        )
-        for m in data.get("messages", [])
-    ]
-    return Thread(subject=data.get("subject", ""), messages=messages)
+    return thread_from_dict(data)
+
+
+def _write_line(out: TextIO, result: Dict[str, Any]) -> None:
+    out.write(json.dumps(result, ensure_ascii=False, separators=(",", ":")))
+    out.write("\n")
+
+
+def _nonblank(src: TextIO) -> Iterator[Tuple[int, str]]:
+    # (1-based line number, line) for every line with content
+    return ((lineno, line) for lineno, line in enumerate(src, 1) if line.strip())
+
+
+def _at_line(result: Dict[str, Any], lineno: int) -> Dict[str, Any]:
+    # Error records name the input line they replace
+    if "error" in result:
+        return {**result, "error": f"line {lineno}: {result['error']}"}
+    return result
+
+
+def run_batch(
+    src: TextIO,
+    out: TextIO,
+    detector: IntentDetector,
+    templates: Dict[str, str],
+    extra_ctx: Dict[str, Any],
+    policy: Optional[Policy] = None,
+) -> int:
+    # One thread per input line, one compact JSON line out; nothing is kept between lines
+    count = 0
+    for lineno, line in _nonblank(src):
+        _write_line(out, _at_line(classify_item(line, detector, templates, extra_ctx, policy), lineno))
+        count += 1
+    out.flush()
+    return count
+
+
+def run_batch_parallel(
+    src: TextIO,
+    out: TextIO,
+    config_path: str,
+    templates_path: str,
+    extra_ctx: Dict[str, Any],
+    workers: int,
+    ordered: bool = True,
+) -> int:
+    from .parallel import classify_parallel
+
+    # Input position -> line number, for lines handed to the pool and not yet written
+    linenos: Dict[int, int] = {}
+
+    def numbered() -> Iterator[str]:
+        for idx, (lineno, line) in enumerate(_nonblank(src)):
+            linenos[idx] = lineno
+            yield line
+
+    count = 0
+    for idx, result in classify_parallel(
+        numbered(), config_path, templates_path, workers, ordered=ordered, extra_ctx=extra_ctx
+    ):
+        result = _at_line(result, linenos.pop(idx))
+        # Unordered output carries the input position so callers can re-associate it
+        _write_line(out, result if ordered else {"index": idx, **result})
+        count += 1
+    out.flush()
+    return count
 
 
 def main(argv=None):
@@ -34,9 +94,25 @@ def main(argv=None):
     src = parser.add_mutually_exclusive_group(required=True)
     src.add_argument("--thread", help="Path to thread JSON")
     src.add_argument("--imap", action="store_true", help="Fetch thread via IMAP by subject")
+    src.add_argument("--batch", help="Path to JSONL file of threads ('-' for stdin); writes one JSON line per thread")
+    src.add_argument("--archive", help="Path to a JSON, JSONL or mbox archive, streamed one thread at a time")
     parser.add_argument("--config", required=True, help="Path to YAML config")
     parser.add_argument("--templates", required=True, help="Path to templates YAML")
     parser.add_argument("--context", default="{}", help="Extra JSON context for templates")
+    parser.add_argument("--state", help="Thread state file; only messages not seen in an earlier run are re-detected")
+    parser.add_argument("--detect-cache-size", type=int, default=0, help="Cache up to N detection results in memory (default off)")
+    parser.add_argument("--detect-cache", help="Path to an SQLite file that keeps detection results between runs")
+    parser.add_argument(
+        "--profile", nargs="?", const="text", choices=sorted(instrumentation.FORMATS),
+        help="Time each stage (IMAP, MIME, segmentation, rules, policy, rendering) and report it on exit (default text)",
+    )
+    parser.add_argument("--profile-output", help="Write the --profile report to this file instead of stderr")
+    # Batch options
+    parser.add_argument("--workers", type=int, default=1, help="Worker processes for --batch (default 1)")
+    parser.add_argument("--unordered", action="store_true", help="With --workers, emit results as they finish (adds 'index')")
+    # Archive options
+    parser.add_argument("--archive-start", type=int, default=0, help="Resume --archive at this byte offset (from a previous 'offset')")
+    parser.add_argument("--archive-index", help="Index file for --archive; built on first use, reused while the archive is unchanged")
     # IMAP options
     parser.add_argument("--imap-host", help="IMAP server host")
     parser.add_argument("--imap-port", type=int, default=993, help="IMAP SSL port (default 993)")
@@ -45,27 +121,134 @@ def main(argv=None):
     parser.add_argument("--imap-mailbox", default="INBOX", help="Mailbox (default INBOX)")
     parser.add_argument("--imap-subject", help="Subject to match and fetch thread")
     parser.add_argument("--imap-limit", type=int, help="Limit number of messages considered")
+    parser.add_argument("--imap-all", action="store_true", help="Classify every conversation in the mailbox (one JSON line per thread)")
+    parser.add_argument("--imap-fetch-chunk", type=int, default=100, help="Messages per UID FETCH round-trip (default 100)")
+    parser.add_argument("--imap-cache", help="Path to a local SQLite mailbox cache for incremental fetches")
+    parser.add_argument("--imap-cache-mb", type=int, default=256, help="Size budget for --imap-cache in MB (default 256)")
     # Gmail OAuth2
     parser.add_argument("--gmail-oauth", action="store_true", help="Use Gmail OAuth2 (XOAUTH2) for IMAP")
     parser.add_argument("--gmail-client-secrets", help="Path to Google OAuth client_secret.json")
     parser.add_argument("--gmail-token", default=".gmail_token.json", help="Path to store OAuth token JSON")
     args = parser.parse_args(argv)
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    if args.workers > 1 and not args.batch:
+        parser.error("--workers requires --batch")
+    if args.state and (args.batch or args.archive or args.imap_all):
+        parser.error("--state applies to a single thread (--thread or --imap --imap-subject)")
+    if args.workers > 1 and (args.detect_cache_size or args.detect_cache):
+        parser.error("--detect-cache-size/--detect-cache are not supported with --workers")
+    if args.workers > 1 and args.profile:
+        parser.error("--profile is not supported with --workers")
+    if args.profile:
+        instrumentation.enable()
 
     cfg = load_config(args.config)
     templates = load_templates(args.templates)
+    extra_ctx: Dict[str, Any] = json.loads(args.context)
+    # Templates that can't be filled from the thread plus --context render unformatted
+    for name, missing in templates.check({**dict.fromkeys(THREAD_FIELDS, ""), **extra_ctx}).items():
+        sys.stderr.write(f"warning: template {name!r} needs {', '.join(missing)} (pass via --context)\n")
+
+    cache = None
+    if args.detect_cache_size or args.detect_cache:
+        cache = DetectionCache(max_entries=args.detect_cache_size or 10000, path=args.detect_cache)
+    detector = build_detector(cfg, cache=cache)
+    try:
+        _run(parser, args, detector, build_policy(cfg), templates, extra_ctx)
+    finally:
+        if cache is not None:
+            sys.stderr.write(f"detection cache: {json.dumps(cache.stats())}\n")
+            cache.close()
+        if args.profile:
+            _write_profile(args.profile, args.profile_output)
+
+
+def _write_profile(fmt: str, path: Optional[str]) -> None:
+    report = instrumentation.FORMATS[fmt]()
+    if path:
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(report)
+    else:
+        sys.stderr.write(report)
+
+
+def _run(
+    parser: argparse.ArgumentParser,
+    args: argparse.Namespace,
+    detector: IntentDetector,
+    policy: Policy,
+    templates: Dict[str, str],
+    extra_ctx: Dict[str, Any],
+) -> None:
+    if args.batch:
+        f = sys.stdin if args.batch == "-" else open(args.batch, "r", encoding="utf-8")
+        try:
+            if args.workers > 1:
+                run_batch_parallel(
+                    f, sys.stdout, args.config, args.templates, extra_ctx,
+                    workers=args.workers, ordered=not args.unordered,
+                )
+            else:
+                run_batch(f, sys.stdout, detector, templates, extra_ctx, policy)
+        finally:
+            if f is not sys.stdin:
+                f.close()
+        return
+
+    if args.archive:
+        from .archive import ThreadArchive
+
+        # One JSON line per thread with its byte offset, so an interrupted run can resume.
+        # A record that isn't a usable thread becomes {"offset", "error"}, as in --batch.
+        with ThreadArchive(args.archive, index_path=args.archive_index) as archive:
+            if args.archive_index and not archive.indexed:
+                archive.build_index(args.archive_index)
+            for offset, thread in archive.records(start=args.archive_start):
+                if isinstance(thread, Exception):
+                    _write_line(sys.stdout, {"offset": offset, "error": str(thread)})
+                    continue
+                result = classify_item(thread, detector, templates, extra_ctx, policy)
+                _write_line(sys.stdout, {"offset": offset, "subject": thread.subject, **result})
+        sys.stdout.flush()
+        return
+
     if args.imap:
         # Basic validation
-        required = [args.imap_host, args.imap_username, args.imap_password, args.imap_subject]
+        required = [args.imap_host, args.imap_username, args.imap_password, args.imap_subject or args.imap_all]
         if not all(required):
-            parser.error("--imap requires --imap-host, --imap-username, --imap-password, and --imap-subject")
+            parser.error("--imap requires --imap-host, --imap-username, --imap-password, and --imap-subject (or --imap-all)")
+        from .imap_pool import shared_pool
+        from .ingest_imap import fetch_mailbox_threads, fetch_thread_by_subject
+        from .mail_cache import MailboxCache
+
         # Optionally use Gmail OAuth2 to get an access token and pass as oauth2:token
         imap_password = args.imap_password
         if args.gmail_oauth:
             if not args.gmail_client_secrets:
                 parser.error("--gmail-oauth requires --gmail-client-secrets")
+            from .gmail_oauth import get_access_token
+
             token, _ = get_access_token(args.gmail_client_secrets, args.gmail_token)
             imap_password = f"oauth2:{token}"
 
+        cache = MailboxCache(args.imap_cache, max_bytes=args.imap_cache_mb * 1024 * 1024) if args.imap_cache else None
+        if args.imap_all:
+            threads = fetch_mailbox_threads(
+                host=args.imap_host,
+                port=args.imap_port,
+                username=args.imap_username,
+                password=imap_password,
+                mailbox=args.imap_mailbox,
+                limit=args.imap_limit,
+                fetch_chunk_size=args.imap_fetch_chunk,
+                pool=shared_pool(),
+                cache=cache,
+            )
+            for thread in threads:
+                _write_line(sys.stdout, {"subject": thread.subject, **classify_thread(thread, detector, templates, extra_ctx, policy)})
+            sys.stdout.flush()
+            return
         thread = fetch_thread_by_subject(
             host=args.imap_host,
             port=args.imap_port,
@@ -74,44 +257,19 @@ def main(argv=None):
             subject=args.imap_subject,
             mailbox=args.imap_mailbox,
             limit=args.imap_limit,
+            fetch_chunk_size=args.imap_fetch_chunk,
+            pool=shared_pool(),
+            cache=cache,
         )
     else:
         thread = _load_thread(args.thread)
-    extra_ctx: Dict[str, Any] = json.loads(args.context)
-
-    detector = IntentDetector(
-        rules=cfg.get("rules", {}),
-        team_domains=cfg.get("team", {}).get("domains", []),
-        team_addresses=cfg.get("team", {}).get("addresses", []),
-    )
 
-    all_detections = []
-    for msg in thread.messages:
-        intents = detector.detect(msg)
-        all_detections.append({
-            "from": msg.from_email,
-            "intents": [i.__dict__ for i in intents],
-        })
-
-    latest_intents = []
-    if thread.messages:
-        latest_intents = detector.detect(thread.messages[-1])
-
-    decision = choose_next_action(latest_intents)
-
-    ctx = {
-        "subject": thread.subject,
-        "latest_from": thread.messages[-1].from_name if thread.messages else "",
-        "latest_email": thread.messages[-1].from_email if thread.messages else "",
-        **extra_ctx,
-    }
-    draft = render_template(templates, decision.get("template", "ack_general"), ctx)
-
-    output = {
-        "detections": all_detections,
-        "decision": decision,
-        "draft": draft,
-    }
+    if args.state:
+        state = ThreadState.load(args.state)
+        output = state.classify(thread, detector, templates, extra_ctx, policy)
+        state.save(args.state)
+    else:
+        output = classify_thread(thread, detector, templates, extra_ctx, policy)
     print(json.dumps(output, indent=2))
 
 
@@ -4,11 +4,18 @@ import yaml
 
 def load_config(path: str) -> Dict[str, Any]:
     with open(path, "r", encoding="utf-8") as f:
-        cfg = yaml.safe_load(f) or {}
-    # Normalize expected keys
-    cfg.setdefault("team", {})
+        return normalize_config(yaml.safe_load(f))
+
+
+def normalize_config(cfg: Any) -> Dict[str, Any]:
+    # Fills in the expected keys of a parsed config, wherever it was read from
+    # (a file here, an upload in the Streamlit app); empty sections count as missing
+    cfg = cfg or {}
+    if not isinstance(cfg, dict):
+        raise ValueError(f"config must be a mapping, got {type(cfg).__name__}")
+    for key in ("team", "rules", "settings"):
+        if cfg.get(key) is None:
+            cfg[key] = {}
     cfg["team"].setdefault("domains", [])
     cfg["team"].setdefault("addresses", [])
-    cfg.setdefault("rules", {})
-    cfg.setdefault("settings", {})
     return cfg
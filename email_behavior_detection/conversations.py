@@ -0,0 +1,159 @@
+import re
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from .models import Message, Thread
+
+
+_MSGID_RE = re.compile(r"<[^<>\s]+>")
+_REPLY_PREFIX_RE = re.compile(r"^\s*((re|fwd?|aw|sv|wg)(\[\d+\])?\s*:\s*)+", re.I)
+
+# What threading needs from one message: (timestamp, subject, Message-ID, In-Reply-To,
+# References), so callers can thread without keeping whole messages around
+ThreadKey = Tuple[str, str, str, str, str]
+
+
+class _Container:
+    __slots__ = ("message", "order", "parent", "children")
+
+    def __init__(self):
+        # Position of the message in the input, or None for a referenced-only id
+        self.message: Optional[int] = None
+        self.order = 0
+        self.parent: Optional["_Container"] = None
+        self.children: List["_Container"] = []
+
+    def is_ancestor_of(self, other: "_Container") -> bool:
+        node = other
+        while node is not None:
+            if node is self:
+                return True
+            node = node.parent
+        return False
+
+    def set_parent(self, parent: Optional["_Container"]) -> None:
+        if self.parent is not None:
+            self.parent.children.remove(self)
+        self.parent = parent
+        if parent is not None:
+            parent.children.append(self)
+
+
+def _ids(value: Optional[str]) -> List[str]:
+    return _MSGID_RE.findall(value or "")
+
+
+def strip_reply_prefix(subject: str) -> str:
+    return _REPLY_PREFIX_RE.sub("", subject or "").strip()
+
+
+def base_subject(subject: str) -> str:
+    # "Re: Fwd: Plan" and "plan" group together
+    return " ".join(strip_reply_prefix(subject).split()).lower()
+
+
+def _sort_key(timestamp: str, order: int):
+    try:
+        return (datetime.fromisoformat(timestamp).timestamp(), order)
+    except (TypeError, ValueError):
+        return (float("inf"), order)
+
+
+def thread_key(msg: Message) -> ThreadKey:
+    meta = msg.meta
+    return (
+        msg.timestamp, meta.get("subject", ""),
+        meta.get("message_id", ""), meta.get("in_reply_to", ""), meta.get("references", ""),
+    )
+
+
+def thread_messages(messages: Iterable[Message]) -> List[Thread]:
+    # Group messages into conversations from Message-ID / In-Reply-To / References
+    # (kept in msg.meta by the IMAP ingester)
+    messages = list(messages)
+    return [
+        Thread(
+            subject=strip_reply_prefix(messages[group[0]].meta.get("subject", "")),
+            messages=[messages[i] for i in group],
+        )
+        for group in thread_indices([thread_key(m) for m in messages])
+    ]
+
+
+def thread_indices(keys: Sequence[ThreadKey]) -> List[List[int]]:
+    # Conversations as lists of positions in `keys`, each in date order, following the
+    # JWZ threading algorithm: one pass builds an id -> container index and links each
+    # message under its reference chain, then roots are collected and orphan "Re:"
+    # roots are joined to the conversation with the same base subject.
+    id_table: Dict[str, _Container] = {}
+    for order, (_, _, message_id, in_reply_to, references) in enumerate(keys):
+        own = _ids(message_id)
+        mid = own[0] if own else ""
+        container = id_table.get(mid) if mid else None
+        if container is None or container.message is not None:
+            # New id, or a duplicate Message-ID: give the message its own container
+            container = _Container()
+            id_table[mid if mid and mid not in id_table else f"<synthetic-{order}>"] = container
+        container.message = order
+        container.order = order
+
+        refs = _ids(references)
+        reply_to = _ids(in_reply_to)
+        if reply_to and (not refs or refs[-1] != reply_to[0]):
+            refs.append(reply_to[0])
+
+        # Link the reference chain, never creating a loop or overriding an existing link
+        parent: Optional[_Container] = None
+        for ref in refs:
+            ref_container = id_table.setdefault(ref, _Container())
+            if (
+                parent is not None
+                and ref_container.parent is None
+                and ref_container is not parent
+                and not ref_container.is_ancestor_of(parent)
+            ):
+                ref_container.set_parent(parent)
+            parent = ref_container
+
+        # The last reference is this message's parent
+        if parent is not None and parent is not container and not container.is_ancestor_of(parent):
+            container.set_parent(parent)
+        elif parent is None and container.parent is not None:
+            container.set_parent(None)
+
+    groups = [_collect(c) for c in id_table.values() if c.parent is None]
+    groups = sorted((g for g in groups if g), key=lambda g: min(c.order for c in g))
+
+    threads: List[List[_Container]] = []
+    by_subject: Dict[str, List[_Container]] = {}
+    for members in groups:
+        first = keys[min(members, key=lambda c: c.order).message]
+        key = base_subject(first[1])
+        if key in by_subject and len(members) == 1 and _lost_reply(first):
+            by_subject[key].extend(members)
+            continue
+        threads.append(members)
+        if key:
+            by_subject.setdefault(key, members)
+
+    return [
+        [c.message for c in sorted(members, key=lambda c: _sort_key(keys[c.message][0], c.order))]
+        for members in threads
+    ]
+
+
+def _lost_reply(key: ThreadKey) -> bool:
+    # A "Re:" message with no threading headers; only these are merged by subject
+    _, subject, _, in_reply_to, references = key
+    return bool(_REPLY_PREFIX_RE.match(subject)) and not (_ids(references) or _ids(in_reply_to))
+
+
+def _collect(root: _Container) -> List[_Container]:
+    found = []
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        if node.message is not None:
+            found.append(node)
+        stack.extend(node.children)
+    return found
@@ -0,0 +1,171 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Dict, Optional, Tuple
+
+if TYPE_CHECKING:
+    import sqlite3
+
+# Cached detections are stored as plain (name, confidence, evidence) tuples so entries
+# are immutable and cheap to keep; callers get fresh DetectedIntent objects
+Entry = Tuple[Tuple[str, float, str], ...]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS detections (
+    key TEXT PRIMARY KEY,
+    version TEXT NOT NULL,
+    intents TEXT NOT NULL
+);
+"""
+
+
+def content_key(version: str, from_name: str, body: str) -> str:
+    # Detection lowercases its input and keywords never start or end with whitespace,
+    # so case and surrounding whitespace can be normalized away without changing results
+    h = hashlib.sha1(version.encode("utf-8"))
+    h.update(b"\0")
+    h.update(from_name.lower().encode("utf-8", "surrogatepass"))
+    h.update(b"\0")
+    h.update(body.strip().lower().encode("utf-8", "surrogatepass"))
+    return h.hexdigest()
+
+
+class DetectionCache:
+    # Content-addressed cache of detector results: a bounded in-memory LRU tier and an
+    # optional SQLite tier that survives restarts. Keys include the detector version, and
+    # bind() drops everything stored under another version, so changing the config rules
+    # or team lists never serves stale results. New entries reach the disk in batches of
+    # flush_every (and on flush()/close()), one transaction each; the table is kept to
+    # about max_disk_entries rows by dropping the oldest.
+
+    def __init__(
+        self,
+        max_entries: int = 10000,
+        path: Optional[str] = None,
+        flush_every: int = 500,
+        max_disk_entries: int = 1_000_000,
+    ):
+        self.max_entries = max_entries
+        self.path = path
+        self.flush_every = max(1, flush_every)
+        self.max_disk_entries = max_disk_entries
+        self.version: Optional[str] = None
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._memory: "OrderedDict[str, Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: "Optional[sqlite3.Connection]" = None
+        # key -> serialized entry, written on the next flush
+        self._pending: Dict[str, str] = {}
+        self._disk_rows = 0
+        if path:
+            # Imported here so detection without an on-disk tier never loads sqlite3
+            import sqlite3
+
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.executescript(_SCHEMA)
+            self._disk_rows = self._db.execute("SELECT COUNT(*) FROM detections").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            if self._db is not None:
+                self._flush()
+                self._db.close()
+                self._db = None
+
+    def flush(self) -> None:
+        with self._lock:
+            self._flush()
+
+    def _flush(self) -> None:
+        if self._db is None or not self._pending:
+            return
+        version = self.version or ""
+        with self._db:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO detections (key, version, intents) VALUES (?, ?, ?)",
+                [(key, version, data) for key, data in self._pending.items()],
+            )
+            self._disk_rows += len(self._pending)
+            self._pending.clear()
+            # Pruned once the table is 10% over its cap, so it isn't done on every flush.
+            # Replaced rows get a new rowid, so low rowids are the oldest entries.
+            if self._disk_rows > self.max_disk_entries * 1.1:
+                self._db.execute(
+                    "DELETE FROM detections WHERE rowid NOT IN "
+                    "(SELECT rowid FROM detections ORDER BY rowid DESC LIMIT ?)",
+                    (self.max_disk_entries,),
+                )
+                self._disk_rows = self._db.execute("SELECT COUNT(*) FROM detections").fetchone()[0]
+
+    def bind(self, version: str) -> None:
+        # Called by the detector that uses this cache
+        with self._lock:
+            if version == self.version:
+                return
+            self.version = version
+            self._memory.clear()
+            self._pending.clear()
+            if self._db is not None:
+                with self._db:
+                    self._db.execute("DELETE FROM detections WHERE version != ?", (version,))
+                self._disk_rows = self._db.execute("SELECT COUNT(*) FROM detections").fetchone()[0]
+
+    def get(self, key: str) -> Optional[Entry]:
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return entry
+            if self._db is not None:
+                data = self._pending.get(key)
+                if data is None:
+                    row = self._db.execute("SELECT intents FROM detections WHERE key=?", (key,)).fetchone()
+                    data = row[0] if row is not None else None
+                if data is not None:
+                    entry = tuple(tuple(i) for i in json.loads(data))
+                    self._remember(key, entry)
+                    self.disk_hits += 1
+                    return entry
+            self.misses += 1
+            return None
+
+    def put(self, key: str, entry: Entry) -> None:
+        with self._lock:
+            self._remember(key, entry)
+            if self._db is not None:
+                self._pending[key] = json.dumps(entry)
+                if len(self._pending) >= self.flush_every:
+                    self._flush()
+
+    def _remember(self, key: str, entry: Entry) -> None:
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "entries": len(self._memory),
+                "disk_entries": self._disk_rows + len(self._pending),
+            }
+
+    def __len__(self) -> int:
+        return len(self._memory)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+            self._pending.clear()
+            if self._db is not None:
+                with self._db:
+                    self._db.execute("DELETE FROM detections")
+                self._disk_rows = 0
+
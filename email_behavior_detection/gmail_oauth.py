@@ -1,48 +1,335 @@
 from __future__ import annotations
 
-import json
+import atexit
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
 from pathlib import Path
-from typing import Optional, Tuple
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
 
 from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
 
+try:
+    import fcntl
+except ImportError:  # Windows: token files are only locked within the process
+    fcntl = None
+
 
 SCOPES = ["https://mail.google.com/"]
 
+# Builds the transport used to refresh tokens: anything implementing
+# google.auth.transport.Request, so tests can substitute a local stand-in
+RequestFactory = Callable[[], Any]
+
+_file_locks: Dict[str, threading.Lock] = {}
+_file_locks_guard = threading.Lock()
+
+
+@contextmanager
+def _token_lock(token_file: str) -> Iterator[None]:
+    # Serializes read-refresh-write of one token file between threads, and between
+    # processes where fcntl is available, so concurrent callers never refresh twice
+    # or interleave writes
+    key = os.path.realpath(token_file)
+    with _file_locks_guard:
+        lock = _file_locks.setdefault(key, threading.Lock())
+    with lock:
+        if fcntl is None:
+            yield
+            return
+        path = f"{key}.lock"
+        while True:
+            f = open(path, "a")
+            try:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+                # The holder before us removes the file when it is done; a lock taken
+                # on a removed file doesn't exclude anyone, so start over on a new one
+                st = os.fstat(f.fileno())
+                try:
+                    current = os.stat(path)
+                except FileNotFoundError:
+                    current = None
+                if current is not None and (current.st_dev, current.st_ino) == (st.st_dev, st.st_ino):
+                    break
+            except BaseException:
+                f.close()
+                raise
+            f.close()
+        try:
+            yield
+        finally:
+            # Removed while still locked, so the lock file doesn't outlive its use;
+            # closing the file releases the lock
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+            f.close()
+
+
+def _write_token(token_file: str, creds: Credentials) -> None:
+    # Written to a private temporary file and renamed, so readers never see half a token
+    path = Path(token_file)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(creds.to_json())
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def _seconds_left(creds: Credentials) -> float:
+    if not creds.token:
+        return 0.0
+    if creds.expiry is None:
+        return float("inf")
+    # google-auth keeps expiry as a naive UTC datetime
+    return (creds.expiry - datetime.now(timezone.utc).replace(tzinfo=None)).total_seconds()
+
+
+def _load_or_refresh(token_file: str, request: Optional[Any] = None, min_seconds: float = 0.0) -> Optional[Credentials]:
+    # Stored credentials if they are valid for at least min_seconds more, otherwise
+    # refreshed and saved; None when there is no refresh token. The file is re-read
+    # under the lock, so a token another caller just refreshed is reused.
+    token_path = Path(token_file)
+    with _token_lock(token_file):
+        creds: Optional[Credentials] = None
+        if token_path.exists():
+            creds = Credentials.from_authorized_user_file(str(token_path), SCOPES)
+        if creds and creds.valid and _seconds_left(creds) > min_seconds:
+            return creds
+        if not (creds and creds.refresh_token):
+            return None
+        creds.refresh(request or Request())
+        _write_token(token_file, creds)
+    return creds
+
+
+def _authorize(client_secrets_file: Optional[str], token_file: str, use_console: bool) -> Credentials:
+    # The consent flow waits on the user, so it runs without the token file lock;
+    # only saving the result takes it
+    if not client_secrets_file:
+        raise ValueError(f"{token_file} holds no refresh token; client secrets are needed to authorize")
+    flow = InstalledAppFlow.from_client_secrets_file(client_secrets_file, SCOPES)
+    if use_console:
+        # Prints a URL and asks for code — works on Streamlit Cloud
+        creds = flow.run_console()
+    else:
+        # Local server flow opens a browser for consent — best for local runs
+        creds = flow.run_local_server(port=0)
+    # Save the credentials for the next run
+    with _token_lock(token_file):
+        _write_token(token_file, creds)
+    return creds
+
 
 def load_or_create_credentials(
-    client_secrets_file: str,
+    client_secrets_file: Optional[str],
     token_file: str,
     use_console: bool = False,
+    request: Optional[Any] = None,
+    min_seconds: float = 0.0,
 ) -> Credentials:
-    token_path = Path(token_file)
-    creds: Optional[Credentials] = None
-    if token_path.exists():
-        creds = Credentials.from_authorized_user_file(str(token_path), SCOPES)
-    if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
-            creds.refresh(Request())
-        else:
-            flow = InstalledAppFlow.from_client_secrets_file(client_secrets_file, SCOPES)
-            if use_console:
-                # Prints a URL and asks for code — works on Streamlit Cloud
-                creds = flow.run_console()
-            else:
-                # Local server flow opens a browser for consent — best for local runs
-                creds = flow.run_local_server(port=0)
-        # Save the credentials for the next run
-        token_path.write_text(creds.to_json())
+    # Stored credentials if they are valid for at least min_seconds more; otherwise a
+    # refresh, or the consent flow when there is no refresh token
+    creds = _load_or_refresh(token_file, request, min_seconds)
+    if creds is None:
+        creds = _authorize(client_secrets_file, token_file, use_console)
     return creds
 
 
+class _Account:
+    __slots__ = (
+        "token_file", "client_secrets_file", "use_console", "creds", "lock", "consent_lock", "last_used", "retry_at",
+        "error",
+    )
+
+    def __init__(self, token_file: str, client_secrets_file: Optional[str], use_console: bool):
+        self.token_file = token_file
+        self.client_secrets_file = client_secrets_file
+        self.use_console = use_console
+        self.creds: Optional[Credentials] = None
+        self.lock = threading.Lock()
+        # Held for the whole consent flow, which can take minutes; lock is not, so the
+        # background refresher and status() never wait on a user
+        self.consent_lock = threading.Lock()
+        self.last_used = time.monotonic()
+        self.retry_at = 0.0
+        self.error: Optional[str] = None
+
+
+class TokenCache:
+    # In-process credentials for any number of token files (one per account). Callers
+    # get the cached token without disk or network I/O while it is valid. A background
+    # thread refreshes tokens refresh_ahead seconds before they expire, so fetches do
+    # not wait on a refresh. Only accounts used within keep_warm seconds are refreshed
+    # ahead; the others refresh on their next use.
+
+    def __init__(
+        self,
+        refresh_ahead: float = 300.0,
+        keep_warm: float = 3600.0,
+        retry_after: float = 30.0,
+        request_factory: Optional[RequestFactory] = None,
+        background: bool = True,
+    ):
+        self.refresh_ahead = refresh_ahead
+        self.keep_warm = keep_warm
+        self.retry_after = retry_after
+        self.request_factory: RequestFactory = request_factory or Request
+        self.background = background
+        self._accounts: Dict[str, _Account] = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _account(self, token_file: str, client_secrets_file: Optional[str], use_console: bool) -> _Account:
+        key = os.path.realpath(token_file)
+        with self._lock:
+            acct = self._accounts.get(key)
+            if acct is None:
+                acct = self._accounts[key] = _Account(token_file, client_secrets_file, use_console)
+            elif client_secrets_file:
+                acct.client_secrets_file = client_secrets_file
+                acct.use_console = use_console
+        return acct
+
+    def credentials(
+        self,
+        token_file: str,
+        client_secrets_file: Optional[str] = None,
+        use_console: bool = False,
+    ) -> Credentials:
+        acct = self._account(token_file, client_secrets_file, use_console)
+        acct.last_used = time.monotonic()
+        creds = acct.creds
+        if creds is None or not creds.valid:
+            # Blocks only callers of this account, and only when no valid token is cached
+            with acct.lock:
+                creds = acct.creds
+                if creds is None or not creds.valid:
+                    creds = acct.creds = _load_or_refresh(acct.token_file, self.request_factory())
+                    acct.error = None
+            if creds is None:
+                # One consent flow per account at a time; whoever waited reuses its result
+                with acct.consent_lock:
+                    creds = acct.creds
+                    if creds is None or not creds.valid:
+                        creds = _load_or_refresh(acct.token_file, self.request_factory())
+                        if creds is None:
+                            creds = _authorize(acct.client_secrets_file, acct.token_file, acct.use_console)
+                        with acct.lock:
+                            acct.creds = creds
+                            acct.error = None
+            if self.background:
+                self.start()
+                self._wake.set()
+        return creds
+
+    def token(self, token_file: str, client_secrets_file: Optional[str] = None, use_console: bool = False) -> str:
+        return self.credentials(token_file, client_secrets_file, use_console).token
+
+    def refresh_due(self) -> float:
+        # One background pass: refreshes every warm account whose token expires within
+        # refresh_ahead, and returns the seconds until the next one is due
+        now = time.monotonic()
+        with self._lock:
+            accounts = list(self._accounts.values())
+        wait = 60.0
+        for acct in accounts:
+            creds = acct.creds
+            if creds is None or not creds.refresh_token or now - acct.last_used > self.keep_warm:
+                continue
+            if now < acct.retry_at:
+                wait = min(wait, acct.retry_at - now)
+                continue
+            due = _seconds_left(creds) - self.refresh_ahead
+            if due > 0:
+                wait = min(wait, due)
+                continue
+            # At most one attempt per account every retry_after seconds, whether it
+            # fails or the server hands out a token shorter-lived than refresh_ahead
+            acct.retry_at = now + self.retry_after
+            wait = min(wait, self.retry_after)
+            try:
+                with acct.lock:
+                    acct.creds = load_or_create_credentials(
+                        None, acct.token_file, request=self.request_factory(), min_seconds=self.refresh_ahead
+                    )
+                acct.error = None
+                if _seconds_left(acct.creds) > self.refresh_ahead:
+                    acct.retry_at = 0.0
+            except Exception as e:
+                acct.error = f"{type(e).__name__}: {e}"
+        return max(wait, 0.0)
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is not None or self._stop.is_set():
+                return
+
+            def run():
+                while not self._stop.is_set():
+                    delay = self.refresh_due()
+                    self._wake.wait(delay)
+                    self._wake.clear()
+
+            self._thread = threading.Thread(target=run, name="oauth-refresh", daemon=True)
+            self._thread.start()
+
+    def status(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            accounts = list(self._accounts.values())
+        return {
+            acct.token_file: {
+                "seconds_left": _seconds_left(acct.creds) if acct.creds is not None else None,
+                "error": acct.error,
+            }
+            for acct in accounts
+        }
+
+    def forget(self, token_file: str) -> None:
+        with self._lock:
+            self._accounts.pop(os.path.realpath(token_file), None)
+
+    def close(self) -> None:
+        self._stop.set()
+        self._wake.set()
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout=5)
+
+
+_shared_cache: Optional[TokenCache] = None
+_shared_lock = threading.Lock()
+
+
+def shared_cache() -> TokenCache:
+    # Process-wide token cache for the CLI, the Streamlit app and batch callers
+    global _shared_cache
+    with _shared_lock:
+        if _shared_cache is None:
+            _shared_cache = TokenCache()
+            atexit.register(_shared_cache.close)
+        return _shared_cache
+
+
 def get_access_token(
     client_secrets_file: str,
     token_file: str,
     use_console: bool = False,
+    cache: Optional[TokenCache] = None,
 ) -> Tuple[str, Credentials]:
-    creds = load_or_create_credentials(client_secrets_file, token_file, use_console=use_console)
-    if not creds.valid:
-        creds.refresh(Request())
+    creds = (cache or shared_cache()).credentials(token_file, client_secrets_file, use_console=use_console)
     return creds.token, creds
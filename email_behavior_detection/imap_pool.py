@@ -0,0 +1,216 @@
+import atexit
+import hashlib
+import imaplib
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+
+# Errors that mean a connection is gone and must be replaced rather than reused
+DROPPED_ERRORS = (imaplib.IMAP4.abort, OSError, EOFError)
+
+SessionKey = Tuple[str, int, str, str, str]
+
+
+def connect(
+    host: str,
+    port: int,
+    username: str,
+    password: str,
+    factory: Optional[Callable[[str, int], imaplib.IMAP4]] = None,
+) -> imaplib.IMAP4:
+    imap = (factory or imaplib.IMAP4_SSL)(host, port)
+    try:
+        # Support XOAUTH2 if password starts with 'oauth2:' (then it's an access token)
+        if password.startswith("oauth2:"):
+            access_token = password.split(":", 1)[1]
+            auth_string = f"user={username}\1auth=Bearer {access_token}\1\1"
+            imap.authenticate("XOAUTH2", lambda x: auth_string)
+        else:
+            imap.login(username, password)
+    except Exception:
+        try:
+            imap.logout()
+        except Exception:
+            pass
+        raise
+    return imap
+
+
+class _Session:
+    def __init__(self, imap: imaplib.IMAP4):
+        self.imap = imap
+        self.selected: Optional[str] = None
+        # last_used: last handed out; last_seen: last known-good exchange with the server
+        self.last_used = self.last_seen = time.monotonic()
+
+    def close(self) -> None:
+        try:
+            self.imap.logout()
+        except Exception:
+            pass
+
+
+class ImapPool:
+    # Authenticated IMAP sessions kept open between fetches. Sessions are keyed by
+    # host, port, username and mailbox plus a hash of the credential, so a session is
+    # only handed to a caller that could have opened it. Idle sessions are checked
+    # with NOOP before reuse and replaced when the server has dropped them.
+
+    def __init__(
+        self,
+        max_idle_per_key: int = 2,
+        noop_after: float = 60.0,
+        idle_timeout: float = 25 * 60.0,
+        factory: Optional[Callable[[str, int], imaplib.IMAP4]] = None,
+    ):
+        self.max_idle_per_key = max_idle_per_key
+        self.noop_after = noop_after
+        self.idle_timeout = idle_timeout
+        self.factory = factory
+        self._idle: Dict[SessionKey, List[_Session]] = {}
+        # (host, port, username) -> hash of the newest credential seen for it
+        self._current: Dict[Tuple[str, int, str], str] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._keepalive_thread: Optional[threading.Thread] = None
+
+    @staticmethod
+    def _key(host: str, port: int, username: str, password: str, mailbox: str) -> SessionKey:
+        secret = hashlib.sha256(password.encode("utf-8")).hexdigest()
+        return (host.lower(), int(port), username, mailbox, secret)
+
+    def _open(self, host: str, port: int, username: str, password: str) -> _Session:
+        return _Session(connect(host, port, username, password, factory=self.factory))
+
+    def _checkout(self, key: SessionKey) -> Optional[_Session]:
+        while True:
+            with self._lock:
+                idle = self._idle.get(key)
+                if not idle:
+                    return None
+                sess = idle.pop()
+            now = time.monotonic()
+            if now - sess.last_used > self.idle_timeout:
+                sess.close()
+                continue
+            if now - sess.last_seen > self.noop_after:
+                try:
+                    sess.imap.noop()
+                except Exception:
+                    sess.close()
+                    continue
+            return sess
+
+    def _checkin(self, key: SessionKey, sess: _Session, used: bool = True) -> None:
+        sess.last_seen = time.monotonic()
+        if used:
+            sess.last_used = sess.last_seen
+        with self._lock:
+            # Sessions opened with a credential that has since been replaced are retired
+            current = self._current.get(key[:3], key[4]) == key[4]
+            idle = self._idle.setdefault(key, [])
+            if current and len(idle) < self.max_idle_per_key and not self._stop.is_set():
+                idle.append(sess)
+                return
+        sess.close()
+
+    def _rotate(self, key: SessionKey) -> None:
+        # A new credential for an account (e.g. a refreshed OAuth token) closes the idle
+        # sessions authenticated with the old one instead of leaving them until idle_timeout
+        stale: List[_Session] = []
+        with self._lock:
+            if self._current.get(key[:3]) == key[4]:
+                return
+            self._current[key[:3]] = key[4]
+            for other in [k for k in self._idle if k[:3] == key[:3] and k[4] != key[4]]:
+                stale.extend(self._idle.pop(other))
+        for sess in stale:
+            sess.close()
+
+    @contextmanager
+    def session(
+        self,
+        host: str,
+        port: int,
+        username: str,
+        password: str,
+        mailbox: str = "INBOX",
+    ) -> Iterator[imaplib.IMAP4]:
+        # Yields an authenticated connection with `mailbox` selected. Only a session
+        # whose block exits cleanly goes back to the pool: after any error (a failed
+        # SELECT, an IMAP4.error mid-command, a dropped connection) its protocol state is
+        # unknown, so it is logged out and discarded.
+        key = self._key(host, port, username, password, mailbox)
+        self._rotate(key)
+        sess = self._checkout(key) or self._open(host, port, username, password)
+        try:
+            if sess.selected != mailbox:
+                sess.imap.select(mailbox)
+                sess.selected = mailbox
+            yield sess.imap
+        except BaseException:
+            sess.close()
+            raise
+        else:
+            self._checkin(key, sess)
+
+    def keepalive(self) -> None:
+        # NOOP idle sessions that are due, dropping any the server has closed
+        now = time.monotonic()
+        due: List[Tuple[SessionKey, _Session]] = []
+        with self._lock:
+            for key, idle in self._idle.items():
+                keep = []
+                for sess in idle:
+                    if now - sess.last_seen > self.noop_after:
+                        due.append((key, sess))
+                    else:
+                        keep.append(sess)
+                idle[:] = keep
+        for key, sess in due:
+            if now - sess.last_used > self.idle_timeout:
+                sess.close()
+                continue
+            try:
+                sess.imap.noop()
+            except Exception:
+                sess.close()
+                continue
+            self._checkin(key, sess, used=False)
+
+    def start_keepalive(self, interval: Optional[float] = None) -> None:
+        if self._keepalive_thread is not None:
+            return
+        period = interval or self.noop_after
+
+        def run():
+            while not self._stop.wait(period):
+                self.keepalive()
+
+        self._keepalive_thread = threading.Thread(target=run, name="imap-keepalive", daemon=True)
+        self._keepalive_thread.start()
+
+    def close(self) -> None:
+        self._stop.set()
+        with self._lock:
+            sessions = [s for idle in self._idle.values() for s in idle]
+            self._idle.clear()
+        for sess in sessions:
+            sess.close()
+
+
+_shared_pool: Optional[ImapPool] = None
+_shared_lock = threading.Lock()
+
+
+def shared_pool() -> ImapPool:
+    # Process-wide pool for the CLI, the Streamlit app and batch callers
+    global _shared_pool
+    with _shared_lock:
+        if _shared_pool is None:
+            _shared_pool = ImapPool()
+            _shared_pool.start_keepalive()
+            atexit.register(_shared_pool.close)
+        return _shared_pool
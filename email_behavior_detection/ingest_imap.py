@@ -1,11 +1,19 @@
+import base64
+import binascii
 import imaplib
 import email
+import quopri
 from email import policy
 from email.utils import parseaddr, getaddresses, parsedate_to_datetime
+from datetime import datetime
 from html import unescape
 import re
-from typing import List, Optional
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, TypeVar
 
+from . import instrumentation
+from .imap_pool import DROPPED_ERRORS, ImapPool, connect
+from .conversations import strip_reply_prefix, thread_messages
+from .mail_cache import CachedMessage, MailboxCache
 from .models import Thread, Message
 
 
@@ -13,127 +21,629 @@ def _clean_text(s: str) -> str:
     return re.sub(r"\s+", " ", s or " ").strip()
 
 
+_HTML_TOKEN_RE = re.compile(r"<(/?)([a-zA-Z][\w:-]*)([^>]*)>|<!--[\s\S]*?-->|<![^>]*>")
+# Elements whose whole content is dropped: non-text, and quoted-reply containers
+# (plain <blockquote>, Gmail, Yahoo, Thunderbird and Outlook reply wrappers).
+_HTML_SKIP_TAGS = {"script", "style", "head", "title", "blockquote"}
+_HTML_QUOTE_ATTR_RE = re.compile(r"gmail_quote|yahoo_quoted|moz-cite-prefix|divRplyFwdMsg|appendonsend", re.I)
+
+
 def _html_to_text(html: str) -> str:
+    # Single left-to-right scan over tags; text outside skipped elements is kept. A
+    # skipped element left open (an unclosed <head> is common) ends at <body>, and
+    # self-closing tags such as <title/> skip nothing.
     if not html:
         return ""
-    text = re.sub(r"<style[\s\S]*?</style>", " ", html, flags=re.I)
-    text = re.sub(r"<script[\s\S]*?</script>", " ", text, flags=re.I)
-    text = re.sub(r"<[^>]+>", " ", text)
-    return _clean_text(unescape(text))
-
-
-def _extract_body(msg: email.message.EmailMessage) -> str:
-    if msg.is_multipart():
-        # Prefer first text/plain part
-        for part in msg.walk():
-            ctype = part.get_content_type()
-            disp = (part.get("Content-Disposition") or "").lower()
-            if ctype == "text/plain" and "attachment" not in disp:
-                try:
-                    return part.get_content().strip()
-                except Exception:
-                    payload = part.get_payload(decode=True) or b""
-                    return payload.decode(part.get_content_charset() or "utf-8", errors="replace").strip()
-        # Fallback to first text/html
-        for part in msg.walk():
-            ctype = part.get_content_type()
-            disp = (part.get("Content-Disposition") or "").lower()
-            if ctype == "text/html" and "attachment" not in disp:
-                try:
-                    return _html_to_text(part.get_content())
-                except Exception:
-                    payload = part.get_payload(decode=True) or b""
-                    return _html_to_text(payload.decode(part.get_content_charset() or "utf-8", errors="replace"))
-    else:
-        ctype = msg.get_content_type()
-        try:
-            content = msg.get_content()
-        except Exception:
-            payload = msg.get_payload(decode=True) or b""
-            content = payload.decode(msg.get_content_charset() or "utf-8", errors="replace")
-        if ctype == "text/html":
+    out: List[str] = []
+    pos = 0
+    skip_tag: Optional[str] = None
+    depth = 0
+    for m in _HTML_TOKEN_RE.finditer(html):
+        if skip_tag is None:
+            out.append(html[pos:m.start()])
+            out.append(" ")
+        pos = m.end()
+        tag = m.group(2)
+        if not tag:
+            continue
+        tag = tag.lower()
+        closing = bool(m.group(1))
+        self_closing = m.group(3).endswith("/")
+        if skip_tag is not None:
+            if tag == "body" and not closing:
+                skip_tag = None
+            elif tag == skip_tag and not self_closing:
+                depth += -1 if closing else 1
+                if depth == 0:
+                    skip_tag = None
+            continue
+        if not closing and not self_closing and (tag in _HTML_SKIP_TAGS or (tag == "div" and _HTML_QUOTE_ATTR_RE.search(m.group(3)))):
+            skip_tag, depth = tag, 1
+    if skip_tag is None:
+        out.append(html[pos:])
+    return _clean_text(unescape("".join(out)))
+
+
+def _part_text(part: email.message.Message) -> str:
+    # Decode the transfer encoding and charset directly; cheaper than get_content()
+    payload = part.get_payload(decode=True) or b""
+    if isinstance(payload, str):
+        return payload
+    try:
+        return payload.decode(part.get_content_charset() or "utf-8", errors="replace")
+    except LookupError:
+        return payload.decode("utf-8", errors="replace")
+
+
+@instrumentation.timed("mime.extract_body")
+def _extract_body(msg: email.message.Message) -> str:
+    if not msg.is_multipart():
+        content = _part_text(msg)
+        if msg.get_content_type() == "text/html":
             return _html_to_text(content)
         return content.strip()
+    # One walk: first inline text/plain wins, else the first inline text/html.
+    # Other parts (attachments, images) are never decoded.
+    html_part = None
+    for part in msg.walk():
+        ctype = part.get_content_type()
+        if ctype != "text/plain" and ctype != "text/html":
+            continue
+        if "attachment" in (part.get("Content-Disposition") or "").lower():
+            continue
+        if ctype == "text/plain":
+            return _part_text(part).strip()
+        if html_part is None:
+            html_part = part
+    if html_part is not None:
+        return _html_to_text(_part_text(html_part))
+    return ""
 
 
-def fetch_thread_by_subject(
-    host: str,
-    port: int,
-    username: str,
-    password: str,
-    subject: str,
-    mailbox: str = "INBOX",
-    limit: Optional[int] = None,
-) -> Thread:
-    imap = imaplib.IMAP4_SSL(host, port)
+T = TypeVar("T")
+
+# Headers needed to filter, sort and thread messages before any body is downloaded
+HEADER_FIELDS = "SUBJECT FROM TO CC DATE MESSAGE-ID IN-REPLY-TO REFERENCES"
+
+_TOKEN_RE = re.compile(rb'''\s*(?:(\()|(\))|"((?:[^"\\]|\\.)*)"|\{\d+\}|([^\s()"\[\]]+(?:\[[^\]]*\][^\s()"]*)?))''')
+_ESCAPE_RE = re.compile(rb"\\(.)")
+
+
+def _tokenize_into(stack: List[List[Any]], chunk: bytes) -> None:
+    pos = 0
+    while pos < len(chunk):
+        m = _TOKEN_RE.match(chunk, pos)
+        if not m or m.end() == pos:
+            break
+        pos = m.end()
+        if m.group(1):
+            stack.append([])
+        elif m.group(2):
+            if len(stack) > 1:
+                done = stack.pop()
+                stack[-1].append(done)
+        elif m.group(3) is not None:
+            stack[-1].append(_ESCAPE_RE.sub(rb"\1", m.group(3)))
+        elif m.group(4) is not None:
+            atom = m.group(4)
+            stack[-1].append(None if atom.upper() == b"NIL" else atom)
+        # {n} literal markers carry no value; the literal itself follows as its own piece
+
+
+def _parse_fetch(data: List[Any]) -> Iterator[Dict[str, Any]]:
+    # imaplib splits a FETCH response into bytes lines and (prefix, literal) tuples;
+    # rebuild the nested lists and yield one {ITEM: value} dict per message.
+    stack: List[List[Any]] = [[]]
+    for piece in data:
+        if isinstance(piece, tuple):
+            _tokenize_into(stack, piece[0])
+            stack[-1].append(piece[1])
+        elif isinstance(piece, bytes):
+            _tokenize_into(stack, piece)
+    for item in stack[0]:
+        if isinstance(item, list):
+            yield {
+                item[i].decode("ascii", "replace").upper(): item[i + 1]
+                for i in range(0, len(item) - 1, 2)
+                if isinstance(item[i], bytes)
+            }
+
+
+def _section(attrs: Dict[str, Any]) -> bytes:
+    for key, value in attrs.items():
+        if key.startswith("BODY[") or key == "RFC822":
+            return value or b""
+    return b""
+
+
+def _uid_set(uids: List[bytes]) -> str:
+    # Compress sorted UIDs into an IMAP message-set, e.g. 1:4,9,12:13
+    nums = sorted({int(u) for u in uids})
+    ranges = []
+    start = prev = None
+    for n in nums:
+        if prev is not None and n == prev + 1:
+            prev = n
+            continue
+        if start is not None:
+            ranges.append(f"{start}:{prev}" if start != prev else str(start))
+        start = prev = n
+    if start is not None:
+        ranges.append(f"{start}:{prev}" if start != prev else str(start))
+    return ",".join(ranges)
+
+
+def _response_bytes(data: Any) -> int:
+    if isinstance(data, (bytes, bytearray)):
+        return len(data)
+    if isinstance(data, (list, tuple)):
+        return sum(_response_bytes(d) for d in data)
+    return 0
+
+
+def _uid(imap: imaplib.IMAP4, command: str, *args: Any) -> Tuple[str, List[Any]]:
+    # imap.uid() with a span and round-trip/byte counters when instrumentation is on
+    if not instrumentation.enabled:
+        return imap.uid(command, *args)
+    with instrumentation.span(f"imap.{command.lower()}"):
+        typ, data = imap.uid(command, *args)
+    instrumentation.count("imap.round_trips")
+    instrumentation.count("imap.response_bytes", _response_bytes(data))
+    return typ, data
+
+
+def _uid_fetch(imap: imaplib.IMAP4, uids: List[bytes], items: str, chunk_size: int) -> Iterator[Dict[str, Any]]:
+    # One UID FETCH per chunk of ids instead of one round-trip per message
+    chunk_size = max(1, chunk_size)
+    for i in range(0, len(uids), chunk_size):
+        typ, data = _uid(imap, "FETCH", _uid_set(uids[i:i + chunk_size]), items)
+        if typ != "OK" or not data:
+            continue
+        yield from _parse_fetch(data)
+
+
+def _text_part(bs: Any, section: str = "") -> Optional[Tuple[str, str, str, str]]:
+    # Pick (section, subtype, encoding, charset) of the first inline text/plain part,
+    # else the first inline text/html part, from a parsed BODYSTRUCTURE.
+    plain = html = None
+    for sec, part in _leaf_parts(bs, section):
+        ctype = (part[0] or b"").decode("ascii", "replace").lower()
+        subtype = (part[1] or b"").decode("ascii", "replace").lower()
+        if ctype != "text" or subtype not in ("plain", "html"):
+            continue
+        disp = part[9] if len(part) > 9 and isinstance(part[9], list) and part[9] else None
+        if disp and isinstance(disp[0], bytes) and disp[0].lower() == b"attachment":
+            continue
+        params = part[2] if isinstance(part[2], list) else []
+        charset = ""
+        for k, v in zip(params[::2], params[1::2]):
+            if isinstance(k, bytes) and k.lower() == b"charset" and isinstance(v, bytes):
+                charset = v.decode("ascii", "replace")
+        encoding = (part[5] or b"7bit").decode("ascii", "replace").lower() if len(part) > 5 else "7bit"
+        found = (sec, subtype, encoding, charset)
+        if subtype == "plain":
+            plain = plain or found
+            break
+        html = html or found
+    return plain or html
+
+
+def _leaf_parts(bs: Any, section: str) -> Iterator[Tuple[str, List[Any]]]:
+    if not isinstance(bs, list) or not bs:
+        return
+    if isinstance(bs[0], list):
+        n = 0
+        for child in bs:
+            if not isinstance(child, list):
+                break
+            n += 1
+            yield from _leaf_parts(child, f"{section}.{n}" if section else str(n))
+    elif len(bs) > 5:
+        yield section or "1", bs
+
+
+def _decode_part(payload: bytes, encoding: str, charset: str) -> str:
     try:
-        # Support XOAUTH2 if password starts with 'oauth2:' (then it's an access token)
-        if password.startswith("oauth2:"):
-            access_token = password.split(":", 1)[1]
-            auth_string = f"user={username}\1auth=Bearer {access_token}\1\1"
-            imap.authenticate("XOAUTH2", lambda x: auth_string)
-        else:
-            imap.login(username, password)
-        imap.select(mailbox)
+        if encoding == "base64":
+            payload = base64.b64decode(payload)
+        elif encoding == "quoted-printable":
+            payload = quopri.decodestring(payload)
+    except (binascii.Error, ValueError):
+        pass
+    try:
+        text = payload.decode(charset or "utf-8", errors="replace")
+    except LookupError:
+        text = payload.decode("utf-8", errors="replace")
+    return text.replace("\r\n", "\n")
+
+
+def _parse_headers(em: email.message.EmailMessage) -> Tuple[Optional[datetime], str, Message]:
+    sub = em.get('Subject', '') or ''
+    # Addresses
+    from_name, from_email = parseaddr(em.get('From', '') or '')
+    to_list = [addr for _, addr in getaddresses(em.get_all('To', []) or []) if addr]
+    cc_list = [addr for _, addr in getaddresses(em.get_all('Cc', []) or []) if addr]
+    date_hdr = em.get('Date', '') or ''
+    dt: Optional[datetime] = None
+    try:
+        dt = parsedate_to_datetime(date_hdr)
+        ts = dt.isoformat()
+    except Exception:
+        ts = date_hdr
+    meta = {"subject": sub}
+    for key, header in (("message_id", "Message-ID"), ("in_reply_to", "In-Reply-To"), ("references", "References")):
+        value = em.get(header)
+        if value:
+            meta[key] = " ".join(str(value).split())
+    return dt, sub, Message(
+        timestamp=ts,
+        from_name=from_name or from_email,
+        from_email=from_email or '',
+        to=to_list,
+        cc=cc_list,
+        body='',
+        meta=meta
+    )
+
+
+def _parse_message(raw: bytes) -> Tuple[Optional[datetime], str, Message]:
+    em = email.message_from_bytes(raw, policy=policy.default)
+    dt, sub, msg = _parse_headers(em)
+    msg.body = _extract_body(em)
+    return dt, sub, msg
 
-        # Try subject search (quoted)
-        typ, data = imap.search(None, 'SUBJECT', f'"{subject}"')
-        ids = []
-        if typ == 'OK' and data and len(data) > 0:
+
+def _fetch_headers(imap: imaplib.IMAP4, uids: List[bytes], chunk_size: int) -> Iterator[Tuple[bytes, Optional[datetime], str, Message]]:
+    items = f"(UID BODY.PEEK[HEADER.FIELDS ({HEADER_FIELDS})])"
+    for attrs in _uid_fetch(imap, uids, items, chunk_size):
+        uid = attrs.get("UID")
+        if uid is None:
+            continue
+        dt, sub, msg = _parse_headers(email.message_from_bytes(_section(attrs), policy=policy.default))
+        yield uid, dt, sub, msg
+
+
+# (section, subtype, encoding, charset) of the chosen text part, or None when the
+# payload is the full message source
+TextPart = Optional[Tuple[str, str, str, str]]
+
+
+def _fetch_text_parts(imap: imaplib.IMAP4, uids: List[bytes], chunk_size: int) -> Iterator[Tuple[bytes, TextPart, bytes]]:
+    # Phase two, network side: read BODYSTRUCTURE, then download only the chosen text
+    # part of each message. Messages whose structure can't be read, that have no inline
+    # text part, or whose part didn't come back fall back to the full source.
+    # Yields undecoded (uid, part, payload) so decoding can happen elsewhere.
+    wanted = set(uids)
+    parts: Dict[bytes, Tuple[str, str, str, str]] = {}
+    for attrs in _uid_fetch(imap, list(uids), "(UID BODYSTRUCTURE)", chunk_size):
+        uid = attrs.get("UID")
+        if uid not in wanted or not isinstance(attrs.get("BODYSTRUCTURE"), list):
+            continue
+        part = _text_part(attrs["BODYSTRUCTURE"])
+        if part:
+            parts[uid] = part
+
+    missing = wanted - set(parts)
+    by_section: Dict[str, List[bytes]] = {}
+    for uid, part in parts.items():
+        by_section.setdefault(part[0], []).append(uid)
+    for section, section_uids in by_section.items():
+        pending = set(section_uids)
+        for attrs in _uid_fetch(imap, section_uids, f"(UID BODY.PEEK[{section}])", chunk_size):
+            uid = attrs.get("UID")
+            if uid in pending:
+                pending.discard(uid)
+                yield uid, parts[uid], _section(attrs)
+        missing |= pending
+
+    for attrs in _uid_fetch(imap, sorted(missing), "(UID BODY.PEEK[])", chunk_size):
+        uid = attrs.get("UID")
+        if uid in missing:
+            missing.discard(uid)
+            yield uid, None, _section(attrs)
+
+
+@instrumentation.timed("mime.decode_body")
+def _decode_body(part: TextPart, payload: bytes) -> str:
+    if part is None:
+        return _extract_body(email.message_from_bytes(payload, policy=policy.default))
+    _, subtype, encoding, charset = part
+    text = _decode_part(payload, encoding, charset)
+    return _html_to_text(text) if subtype == "html" else text.strip()
+
+
+def _fetch_bodies(imap: imaplib.IMAP4, by_uid: Dict[bytes, Message], chunk_size: int) -> None:
+    unfetched = set(by_uid)
+    for uid, part, payload in _fetch_text_parts(imap, list(by_uid), chunk_size):
+        by_uid[uid].body = _decode_body(part, payload)
+        unfetched.discard(uid)
+    # The server returned nothing for these: flag them rather than pass them off as
+    # messages that are genuinely empty (meta values are strings, so "1")
+    for uid in unfetched:
+        by_uid[uid].meta["body_unavailable"] = "1"
+
+
+def _fetch_thread(
+    imap: imaplib.IMAP4,
+    subject: str,
+    limit: Optional[int],
+    fetch_chunk_size: int,
+) -> Thread:
+    # Try subject search (quoted)
+    typ, data = _uid(imap, 'SEARCH', None, 'SUBJECT', f'"{subject}"')
+    ids = []
+    if typ == 'OK' and data and len(data) > 0 and data[0]:
+        ids = data[0].split()
+    if not ids:
+        # Fallback to ALL and filter client-side
+        typ, data = _uid(imap, 'SEARCH', None, 'ALL')
+        if typ == 'OK' and data and data[0]:
             ids = data[0].split()
-        if not ids:
-            # Fallback to ALL and filter client-side
-            typ, data = imap.search(None, 'ALL')
-            if typ == 'OK' and data:
-                ids = data[0].split()
-
-        # Limit and sort (ascending by date if possible)
-        msgs = []
-        for msg_id in ids[-(limit or len(ids)):] if ids else []:
-            ftyp, fdata = imap.fetch(msg_id, '(RFC822)')
-            if ftyp != 'OK' or not fdata or not isinstance(fdata[0], tuple):
-                continue
-            raw = fdata[0][1]
-            em = email.message_from_bytes(raw, policy=policy.default)
-            sub = em.get('Subject', '') or ''
-            if subject and subject.lower() not in (sub or '').lower():
+
+    # Phase one: headers only, to filter on subject and sort by date. Read newest UIDs
+    # first, a chunk at a time, and stop once `limit` messages match, so the limit also
+    # bounds what is fetched when the whole mailbox was searched.
+    ids.sort(key=int)
+    headers = []
+    end = len(ids)
+    while end > 0 and not (limit and len(headers) >= limit):
+        chunk = ids[max(0, end - fetch_chunk_size):end]
+        end -= len(chunk)
+        matched = []
+        for uid, dt, sub, msg in _fetch_headers(imap, chunk, fetch_chunk_size):
+            if subject and subject.lower() not in sub.lower():
                 # client-side filter when using ALL
                 continue
-            # Addresses
-            from_name, from_email = parseaddr(em.get('From', '') or '')
-            to_list = [addr for _, addr in getaddresses(em.get_all('To', []) or []) if addr]
-            cc_list = [addr for _, addr in getaddresses(em.get_all('Cc', []) or []) if addr]
-            date_hdr = em.get('Date', '') or ''
+            matched.append((dt, uid, msg))
+        headers[:0] = matched
+    # Subject of the oldest match, kept in meta by _parse_headers
+    first_subject = headers[0][2].meta.get("subject", "") if headers else ''
+
+    # Sort by datetime if available, then keep the most recent `limit`
+    headers.sort(key=lambda x: x[0].timestamp() if x[0] else 0.0)
+    if limit:
+        headers = headers[-limit:]
+
+    # Phase two: text bodies for the survivors only
+    _fetch_bodies(imap, {uid: msg for _, uid, msg in headers}, fetch_chunk_size)
+    thread_msgs = [m for _, _, m in headers]
+
+    thread_subject = subject or first_subject
+    return Thread(subject=thread_subject, messages=thread_msgs)
+
+
+_UIDVALIDITY_RE = re.compile(rb"UIDVALIDITY (\d+)")
+
+
+def _uidvalidity(imap: imaplib.IMAP4, mailbox: str) -> Optional[int]:
+    # Use the value from the SELECT response when it is still pending, else ask STATUS
+    _, data = imap.response("UIDVALIDITY")
+    if data and data[0] is not None:
+        return int(data[-1])
+    typ, data = imap.status(mailbox, "(UIDVALIDITY)")
+    if typ == "OK" and data and isinstance(data[0], bytes):
+        m = _UIDVALIDITY_RE.search(data[0])
+        if m:
+            return int(m.group(1))
+    return None
+
+
+def _sync_cache(
+    imap: imaplib.IMAP4,
+    cache: MailboxCache,
+    account: str,
+    mailbox: str,
+    fetch_chunk_size: int,
+) -> bool:
+    uidvalidity = _uidvalidity(imap, mailbox)
+    if uidvalidity is None:
+        return False
+    last = cache.begin_sync(account, mailbox, uidvalidity)
+
+    # One search for every UID on the server: cached UIDs missing from it were expunged
+    # and are dropped, and only headers of UIDs above the last one seen are fetched.
+    typ, data = _uid(imap, 'SEARCH', None, 'ALL')
+    if typ != 'OK':
+        return False
+    server_ids = data[0].split() if data and data[0] else []
+    cache.forget_missing(account, mailbox, (int(u) for u in server_ids))
+    new_ids = [u for u in server_ids if int(u) > last]
+    if new_ids:
+        cache.add_headers(
+            account, mailbox,
+            ((int(uid), dt, sub, msg) for uid, dt, sub, msg in _fetch_headers(imap, new_ids, fetch_chunk_size)),
+            highest_uid=max(int(u) for u in new_ids),
+        )
+    return True
+
+
+def _fill_bodies_cached(
+    imap: imaplib.IMAP4,
+    cache: MailboxCache,
+    account: str,
+    mailbox: str,
+    found: List[CachedMessage],
+    fetch_chunk_size: int,
+) -> None:
+    missing = {str(uid).encode(): msg for uid, _, _, msg, has_body in found if not has_body}
+    if missing:
+        _fetch_bodies(imap, missing, fetch_chunk_size)
+        # Unavailable bodies are left uncached so the next run asks the server again
+        cache.set_bodies(account, mailbox, {
+            int(uid): msg.body for uid, msg in missing.items() if not msg.meta.get("body_unavailable")
+        })
+
+
+def _fetch_thread_cached(
+    imap: imaplib.IMAP4,
+    cache: MailboxCache,
+    account: str,
+    mailbox: str,
+    subject: str,
+    limit: Optional[int],
+    fetch_chunk_size: int,
+) -> Optional[Thread]:
+    if not _sync_cache(imap, cache, account, mailbox, fetch_chunk_size):
+        return None
+
+    found = cache.find_subject(account, mailbox, subject)
+    found.sort(key=lambda x: x[1].timestamp() if x[1] else 0.0)
+    if limit:
+        found = found[-limit:]
+    _fill_bodies_cached(imap, cache, account, mailbox, found, fetch_chunk_size)
+
+    thread_subject = subject or (found[0][2] if found else '')
+    return Thread(subject=thread_subject, messages=[msg for _, _, _, msg, _ in found])
+
+
+def _fetch(
+    imap: imaplib.IMAP4,
+    subject: str,
+    limit: Optional[int],
+    fetch_chunk_size: int,
+    cache: Optional[MailboxCache],
+    account: str,
+    mailbox: str,
+) -> Thread:
+    if cache is not None:
+        thread = _fetch_thread_cached(imap, cache, account, mailbox, subject, limit, fetch_chunk_size)
+        if thread is not None:
+            return thread
+    return _fetch_thread(imap, subject, limit, fetch_chunk_size)
+
+
+def _server_threads(imap: imaplib.IMAP4) -> Optional[List[List[bytes]]]:
+    # UID THREAD REFERENCES (RFC 5256) when advertised: one round-trip groups the mailbox
+    if "THREAD=REFERENCES" not in getattr(imap, "capabilities", ()):
+        return None
+    try:
+        typ, data = _uid(imap, "THREAD", "REFERENCES", "UTF-8", "ALL")
+    except imaplib.IMAP4.error:
+        return None
+    if typ != "OK":
+        return None
+    stack: List[List[Any]] = [[]]
+    for piece in data or []:
+        if isinstance(piece, bytes):
+            _tokenize_into(stack, piece)
+
+    def flatten(node: Any) -> Iterator[bytes]:
+        if isinstance(node, list):
+            for child in node:
+                yield from flatten(child)
+        elif isinstance(node, bytes):
+            yield node
+
+    return [list(flatten(group)) for group in stack[0] if isinstance(group, list)]
+
+
+def _fetch_mailbox_threads(
+    imap: imaplib.IMAP4,
+    limit: Optional[int],
+    fetch_chunk_size: int,
+    cache: Optional[MailboxCache],
+    account: str,
+    mailbox: str,
+    server_threading: bool,
+) -> List[Thread]:
+    # Headers for the whole mailbox (incrementally when cached)
+    if cache is not None and _sync_cache(imap, cache, account, mailbox, fetch_chunk_size):
+        entries = cache.find_subject(account, mailbox, "")
+    else:
+        cache = None
+        typ, data = _uid(imap, 'SEARCH', None, 'ALL')
+        ids = data[0].split() if typ == 'OK' and data and data[0] else []
+        entries = [(int(uid), dt, sub, msg, False) for uid, dt, sub, msg in _fetch_headers(imap, ids, fetch_chunk_size)]
+
+    entries.sort(key=lambda x: x[1].timestamp() if x[1] else 0.0)
+    if limit:
+        entries = entries[-limit:]
+
+    # Bodies for every message that will be classified
+    if cache is not None:
+        _fill_bodies_cached(imap, cache, account, mailbox, entries, fetch_chunk_size)
+    else:
+        _fetch_bodies(imap, {str(uid).encode(): msg for uid, _, _, msg, _ in entries}, fetch_chunk_size)
+
+    groups = _server_threads(imap) if server_threading else None
+    if groups is None:
+        return thread_messages(msg for _, _, _, msg, _ in entries)
+
+    by_uid = {uid: (order, msg) for order, (uid, _, _, msg, _) in enumerate(entries)}
+    threads = []
+    for group in groups:
+        members = sorted(by_uid[int(u)] for u in group if int(u) in by_uid)
+        if members:
+            msgs = [msg for _, msg in members]
+            threads.append(Thread(subject=strip_reply_prefix(msgs[0].meta.get("subject", "")), messages=msgs))
+    return threads
+
+
+def _run(
+    host: str,
+    port: int,
+    username: str,
+    password: str,
+    mailbox: str,
+    pool: Optional[ImapPool],
+    fn: Callable[[imaplib.IMAP4], T],
+) -> T:
+    if pool is not None:
+        # Reuse a pooled session; if it turns out to be dead mid-fetch, retry once on a fresh one
+        for attempt in range(2):
             try:
-                dt = parsedate_to_datetime(date_hdr)
-                ts = dt.isoformat()
-            except Exception:
-                ts = date_hdr
-            body = _extract_body(em)
-            msgs.append((dt if 'dt' in locals() else None, Message(
-                timestamp=ts,
-                from_name=from_name or from_email,
-                from_email=from_email or '',
-                to=to_list,
-                cc=cc_list,
-                body=body,
-                meta={}
-            )))
-
-        # Sort by datetime if available
-        msgs.sort(key=lambda x: (x[0] or '' ,))
-        thread_msgs = [m for _, m in msgs]
-
-        thread_subject = subject or (thread_msgs[0].meta.get('subject') if thread_msgs else '')
-        if not thread_subject and msgs:
-            # fallback to first message subject
-            thread_subject = email.message_from_bytes(
-                imap.fetch(ids[0], '(RFC822)')[1][0][1], policy=policy.default
-            ).get('Subject', '')
-
-        return Thread(subject=thread_subject, messages=thread_msgs)
+                with pool.session(host, port, username, password, mailbox) as imap:
+                    return fn(imap)
+            except DROPPED_ERRORS:
+                if attempt:
+                    raise
+    imap = connect(host, port, username, password)
+    try:
+        imap.select(mailbox)
+        return fn(imap)
     finally:
         try:
             imap.logout()
         except Exception:
             pass
+
+
+def fetch_thread_by_subject(
+    host: str,
+    port: int,
+    username: str,
+    password: str,
+    subject: str,
+    mailbox: str = "INBOX",
+    limit: Optional[int] = None,
+    fetch_chunk_size: int = 100,
+    pool: Optional[ImapPool] = None,
+    cache: Optional[MailboxCache] = None,
+) -> Thread:
+    account = f"{username}@{host.lower()}:{port}"
+    return _run(
+        host, port, username, password, mailbox, pool,
+        lambda imap: _fetch(imap, subject, limit, fetch_chunk_size, cache, account, mailbox),
+    )
+
+
+def fetch_mailbox_threads(
+    host: str,
+    port: int,
+    username: str,
+    password: str,
+    mailbox: str = "INBOX",
+    limit: Optional[int] = None,
+    fetch_chunk_size: int = 100,
+    pool: Optional[ImapPool] = None,
+    cache: Optional[MailboxCache] = None,
+    server_threading: bool = True,
+) -> List[Thread]:
+    # Every conversation in the mailbox from one sync, grouped by Message-ID /
+    # In-Reply-To / References (server-side THREAD REFERENCES when available).
+    # `limit` keeps the most recent N messages before threading.
+    account = f"{username}@{host.lower()}:{port}"
+    return _run(
+        host, port, username, password, mailbox, pool,
+        lambda imap: _fetch_mailbox_threads(imap, limit, fetch_chunk_size, cache, account, mailbox, server_threading),
+    )
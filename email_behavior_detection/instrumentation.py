@@ -0,0 +1,146 @@
+import functools
+import json
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, TypeVar
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+# Checked on every instrumented call; while False, spans and counters cost one
+# attribute lookup and a shared no-op context manager
+enabled = False
+
+_lock = threading.Lock()
+# name -> [count, total seconds, max seconds]
+_spans: Dict[str, List[float]] = {}
+_counters: Dict[str, float] = {}
+
+
+def enable(on: bool = True) -> None:
+    global enabled
+    enabled = on
+
+
+def reset() -> None:
+    with _lock:
+        _spans.clear()
+        _counters.clear()
+
+
+def record(name: str, seconds: float) -> None:
+    with _lock:
+        entry = _spans.get(name)
+        if entry is None:
+            _spans[name] = [1, seconds, seconds]
+        else:
+            entry[0] += 1
+            entry[1] += seconds
+            if seconds > entry[2]:
+                entry[2] = seconds
+
+
+def count(name: str, value: float = 1) -> None:
+    if enabled:
+        with _lock:
+            _counters[name] = _counters.get(name, 0) + value
+
+
+class _Span:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self) -> "_Span":
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        record(self.name, time.perf_counter() - self.start)
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self) -> "_NullSpan":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        return None
+
+
+_NULL = _NullSpan()
+
+
+def span(name: str) -> Any:
+    # with span("imap.fetch"): ...
+    return _Span(name) if enabled else _NULL
+
+
+def timed(name: str) -> Callable[[F], F]:
+    # Decorator form of span()
+    def wrap(fn: F) -> F:
+        @functools.wraps(fn)
+        def inner(*args, **kwargs):
+            if not enabled:
+                return fn(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                record(name, time.perf_counter() - start)
+        return inner  # type: ignore[return-value]
+    return wrap
+
+
+def snapshot() -> Dict[str, Any]:
+    with _lock:
+        return {
+            "spans": {
+                name: {"count": int(c), "seconds": total, "max_seconds": mx}
+                for name, (c, total, mx) in sorted(_spans.items())
+            },
+            "counters": dict(sorted(_counters.items())),
+        }
+
+
+def format_text(data: Optional[Dict[str, Any]] = None) -> str:
+    data = data or snapshot()
+    lines = [f"{'span':<36} {'count':>9} {'total ms':>11} {'avg us':>10} {'max us':>10}"]
+    for name, s in sorted(data["spans"].items(), key=lambda kv: -kv[1]["seconds"]):
+        avg = 1e6 * s["seconds"] / s["count"] if s["count"] else 0.0
+        lines.append(f"{name:<36} {s['count']:>9} {1e3 * s['seconds']:>11.2f} {avg:>10.1f} {1e6 * s['max_seconds']:>10.1f}")
+    if data["counters"]:
+        lines.append("")
+        lines.append(f"{'counter':<36} {'value':>9}")
+        for name, value in data["counters"].items():
+            lines.append(f"{name:<36} {value:>9g}")
+    return "\n".join(lines) + "\n"
+
+
+def _label(name: str) -> str:
+    return name.replace("\\", "\\\\").replace('"', '\\"')
+
+
+def format_prometheus(data: Optional[Dict[str, Any]] = None, prefix: str = "ebd") -> str:
+    # Text exposition format: span totals as summaries, counters as counters
+    data = data or snapshot()
+    lines = [
+        f"# HELP {prefix}_span_seconds Time spent in instrumented spans.",
+        f"# TYPE {prefix}_span_seconds summary",
+    ]
+    for name, s in data["spans"].items():
+        lines.append(f'{prefix}_span_seconds_sum{{span="{_label(name)}"}} {s["seconds"]:.9f}')
+        lines.append(f'{prefix}_span_seconds_count{{span="{_label(name)}"}} {s["count"]}')
+    lines.append(f"# HELP {prefix}_events_total Instrumented event counters.")
+    lines.append(f"# TYPE {prefix}_events_total counter")
+    for name, value in data["counters"].items():
+        lines.append(f'{prefix}_events_total{{name="{_label(name)}"}} {value:g}')
+    return "\n".join(lines) + "\n"
+
+
+def format_json(data: Optional[Dict[str, Any]] = None) -> str:
+    return json.dumps(data or snapshot(), indent=2) + "\n"
+
+
+FORMATS = {"text": format_text, "json": format_json, "prometheus": format_prometheus}
@@ -1,8 +1,15 @@
+import hashlib
+import json
 import re
+import time
+from array import array
 from dataclasses import dataclass
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Pattern, Sequence, Set, Tuple, Union
 
-from .models import Message
+from . import instrumentation
+from .detection_cache import DetectionCache, Entry, content_key
+from .models import Message, TeamIndex
+from .segmentation import new_text
 
 
 @dataclass
@@ -12,64 +19,290 @@ class DetectedIntent:
     evidence: str
 
 
-class IntentDetector:
-    def __init__(self, rules: Dict[str, Any], team_domains: List[str], team_addresses: List[str]):
-        self.rules = rules or {}
-        self.team_domains = [d.lower() for d in (team_domains or [])]
-        self.team_addresses = [a.lower() for a in (team_addresses or [])]
+@dataclass(frozen=True)
+class DetectionMatrix:
+    # Messages x intents result of IntentDetector.detect_batch. Each message is one
+    # bitmask (bit j set when intents[j] was detected); a rule's confidence is the
+    # same for every message it fires on, so confidences are kept once per column.
+    intents: Tuple[str, ...]
+    confidences: Tuple[float, ...]
+    masks: "array[int]"
 
-    def detect(self, msg: Message) -> List[DetectedIntent]:
-        text = f"{msg.from_name}\n{msg.body}".lower()
-        intents: List[DetectedIntent] = []
+    def __len__(self) -> int:
+        return len(self.masks)
+
+    def has(self, row: int, name: str) -> bool:
+        return bool(self.masks[row] >> self.intents.index(name) & 1)
+
+    def row(self, i: int) -> List[str]:
+        mask = self.masks[i]
+        return [name for j, name in enumerate(self.intents) if mask >> j & 1]
+
+    def column(self, name: str) -> List[bool]:
+        bit = 1 << self.intents.index(name)
+        return [bool(m & bit) for m in self.masks]
+
+    def counts(self) -> Dict[str, int]:
+        return {name: sum(1 for m in self.masks if m >> j & 1) for j, name in enumerate(self.intents)}
+
+    def confidence_rows(self) -> List[List[float]]:
+        # Dense messages x intents confidences, 0.0 where the intent was not detected
+        return [
+            [conf if mask >> j & 1 else 0.0 for j, conf in enumerate(self.confidences)]
+            for mask in self.masks
+        ]
+
+
+# A clause is a tuple of alternatives: literal keywords (matched as substrings of the
+# lowercased "from_name\nbody" text) or compiled patterns for the few phrasings that
+# cannot be spelled out as keywords. A rule fires when every one of its clauses matches.
+Clause = Tuple[Union[str, Pattern[str]], ...]
 
-        def add(name: str, conf: float, ev: str):
-            intents.append(DetectedIntent(name=name, confidence=conf, evidence=ev))
+_RULES: Tuple[Tuple[str, float, str, Tuple[Clause, ...]], ...] = (
+    # OOO / auto-reply
+    ("auto_reply_ooo", 0.95, "OOO/auto-reply patterns", (
+        ("out of office", "ooo", "auto-reply", "auto reply", "autoreply", "vacation responder"),
+    )),
+    # Redirect (ask to contact another address)
+    ("redirect", 0.7, "Mentions contacting another email", (
+        ("write to", "contact", "reach out to", "reach to"),
+        ("@",),
+    )),
+    # Expressed interest
+    ("interest", 0.7, "Interest keywords", (
+        ("interested", "sounds good", "please proceed", "go ahead"),
+    )),
+    # Asking for pricing, inclusions, late checkout
+    ("ask_pricing", 0.65, "Price keywords", (
+        ("price", "pricing", "rate", "cost"),
+    )),
+    ("ask_inclusions", 0.6, "Inclusion keywords", (
+        ("breakfast", "wi-fi", "wi fi", "wifi", "late checkout", "late check-out", "late check out"),
+    )),
+    # Add teammate / CC
+    ("add_teammate", 0.6, "Add teammate phrasing", (
+        ("adding", "cc'ing", "ccing", "looping", "include", re.compile(r"add (.+?) from our team")),
+    )),
+    # Billing info request
+    ("ask_billing_info", 0.75, "Billing info request", (
+        ("billing", "invoice", "bill to", "payment details"),
+        ("confirm", "provide", "name", "email"),
+    )),
+    # Proceed / confirm
+    ("proceed", 0.7, "Proceed phrasing", (
+        ("please proceed", "we aim to confirm", "confirm by", "let's move forward", "go ahead"),
+    )),
+    # Pause reminders
+    ("pause_reminders", 0.8, "Pause reminders phrasing", (
+        ("pause reminders", "stop reminders", "hold off", "we'll reply"),
+    )),
+    # Not interested
+    ("not_interested", 0.9, "Not interested phrasing", (
+        ("not interested", "no thanks", "pass for now"),
+    )),
+)
 
-        # OOO / auto-reply
-        if re.search(r"out of office|ooo|auto[- ]?reply|vacation responder", text):
-            add("auto_reply_ooo", 0.95, "OOO/auto-reply patterns")
 
-        # Redirect (ask to contact another address)
-        if re.search(r"write to|contact|reach (out )?to", text) and re.search(r"@", text):
-            add("redirect", 0.7, "Mentions contacting another email")
+def _trie_pattern(keywords: List[str]) -> str:
+    # Factor shared prefixes so the regex engine branches on one character at a time
+    # instead of retrying every keyword at every offset.
+    trie: Dict[str, Any] = {}
+    for kw in keywords:
+        node = trie
+        for ch in kw:
+            node = node.setdefault(ch, {})
+        node[""] = {}
 
-        # Expressed interest
-        if re.search(r"interested|sounds good|please proceed|go ahead", text):
-            add("interest", 0.7, "Interest keywords")
+    def build(node: Dict[str, Any]) -> str:
+        alts = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch]
+        if not alts:
+            return ""
+        if len(alts) == 1 and "" not in node:
+            return alts[0]
+        # Greedy "?" keeps the longest keyword that matches at a given offset
+        return "(?:" + "|".join(alts) + ")" + ("?" if "" in node else "")
 
-        # Asking for pricing, inclusions, late checkout
-        if re.search(r"price|pricing|rate|cost", text):
-            add("ask_pricing", 0.65, "Price keywords")
-        if re.search(r"breakfast|wi[- ]?fi|late checkout|late check[- ]?out", text):
-            add("ask_inclusions", 0.6, "Inclusion keywords")
+    return build(trie)
 
-        # Add teammate / CC
-        if re.search(r"adding|cc'ing|ccing|looping|include|add (.+?) from our team", text):
-            add("add_teammate", 0.6, "Add teammate phrasing")
 
-        # Billing info request
-        if re.search(r"billing|invoice|bill to|payment details", text) and re.search(r"confirm|provide|name|email", text):
-            add("ask_billing_info", 0.75, "Billing info request")
+class IntentDetector:
+    def __init__(
+        self,
+        rules: Dict[str, Any],
+        team_domains: Optional[List[str]] = None,
+        team_addresses: Optional[List[str]] = None,
+        strip_quoted: bool = True,
+        cache: Optional[DetectionCache] = None,
+        team: Optional[TeamIndex] = None,
+    ):
+        self.rules = rules or {}
+        # Only scan newly written text, not quoted history or signatures
+        self.strip_quoted = strip_quoted
+        # Team membership comes from either the lists or a prebuilt TeamIndex, not both
+        if team is not None:
+            if team_domains is not None or team_addresses is not None:
+                raise ValueError("pass team or team_domains/team_addresses, not both")
+            self.team = team
+        else:
+            self.team = TeamIndex(team_domains or (), team_addresses or ())
+        self.team_domains = sorted(self.team.domains)
+        self.team_addresses = sorted(self.team.addresses)
+        self._compile(_RULES)
+        # Changes whenever anything that affects detect() output changes; stored
+        # detections are only reused under the same version
+        self.version = hashlib.sha256(repr((
+            self._rule_table, sorted(self._keyword_clauses.items()), sorted(self._fallbacks.items()),
+            self.team.key(), self.strip_quoted,
+            json.dumps(self.rules, sort_keys=True, default=str),
+        )).encode("utf-8")).hexdigest()[:16]
+        self.cache = cache
+        if cache is not None:
+            cache.bind(self.version)
+
+    def _compile(self, rules: Tuple[Tuple[str, float, str, Tuple[Clause, ...]], ...]) -> None:
+        keyword_clauses: Dict[str, Set[int]] = {}
+        self._fallbacks: Dict[int, List[Pattern[str]]] = {}
+        self._rule_table: List[Tuple[str, float, str, Tuple[int, ...]]] = []
+        clause_id = 0
+        for name, conf, evidence, clauses in rules:
+            ids = []
+            for clause in clauses:
+                for alt in clause:
+                    if isinstance(alt, str):
+                        keyword_clauses.setdefault(alt, set()).add(clause_id)
+                    else:
+                        self._fallbacks.setdefault(clause_id, []).append(alt)
+                ids.append(clause_id)
+                clause_id += 1
+            self._rule_table.append((name, conf, evidence, tuple(ids)))
 
-        # Proceed / confirm
-        if re.search(r"please proceed|we aim to confirm|confirm by|let's move forward|go ahead", text):
-            add("proceed", 0.7, "Proceed phrasing")
+        # The scanner reports only the longest keyword at each offset, so every keyword
+        # also satisfies the clauses of the shorter keywords it starts with.
+        self._keyword_clauses: Dict[str, frozenset] = {
+            kw: frozenset().union(*(ids for other, ids in keyword_clauses.items() if kw.startswith(other)))
+            for kw in keyword_clauses
+        }
+        # Zero-width lookahead so overlapping keywords ("not interested" / "interested")
+        # are all seen in a single left-to-right pass.
+        self._scanner: Optional[Pattern[str]] = (
+            re.compile("(?=(" + _trie_pattern(list(keyword_clauses)) + "))") if keyword_clauses else None
+        )
 
-        # Pause reminders
-        if re.search(r"pause reminders|stop reminders|hold off|we'll reply", text):
-            add("pause_reminders", 0.8, "Pause reminders phrasing")
+    def _matched_clauses(self, text: str) -> Set[int]:
+        matched: Set[int] = set()
+        if self._scanner is not None:
+            for kw in set(self._scanner.findall(text)):
+                matched |= self._keyword_clauses[kw]
+        return matched
 
-        # Not interested
-        if re.search(r"not interested|no thanks|pass for now", text):
-            add("not_interested", 0.9, "Not interested phrasing")
+    def _content_intents(self, from_name: str, body: str) -> Entry:
+        # Everything detect() derives from the sender name and body alone
+        if instrumentation.enabled:
+            return self._content_intents_profiled(from_name, body)
+        text = f"{from_name}\n{body}".lower()
+        found = []
+        matched = self._matched_clauses(text)
+        for name, conf, evidence, clause_ids in self._rule_table:
+            for cid in clause_ids:
+                if cid not in matched and not any(p.search(text) for p in self._fallbacks.get(cid, ())):
+                    break
+            else:
+                found.append((name, conf, evidence))
 
         # Fallback: question
-        if re.search(r"\?", msg.body):
-            add("question", 0.4, "Contains question mark")
+        if "?" in body:
+            found.append(("question", 0.4, "Contains question mark"))
+        return tuple(found)
+
+    def _content_intents_profiled(self, from_name: str, body: str) -> Entry:
+        # _content_intents with the keyword scan and each rule timed and hits counted
+        clock = time.perf_counter
+        text = f"{from_name}\n{body}".lower()
+        found = []
+        start = clock()
+        matched = self._matched_clauses(text)
+        instrumentation.record("detect.scan", clock() - start)
+        for name, conf, evidence, clause_ids in self._rule_table:
+            start = clock()
+            for cid in clause_ids:
+                if cid not in matched and not any(p.search(text) for p in self._fallbacks.get(cid, ())):
+                    hit = False
+                    break
+            else:
+                hit = True
+                found.append((name, conf, evidence))
+            instrumentation.record(f"detect.rule.{name}", clock() - start)
+            if hit:
+                instrumentation.count(f"detect.rule_hits.{name}")
+
+        if "?" in body:
+            found.append(("question", 0.4, "Contains question mark"))
+            instrumentation.count("detect.rule_hits.question")
+        return tuple(found)
+
+    @instrumentation.timed("detect")
+    def detect(self, msg: Message) -> List[DetectedIntent]:
+        body = new_text(msg) if self.strip_quoted else msg.body
+        if self.cache is None:
+            found = self._content_intents(msg.from_name, body)
+        else:
+            key = content_key(self.version, msg.from_name, body)
+            found = self.cache.get(key)
+            if found is None:
+                found = self._content_intents(msg.from_name, body)
+                self.cache.put(key, found)
+        intents = [DetectedIntent(name=name, confidence=conf, evidence=ev) for name, conf, ev in found]
 
         # If message from our own team, add a meta intent
-        from_domain = msg.from_email.split("@")[-1].lower() if "@" in msg.from_email else ""
-        if msg.from_email.lower() in self.team_addresses or from_domain in self.team_domains:
-            add("from_internal_team", 1.0, "Sender is internal")
+        if msg.from_email in self.team:
+            intents.append(DetectedIntent(name="from_internal_team", confidence=1.0, evidence="Sender is internal"))
+            instrumentation.count("detect.rule_hits.from_internal_team")
 
         return intents
+
+    def detect_batch(self, messages: Sequence[Message]) -> DetectionMatrix:
+        # Same rules as detect(), evaluated over a whole column of messages and packed
+        # into bitmasks instead of DetectedIntent objects. Rule evaluation is memoized on
+        # the set of keywords found, which repeats heavily across a mailbox, so per
+        # message the work is one scanner pass plus a dict lookup. Bypasses the cache.
+        names = [name for name, _, _, _ in self._rule_table] + ["question", "from_internal_team"]
+        confs = [conf for _, conf, _, _ in self._rule_table] + [0.4, 1.0]
+        question_bit = 1 << len(self._rule_table)
+        team_bit = question_bit << 1
+        team = self.team
+        findall = self._scanner.findall if self._scanner is not None else (lambda text: [])
+        # keyword set -> (mask of rules decided by keywords, rules still needing a fallback search)
+        memo: Dict[frozenset, Tuple[int, Tuple[Tuple[int, Tuple[int, ...]], ...]]] = {}
+
+        masks = array("L")
+        for msg in messages:
+            body = new_text(msg) if self.strip_quoted else msg.body
+            text = f"{msg.from_name}\n{body}".lower()
+            kws = frozenset(findall(text))
+            plan = memo.get(kws)
+            if plan is None:
+                plan = memo[kws] = self._plan(kws)
+            mask, pending = plan
+            for bit, open_clauses in pending:
+                if all(any(p.search(text) for p in self._fallbacks[cid]) for cid in open_clauses):
+                    mask |= 1 << bit
+            if "?" in body:
+                mask |= question_bit
+            if msg.from_email in team:
+                mask |= team_bit
+            masks.append(mask)
+        return DetectionMatrix(intents=tuple(names), confidences=tuple(confs), masks=masks)
+
+    def _plan(self, kws: frozenset) -> Tuple[int, Tuple[Tuple[int, Tuple[int, ...]], ...]]:
+        matched: Set[int] = set()
+        for kw in kws:
+            matched |= self._keyword_clauses[kw]
+        mask = 0
+        pending = []
+        for bit, (_, _, _, clause_ids) in enumerate(self._rule_table):
+            open_clauses = tuple(cid for cid in clause_ids if cid not in matched)
+            if not open_clauses:
+                mask |= 1 << bit
+            elif all(cid in self._fallbacks for cid in open_clauses):
+                pending.append((bit, open_clauses))
+        return mask, tuple(pending)
@@ -0,0 +1,195 @@
+import json
+import sqlite3
+import threading
+import time
+from dataclasses import asdict
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from .models import Message
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS mailboxes (
+    account TEXT NOT NULL,
+    mailbox TEXT NOT NULL,
+    uidvalidity INTEGER NOT NULL,
+    highest_uid INTEGER NOT NULL DEFAULT 0,
+    accessed REAL NOT NULL,
+    PRIMARY KEY (account, mailbox)
+);
+CREATE TABLE IF NOT EXISTS messages (
+    account TEXT NOT NULL,
+    mailbox TEXT NOT NULL,
+    uid INTEGER NOT NULL,
+    subject TEXT NOT NULL,
+    sort_ts REAL,
+    record TEXT NOT NULL,
+    body TEXT,
+    size INTEGER NOT NULL,
+    accessed REAL NOT NULL,
+    PRIMARY KEY (account, mailbox, uid)
+);
+CREATE INDEX IF NOT EXISTS messages_lru ON messages (accessed);
+"""
+
+# (uid, sort datetime, subject, message, has_body); message.body is '' until cached
+CachedMessage = Tuple[int, Optional[datetime], str, Message, bool]
+
+
+class MailboxCache:
+    # On-disk SQLite cache of parsed messages keyed by (account, mailbox, UID) under the
+    # mailbox's UIDVALIDITY. Headers are cached for every synced UID so subject filtering
+    # happens locally; bodies are added as they are downloaded. When the file grows past
+    # max_bytes, bodies are dropped least-recently-used first, then whole mailboxes
+    # (which are simply re-synced on next use).
+
+    def __init__(self, path: str, max_bytes: int = 256 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        # Python's lower() so subject matching in SQL agrees with the IMAP client-side
+        # filter for non-ASCII subjects (SQLite's lower() only folds ASCII)
+        self._db.create_function("py_lower", 1, lambda s: s.lower() if s is not None else None, deterministic=True)
+        self._db.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+    def begin_sync(self, account: str, mailbox: str, uidvalidity: int) -> int:
+        # Returns the highest UID already cached; a changed UIDVALIDITY wipes the mailbox
+        now = time.time()
+        with self._lock, self._db:
+            row = self._db.execute(
+                "SELECT uidvalidity, highest_uid FROM mailboxes WHERE account=? AND mailbox=?",
+                (account, mailbox),
+            ).fetchone()
+            if row and row[0] == uidvalidity:
+                self._db.execute(
+                    "UPDATE mailboxes SET accessed=? WHERE account=? AND mailbox=?", (now, account, mailbox)
+                )
+                return row[1]
+            self._db.execute("DELETE FROM messages WHERE account=? AND mailbox=?", (account, mailbox))
+            self._db.execute(
+                "INSERT OR REPLACE INTO mailboxes (account, mailbox, uidvalidity, highest_uid, accessed) "
+                "VALUES (?, ?, ?, 0, ?)",
+                (account, mailbox, uidvalidity, now),
+            )
+            return 0
+
+    def add_headers(
+        self,
+        account: str,
+        mailbox: str,
+        entries: Iterable[Tuple[int, Optional[datetime], str, Message]],
+        highest_uid: int,
+    ) -> None:
+        now = time.time()
+        rows = []
+        for uid, dt, subject, msg in entries:
+            record = asdict(msg)
+            record.pop("body", None)
+            record.pop("_new_text", None)
+            data = json.dumps(record, ensure_ascii=False)
+            rows.append((account, mailbox, int(uid), subject, _sort_ts(dt), data, len(data), now))
+        with self._lock, self._db:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO messages (account, mailbox, uid, subject, sort_ts, record, size, accessed) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            self._db.execute(
+                "UPDATE mailboxes SET highest_uid=MAX(highest_uid, ?) WHERE account=? AND mailbox=?",
+                (int(highest_uid), account, mailbox),
+            )
+        self._evict(keep=(account, mailbox))
+
+    def forget_missing(self, account: str, mailbox: str, present: Iterable[int]) -> int:
+        # Drops cached UIDs that are no longer on the server (expunged); returns how many
+        present = {int(uid) for uid in present}
+        with self._lock, self._db:
+            cached = self._db.execute(
+                "SELECT uid FROM messages WHERE account=? AND mailbox=?", (account, mailbox)
+            ).fetchall()
+            gone = [(account, mailbox, uid) for uid, in cached if uid not in present]
+            self._db.executemany("DELETE FROM messages WHERE account=? AND mailbox=? AND uid=?", gone)
+        return len(gone)
+
+    def find_subject(self, account: str, mailbox: str, subject: str) -> List[CachedMessage]:
+        # Case-insensitive substring match, same rule as the IMAP client-side filter
+        # Filtered in SQL, so records and bodies are read only for matching rows
+        needle = (subject or "").lower()
+        query = "SELECT uid, sort_ts, subject, record, body FROM messages WHERE account=? AND mailbox=?"
+        params: Tuple[Any, ...] = (account, mailbox)
+        if needle:
+            query += " AND instr(py_lower(subject), ?) > 0"
+            params += (needle,)
+        out: List[CachedMessage] = []
+        with self._lock:
+            rows = self._db.execute(query, params).fetchall()
+        for uid, ts, sub, record, body in rows:
+            dt = datetime.fromtimestamp(ts, tz=timezone.utc) if ts is not None else None
+            msg = Message(body=body or "", **json.loads(record))
+            out.append((uid, dt, sub, msg, body is not None))
+        if out:
+            now = time.time()
+            with self._lock, self._db:
+                self._db.executemany(
+                    "UPDATE messages SET accessed=? WHERE account=? AND mailbox=? AND uid=?",
+                    [(now, account, mailbox, uid) for uid, *_ in out],
+                )
+        return out
+
+    def set_bodies(self, account: str, mailbox: str, bodies: Dict[int, str]) -> None:
+        now = time.time()
+        with self._lock, self._db:
+            self._db.executemany(
+                "UPDATE messages SET body=?, size=length(record) + length(?), accessed=? "
+                "WHERE account=? AND mailbox=? AND uid=?",
+                [(body, body, now, account, mailbox, int(uid)) for uid, body in bodies.items()],
+            )
+        self._evict(keep=(account, mailbox))
+
+    def total_bytes(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COALESCE(SUM(size), 0) FROM messages").fetchone()[0]
+
+    def _evict(self, keep: Optional[Tuple[str, str]] = None) -> None:
+        total = self.total_bytes()
+        if total <= self.max_bytes:
+            return
+        with self._lock, self._db:
+            # Bodies first: they are the bulk of the data and can be re-fetched cheaply
+            rows = self._db.execute(
+                "SELECT account, mailbox, uid, size - length(record) FROM messages "
+                "WHERE body IS NOT NULL ORDER BY accessed"
+            ).fetchall()
+            drop = []
+            for account, mailbox, uid, freed in rows:
+                if total <= self.max_bytes:
+                    break
+                drop.append((account, mailbox, uid))
+                total -= freed
+            self._db.executemany(
+                "UPDATE messages SET body=NULL, size=length(record) WHERE account=? AND mailbox=? AND uid=?", drop
+            )
+            # Still too big: forget whole mailboxes, least recently used first. Headers
+            # can't be dropped one by one without leaving holes below highest_uid.
+            boxes = self._db.execute("SELECT account, mailbox FROM mailboxes ORDER BY accessed").fetchall()
+            for account, mailbox in boxes:
+                if total <= self.max_bytes:
+                    break
+                if (account, mailbox) == keep:
+                    continue
+                freed = self._db.execute(
+                    "SELECT COALESCE(SUM(size), 0) FROM messages WHERE account=? AND mailbox=?", (account, mailbox)
+                ).fetchone()[0]
+                self._db.execute("DELETE FROM messages WHERE account=? AND mailbox=?", (account, mailbox))
+                self._db.execute("DELETE FROM mailboxes WHERE account=? AND mailbox=?", (account, mailbox))
+                total -= freed
+
+
+def _sort_ts(dt: Optional[datetime]) -> Optional[float]:
+    return dt.timestamp() if dt else None
@@ -1,8 +1,18 @@
+import sys
 from dataclasses import dataclass, field
-from typing import List, Dict, Optional
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
 
+# Slotted dataclasses (no per-instance __dict__) where the interpreter supports them
+_SLOTS = {"slots": True} if sys.version_info >= (3, 10) else {}
 
-@dataclass
+
+def _intern(value):
+    # Addresses and names repeat across a mailbox; share one string object per value
+    return sys.intern(value) if type(value) is str else value
+
+
+@dataclass(**_SLOTS)
 class Message:
     timestamp: str
     from_name: str
@@ -11,9 +21,19 @@ class Message:
     cc: List[str]
     body: str
     meta: Dict[str, str] = field(default_factory=dict)
+    # (body, new text) memo for segmentation.new_text; not part of the message data
+    _new_text: Optional[Tuple[str, str]] = field(default=None, init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        self.from_name = _intern(self.from_name)
+        self.from_email = _intern(self.from_email)
+        if self.to:
+            self.to = [_intern(a) for a in self.to]
+        if self.cc:
+            self.cc = [_intern(a) for a in self.cc]
 
 
-@dataclass
+@dataclass(**_SLOTS)
 class Thread:
     subject: str
     messages: List[Message]
@@ -22,7 +42,62 @@ class Thread:
         return self.messages[-1] if self.messages else None
 
 
-def is_from_team(msg: Message, team_domains: List[str], team_addresses: List[str]) -> bool:
-    email = msg.from_email.lower().strip()
-    domain = email.split("@")[-1] if "@" in email else ""
-    return email in {a.lower() for a in team_addresses} or domain in {d.lower() for d in team_domains}
+@lru_cache(maxsize=65536)
+def normalize_address(address: str) -> str:
+    return address.strip().lower()
+
+
+class TeamIndex:
+    # Team membership built once from config: exact addresses and domains in sets, and
+    # with include_subdomains (off by default, as the original exact-domain check),
+    # "eu.yourcompany.com" counts as "yourcompany.com". A
+    # lookup is a set probe per domain label, independent of how many domains are listed.
+
+    def __init__(self, domains: Iterable[str] = (), addresses: Iterable[str] = (), include_subdomains: bool = False):
+        self.domains = frozenset(normalize_address(d).lstrip(".") for d in domains or () if d)
+        self.addresses = frozenset(normalize_address(a) for a in addresses or () if a)
+        self.include_subdomains = include_subdomains
+
+    @classmethod
+    def from_config(cls, cfg: Dict[str, Any]) -> "TeamIndex":
+        team = cfg.get("team") or {}
+        return cls(team.get("domains", []), team.get("addresses", []), bool(team.get("include_subdomains", False)))
+
+    def __contains__(self, address: str) -> bool:
+        email = normalize_address(address)
+        if email in self.addresses:
+            return True
+        at = email.rfind("@")
+        if at < 0:
+            return False
+        domain = email[at + 1:]
+        if domain in self.domains:
+            return True
+        if self.include_subdomains:
+            dot = domain.find(".")
+            while dot >= 0:
+                domain = domain[dot + 1:]
+                if domain in self.domains:
+                    return True
+                dot = domain.find(".")
+        return False
+
+    def key(self) -> Tuple[Any, ...]:
+        # Stable description of the index, for cache versioning
+        return (sorted(self.domains), sorted(self.addresses), self.include_subdomains)
+
+
+@lru_cache(maxsize=32)
+def _team_index(domains: Tuple[str, ...], addresses: Tuple[str, ...]) -> TeamIndex:
+    return TeamIndex(domains, addresses)
+
+
+def is_from_team(
+    msg: Message,
+    team_domains: Union[TeamIndex, List[str]],
+    team_addresses: Optional[List[str]] = None,
+) -> bool:
+    # Pass a TeamIndex, or domain and address lists (indexed once and reused)
+    if isinstance(team_domains, TeamIndex):
+        return msg.from_email in team_domains
+    return msg.from_email in _team_index(tuple(team_domains or ()), tuple(team_addresses or ()))
@@ -0,0 +1,66 @@
+import multiprocessing
+import threading
+from typing import Any, Dict, Iterable, Iterator, Optional, Tuple
+
+from .config import load_config
+from .pipeline import ThreadInput, build_detector, classify_item
+from .policy import build_policy
+from .templating import load_templates
+
+# Kept out of pipeline so that classifying a single thread never imports multiprocessing
+
+
+# Per-process state, populated once by _init_worker in each pool worker
+_worker: Dict[str, Any] = {}
+
+
+def _init_worker(config_path: str, templates_path: str, extra_ctx: Optional[Dict[str, Any]]) -> None:
+    cfg = load_config(config_path)
+    _worker["detector"] = build_detector(cfg)
+    _worker["policy"] = build_policy(cfg)
+    _worker["templates"] = load_templates(templates_path)
+    _worker["extra_ctx"] = extra_ctx or {}
+
+
+def _classify_indexed(job: Tuple[int, ThreadInput]) -> Tuple[int, Dict[str, Any]]:
+    idx, item = job
+    return idx, classify_item(item, _worker["detector"], _worker["templates"], _worker["extra_ctx"], _worker["policy"])
+
+
+def classify_parallel(
+    threads: Iterable[ThreadInput],
+    config_path: str,
+    templates_path: str,
+    workers: int,
+    ordered: bool = True,
+    extra_ctx: Optional[Dict[str, Any]] = None,
+    chunksize: int = 32,
+) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    # Yields (input index, result) pairs; with ordered=False, in completion order.
+    # One imap call over the whole input keeps every worker busy; the pool reads input
+    # from a generator that blocks while `window` items are unanswered, so memory does
+    # not grow with input size. The window holds at least two chunks, so the chunk
+    # holding the oldest pending item is always complete and can be handed out.
+    window = max(1, workers) * chunksize * 4
+    slots = threading.Semaphore(window)
+    stopped = threading.Event()
+
+    def jobs() -> Iterator[Tuple[int, ThreadInput]]:
+        for job in enumerate(threads):
+            slots.acquire()
+            if stopped.is_set():
+                return
+            yield job
+
+    with multiprocessing.Pool(workers, initializer=_init_worker, initargs=(config_path, templates_path, extra_ctx)) as pool:
+        run = pool.imap if ordered else pool.imap_unordered
+        try:
+            for result in run(_classify_indexed, jobs(), chunksize):
+                slots.release()
+                yield result
+        finally:
+            # Lets the pool's feeder thread out of jobs() when iteration stops early,
+            # so closing the pool doesn't wait on it forever
+            stopped.set()
+            for _ in range(window):
+                slots.release()
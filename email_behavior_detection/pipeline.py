@@ -0,0 +1,104 @@
+import json
+from typing import Any, Dict, List, Optional, Union
+
+from . import instrumentation
+from .detection_cache import DetectionCache
+from .models import Message, TeamIndex, Thread
+from .intents import DetectedIntent, IntentDetector
+from .policy import Policy, choose_next_action
+from .templating import render_template
+
+
+ThreadInput = Union[Thread, Dict[str, Any], str]
+
+# Template fields filled from the thread itself; anything else must come from extra_ctx
+THREAD_FIELDS = ("subject", "latest_from", "latest_email")
+
+
+def thread_from_dict(data: Dict[str, Any]) -> Thread:
+    messages = [
+        Message(
+            timestamp=m.get("timestamp", ""),
+            from_name=m.get("from_name", ""),
+            from_email=m.get("from_email", ""),
+            to=m.get("to", []),
+            cc=m.get("cc", []),
+            body=m.get("body", ""),
+            meta=m.get("meta", {}),
+        )
+        for m in data.get("messages", [])
+    ]
+    return Thread(subject=data.get("subject", ""), messages=messages)
+
+
+def build_detector(cfg: Dict[str, Any], cache: Optional[DetectionCache] = None) -> IntentDetector:
+    return IntentDetector(
+        rules=cfg.get("rules", {}),
+        cache=cache,
+        team=TeamIndex.from_config(cfg),
+    )
+
+
+def build_result(
+    thread: Thread,
+    intents_per_message: List[List[DetectedIntent]],
+    templates: Dict[str, str],
+    extra_ctx: Optional[Dict[str, Any]] = None,
+    policy: Optional[Policy] = None,
+) -> Dict[str, Any]:
+    # Decision and draft from already-computed detections (one list per message)
+    all_detections = [
+        {"from": msg.from_email, "intents": [i.__dict__ for i in intents]}
+        for msg, intents in zip(thread.messages, intents_per_message)
+    ]
+    latest_intents = intents_per_message[-1] if intents_per_message else []
+    with instrumentation.span("policy"):
+        decision = choose_next_action(latest_intents, policy)
+
+    ctx = {
+        "subject": thread.subject,
+        "latest_from": thread.messages[-1].from_name if thread.messages else "",
+        "latest_email": thread.messages[-1].from_email if thread.messages else "",
+        **(extra_ctx or {}),
+    }
+    with instrumentation.span("render"):
+        draft = render_template(templates, decision.get("template", "ack_general"), ctx)
+
+    return {
+        "detections": all_detections,
+        "decision": decision,
+        "draft": draft,
+    }
+
+
+@instrumentation.timed("classify_thread")
+def classify_thread(
+    thread: Thread,
+    detector: IntentDetector,
+    templates: Dict[str, str],
+    extra_ctx: Optional[Dict[str, Any]] = None,
+    policy: Optional[Policy] = None,
+) -> Dict[str, Any]:
+    return build_result(thread, [detector.detect(msg) for msg in thread.messages], templates, extra_ctx, policy)
+
+
+def classify_item(
+    item: ThreadInput,
+    detector: IntentDetector,
+    templates: Dict[str, str],
+    extra_ctx: Optional[Dict[str, Any]] = None,
+    policy: Optional[Policy] = None,
+) -> Dict[str, Any]:
+    # Accepts a Thread, a thread dict or a raw JSON line. Input that is not a usable
+    # thread (invalid JSON, wrong types, e.g. "messages": null) becomes an error record
+    # instead of stopping the stream it came from.
+    try:
+        if isinstance(item, str):
+            item = json.loads(item)
+        if isinstance(item, dict):
+            item = thread_from_dict(item)
+        if not isinstance(item, Thread):
+            raise TypeError(f"expected a thread object, got {type(item).__name__}")
+        return classify_thread(item, detector, templates, extra_ctx, policy)
+    except (ValueError, TypeError, KeyError, AttributeError) as e:
+        return {"error": str(e)}
@@ -1,46 +1,69 @@
-from typing import List, Dict, Any
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Sequence
 
 from .intents import DetectedIntent
 
 
-def choose_next_action(intents: List[DetectedIntent]) -> Dict[str, Any]:
-    # Priority order for actionable intents
-    priority = [
-        "pause_reminders",
-        "not_interested",
-        "proceed",
-        "ask_billing_info",
-        "add_teammate",
-        "ask_pricing",
-        "ask_inclusions",
-        "redirect",
-        "auto_reply_ooo",
-        "interest",
-    ]
-
-    best = None
-    for name in priority:
+# Priority order for actionable intents
+DEFAULT_PRIORITY = (
+    "pause_reminders",
+    "not_interested",
+    "proceed",
+    "ask_billing_info",
+    "add_teammate",
+    "ask_pricing",
+    "ask_inclusions",
+    "redirect",
+    "auto_reply_ooo",
+    "interest",
+)
+
+_ACTIONS: Dict[str, Dict[str, str]] = {
+    "pause_reminders": dict(action="pause_reminders", template="ack_pause"),
+    "not_interested": dict(action="log_and_close", template="ack_not_interested"),
+    "proceed": dict(action="send_agreement_and_form", template="send_agreement"),
+    "ask_billing_info": dict(action="provide_billing_details", template="provide_billing"),
+    "add_teammate": dict(action="welcome_teammate_and_share_docs", template="ack_add_teammate"),
+    "ask_pricing": dict(action="send_price_list", template="send_pricing"),
+    "ask_inclusions": dict(action="send_inclusions_info", template="send_inclusions"),
+    "redirect": dict(action="route_to_address", template="ack_redirect"),
+    "auto_reply_ooo": dict(action="schedule_followup_after_ooo", template="ack_ooo"),
+    "interest": dict(action="send_materials_and_questions", template="send_materials"),
+}
+_DEFAULT_ACTION = dict(action="acknowledge_and_offer_help", template="ack_general")
+
+
+class Policy:
+    # Precomputed decision table: a rank per actionable intent and the minimum
+    # confidence it needs, so choosing an action is one pass over the detected intents.
+
+    def __init__(self, priority: Sequence[str] = DEFAULT_PRIORITY, thresholds: Optional[Mapping[str, float]] = None):
+        unknown = [name for name in priority if name not in _ACTIONS]
+        if unknown:
+            raise ValueError(f"rules.priority: no action for intent(s) {', '.join(unknown)}")
+        self.priority = tuple(dict.fromkeys(priority))
+        self._rank = {name: rank for rank, name in enumerate(self.priority)}
+        self._min_conf = {name: float(v) for name, v in (thresholds or {}).items() if v is not None}
+
+    def choose(self, intents: Iterable[DetectedIntent]) -> Dict[str, Any]:
+        rank = self._rank
+        min_conf = self._min_conf
+        best_rank = len(rank)
+        best = None
         for it in intents:
-            if it.name == name:
-                best = it
-                break
-        if best:
-            break
-
-    if not best:
-        return {"action": "acknowledge_and_offer_help", "template": "ack_general"}
-
-    mapping = {
-        "pause_reminders": {"action": "pause_reminders", "template": "ack_pause"},
-        "not_interested": {"action": "log_and_close", "template": "ack_not_interested"},
-        "proceed": {"action": "send_agreement_and_form", "template": "send_agreement"},
-        "ask_billing_info": {"action": "provide_billing_details", "template": "provide_billing"},
-        "add_teammate": {"action": "welcome_teammate_and_share_docs", "template": "ack_add_teammate"},
-        "ask_pricing": {"action": "send_price_list", "template": "send_pricing"},
-        "ask_inclusions": {"action": "send_inclusions_info", "template": "send_inclusions"},
-        "redirect": {"action": "route_to_address", "template": "ack_redirect"},
-        "auto_reply_ooo": {"action": "schedule_followup_after_ooo", "template": "ack_ooo"},
-        "interest": {"action": "send_materials_and_questions", "template": "send_materials"},
-    }
-
-    return mapping.get(best.name, {"action": "acknowledge_and_offer_help", "template": "ack_general"})
+            r = rank.get(it.name, best_rank)
+            if r < best_rank and it.confidence >= min_conf.get(it.name, 0.0):
+                best_rank, best = r, it.name
+        # A fresh dict per call, so callers can add to their decision
+        return dict(_ACTIONS[best] if best is not None else _DEFAULT_ACTION)
+
+
+def build_policy(cfg: Dict[str, Any]) -> Policy:
+    rules = cfg.get("rules") or {}
+    return Policy(priority=rules.get("priority") or DEFAULT_PRIORITY, thresholds=rules.get("thresholds") or {})
+
+
+_DEFAULT_POLICY = Policy()
+
+
+def choose_next_action(intents: List[DetectedIntent], policy: Optional[Policy] = None) -> Dict[str, Any]:
+    return (policy or _DEFAULT_POLICY).choose(intents)
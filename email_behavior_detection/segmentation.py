@@ -0,0 +1,64 @@
+import re
+from typing import List
+
+from . import instrumentation
+from .models import Message
+
+
+# Lines that start quoted history; everything from here on is dropped
+_CUT_LINE_RE = re.compile(
+    r"^(?:"
+    r"-{2,}\s*original message\s*-{2,}"
+    r"|-{2,}\s*forwarded message\s*-{2,}"
+    r"|begin forwarded message:"
+    r"|_{10,}"
+    r"|sent from my \w+"
+    r"|get outlook for \w+"
+    r")",
+    re.I,
+)
+# "On <date>, <name> wrote:" (possibly wrapped over two lines) and common translations
+_ATTRIBUTION_RE = re.compile(
+    r"^(?:on\b.{0,300}\bwrote|le\b.{0,300}\ba écrit|am\b.{0,300}\bschrieb\b.{0,300}?|el\b.{0,300}\bescribió)\s*:\s*$",
+    re.I,
+)
+# Outlook-style header block: "From: ..." followed closely by Sent/Date/To/Subject
+_HEADER_FROM_RE = re.compile(r"^\*?from:\*?\s", re.I)
+_HEADER_NEXT_RE = re.compile(r"^\*?(?:sent|date|to|subject|cc):\*?\s", re.I)
+
+
+def split_reply(body: str) -> str:
+    # Keep only the newly written part of a reply: drop ">" quoted lines and cut at
+    # the first attribution line, forwarded/original-message marker, Outlook header
+    # block or signature delimiter. Returns "" when nothing new is left (a reply that is
+    # all quote, or a bare forward), so quoted intents are not detected again.
+    if not body:
+        return ""
+    lines = body.splitlines()
+    kept: List[str] = []
+    for i, line in enumerate(lines):
+        stripped = line.strip()
+        if stripped.startswith(">"):
+            continue
+        if line.rstrip(" ") == "--" or _CUT_LINE_RE.match(stripped):
+            break
+        if stripped and (
+            _ATTRIBUTION_RE.match(stripped)
+            or (i + 1 < len(lines) and _ATTRIBUTION_RE.match(f"{stripped} {lines[i + 1].strip()}"))
+        ):
+            break
+        if _HEADER_FROM_RE.match(stripped) and any(_HEADER_NEXT_RE.match(l.strip()) for l in lines[i + 1:i + 4]):
+            break
+        kept.append(line)
+    return "\n".join(kept).strip()
+
+
+def new_text(msg: Message) -> str:
+    # Cached on the message and reused for as long as msg.body is the same object
+    cached = msg._new_text
+    if cached is not None and cached[0] is msg.body:
+        return cached[1]
+    with instrumentation.span("segment"):
+        text = split_reply(msg.body)
+    msg._new_text = (msg.body, text)
+    return text
@@ -0,0 +1,265 @@
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from .config import load_config
+from .intents import IntentDetector
+from .pipeline import THREAD_FIELDS, build_detector, classify_item
+from .policy import Policy, build_policy
+from .templating import Templates, load_templates
+
+
+class Loaded:
+    # Everything one request needs, built together from one version of the files.
+    # Reloads build a new Loaded and swap it in; requests already running keep theirs.
+    __slots__ = ("detector", "policy", "templates", "stamp", "loaded_at")
+
+    def __init__(self, detector: IntentDetector, policy: Policy, templates: Templates, stamp: Tuple[Any, ...]):
+        self.detector = detector
+        self.policy = policy
+        self.templates = templates
+        self.stamp = stamp
+        self.loaded_at = time.time()
+
+
+def _stamp(*paths: str) -> Tuple[Any, ...]:
+    out = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+            out.append((st.st_mtime_ns, st.st_size))
+        except OSError:
+            out.append(None)
+    return tuple(out)
+
+
+class Latency:
+    # Rolling window of the most recent request durations for percentile reporting
+    def __init__(self, window: int = 10000):
+        self._samples: Deque[float] = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.count = 0
+        self.errors = 0
+
+    def add(self, seconds: float, error: bool = False) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+            self.count += 1
+            if error:
+                self.errors += 1
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            samples = sorted(self._samples)
+            out: Dict[str, Any] = {"count": self.count, "errors": self.errors}
+        for label, q in (("p50_ms", 0.50), ("p90_ms", 0.90), ("p99_ms", 0.99)):
+            # Nearest-rank percentile over the window
+            out[label] = round(1e3 * samples[min(len(samples) - 1, int(q * len(samples)))], 3) if samples else None
+        out["max_ms"] = round(1e3 * samples[-1], 3) if samples else None
+        return out
+
+
+class ClassificationService:
+    # Config, templates and the detector loaded once and kept warm between requests.
+    # When the config or templates file changes, the next check rebuilds them; a file
+    # that fails to load is reported and the previous version stays in service.
+
+    def __init__(
+        self,
+        config_path: str,
+        templates_path: str,
+        extra_ctx: Optional[Dict[str, Any]] = None,
+        reload_interval: float = 2.0,
+    ):
+        self.config_path = config_path
+        self.templates_path = templates_path
+        self.extra_ctx = extra_ctx or {}
+        self.reload_interval = reload_interval
+        self.reloads = 0
+        self.reload_error: Optional[str] = None
+        self._failed_stamp: Optional[Tuple[Any, ...]] = None
+        self.latency: Dict[str, Latency] = {"classify": Latency(), "classify_batch": Latency()}
+        self._reload_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._watcher: Optional[threading.Thread] = None
+        self.current = self._load()
+
+    def _load(self) -> Loaded:
+        stamp = _stamp(self.config_path, self.templates_path)
+        cfg = load_config(self.config_path)
+        templates = load_templates(self.templates_path)
+        return Loaded(build_detector(cfg), build_policy(cfg), templates, stamp)
+
+    def reload_if_changed(self) -> bool:
+        with self._reload_lock:
+            stamp = _stamp(self.config_path, self.templates_path)
+            if stamp == self.current.stamp or stamp == self._failed_stamp:
+                return False
+            try:
+                loaded = self._load()
+            except Exception as e:
+                # Not retried until the files change again
+                self._failed_stamp = stamp
+                self.reload_error = f"{type(e).__name__}: {e}"
+                sys.stderr.write(f"reload failed, keeping previous config: {self.reload_error}\n")
+                return False
+            self.current = loaded
+            self.reloads += 1
+            self.reload_error = None
+            return True
+
+    def start_watching(self) -> None:
+        if self._watcher is not None or self.reload_interval <= 0:
+            return
+
+        def run():
+            while not self._stop.wait(self.reload_interval):
+                self.reload_if_changed()
+
+        self._watcher = threading.Thread(target=run, name="config-watch", daemon=True)
+        self._watcher.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def classify(self, thread: Any) -> Dict[str, Any]:
+        # A thread that can't be classified gives {"error": ...}, as in classify_batch
+        cur = self.current
+        return classify_item(thread, cur.detector, cur.templates, self.extra_ctx, cur.policy)
+
+    def classify_batch(self, threads: List[Any]) -> List[Dict[str, Any]]:
+        # One snapshot for the whole batch, so a reload never splits it across configs
+        cur = self.current
+        return [classify_item(t, cur.detector, cur.templates, self.extra_ctx, cur.policy) for t in threads]
+
+    def stats(self) -> Dict[str, Any]:
+        cur = self.current
+        return {
+            "detector_version": cur.detector.version,
+            "loaded_at": cur.loaded_at,
+            "reloads": self.reloads,
+            "reload_error": self.reload_error,
+            "latency": {name: lat.summary() for name, lat in self.latency.items()},
+        }
+
+
+class _Handler(BaseHTTPRequestHandler):
+    service: ClassificationService
+    max_body: int
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format: str, *args: Any) -> None:
+        # Per-request access logs would dominate the cost of small requests
+        return
+
+    def _send(self, status: int, payload: Any) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self) -> None:
+        if self.path == "/healthz":
+            self._send(200, {"ok": True})
+        elif self.path == "/stats":
+            self._send(200, self.service.stats())
+        else:
+            self._send(404, {"error": f"unknown path {self.path}"})
+
+    def do_POST(self) -> None:
+        endpoint = self.path.strip("/")
+        if endpoint not in self.service.latency:
+            self._send(404, {"error": f"unknown path {self.path}"})
+            return
+        start = time.perf_counter()
+        try:
+            status, payload = self._dispatch(endpoint)
+        except Exception as e:
+            # Answered and counted like any other failed request, not a dropped connection
+            sys.stderr.write(f"error handling POST {self.path}: {type(e).__name__}: {e}\n")
+            status, payload = 500, {"error": f"internal error: {type(e).__name__}"}
+        try:
+            self._send(status, payload)
+        finally:
+            self.service.latency[endpoint].add(time.perf_counter() - start, error=status != 200)
+
+    def _dispatch(self, endpoint: str) -> Tuple[int, Any]:
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+        except ValueError:
+            length = -1
+        if length < 0:
+            # rfile.read(-1) would wait for the client to close the connection
+            self.close_connection = True
+            return 400, {"error": "invalid Content-Length"}
+        if length > self.max_body:
+            self.close_connection = True
+            return 413, {"error": f"request body larger than {self.max_body} bytes"}
+        try:
+            data = json.loads(self.rfile.read(length) or b"null")
+        except (json.JSONDecodeError, UnicodeDecodeError) as e:
+            return 400, {"error": f"invalid JSON: {e}"}
+
+        if endpoint == "classify":
+            if not isinstance(data, dict):
+                return 400, {"error": "expected a thread object"}
+            result = self.service.classify(data)
+            return (422 if "error" in result else 200), result
+        # /classify_batch takes a list of threads, or {"threads": [...]}; threads that
+        # can't be classified become {"error": ...} entries in the results
+        if isinstance(data, dict):
+            data = data.get("threads")
+        if not isinstance(data, list):
+            return 400, {"error": "expected a list of threads"}
+        return 200, {"results": self.service.classify_batch(data)}
+
+
+def make_server(
+    service: ClassificationService,
+    host: str = "127.0.0.1",
+    port: int = 8000,
+    max_body: int = 16 * 1024 * 1024,
+) -> ThreadingHTTPServer:
+    # One thread per connection; the detector, policy and templates are shared read-only
+    handler = type("Handler", (_Handler,), {"service": service, "max_body": max_body})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="HTTP service for email behavior detection")
+    parser.add_argument("--config", required=True, help="Path to YAML config")
+    parser.add_argument("--templates", required=True, help="Path to templates YAML")
+    parser.add_argument("--context", default="{}", help="Extra JSON context for templates")
+    parser.add_argument("--host", default="127.0.0.1", help="Address to bind (default 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8000, help="Port to listen on (default 8000)")
+    parser.add_argument("--reload-interval", type=float, default=2.0, help="Seconds between config/template change checks; 0 disables reloading (default 2)")
+    parser.add_argument("--max-body-mb", type=int, default=16, help="Largest accepted request body in MB (default 16)")
+    args = parser.parse_args(argv)
+
+    service = ClassificationService(args.config, args.templates, json.loads(args.context), args.reload_interval)
+    for name, missing in service.current.templates.check({**dict.fromkeys(THREAD_FIELDS, ""), **service.extra_ctx}).items():
+        sys.stderr.write(f"warning: template {name!r} needs {', '.join(missing)} (pass via --context)\n")
+    server = make_server(service, args.host, args.port, args.max_body_mb * 1024 * 1024)
+    service.start_watching()
+    sys.stderr.write(f"listening on http://{args.host}:{server.server_address[1]}\n")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.stop()
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
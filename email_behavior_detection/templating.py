@@ -1,18 +1,139 @@
-from typing import Dict, Any
+import threading
+import time
+from string import Formatter
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional, Tuple
 import yaml
 
 
-def load_templates(path: str) -> Dict[str, str]:
+_CONVERSIONS: Dict[str, Callable[[Any], Any]] = {"s": str, "r": repr, "a": ascii}
+
+
+class CompiledTemplate:
+    # A template parsed once with string.Formatter: literal text and field references
+    # are kept as a flat list, so rendering is a join with no re-parsing. Templates with
+    # attribute/index lookups or nested format specs fall back to str.format. Instances
+    # are shared between threads (server handlers, Streamlit sessions); only the render
+    # stats change after construction, and they are updated under a lock.
+    __slots__ = ("name", "source", "fields", "_parts", "renders", "fallbacks", "seconds", "_lock")
+
+    def __init__(self, name: str, source: str):
+        self.name = name
+        self.source = source
+        self.renders = 0
+        self.fallbacks = 0
+        self.seconds = 0.0
+        self._lock = threading.Lock()
+        fields: List[str] = []
+        parts: Optional[List[Tuple[str, Optional[str], str, Optional[Callable[[Any], Any]]]]] = []
+        try:
+            parsed = list(Formatter().parse(source))
+        except ValueError:
+            # Unbalanced braces: rendering always falls back to the raw text
+            parsed = []
+            parts = None
+        for literal, field, spec, conversion in parsed:
+            if field is None:
+                if parts is not None:
+                    parts.append((literal, None, "", None))
+                continue
+            root = field.split(".", 1)[0].split("[", 1)[0]
+            if root not in fields:
+                fields.append(root)
+            if parts is not None and field.isidentifier() and "{" not in spec:
+                parts.append((literal, field, spec, _CONVERSIONS[conversion] if conversion else None))
+            else:
+                parts = None
+        self.fields: Tuple[str, ...] = tuple(fields)
+        self._parts = parts
+
+    def missing(self, ctx: Mapping[str, Any]) -> List[str]:
+        return [f for f in self.fields if f not in ctx]
+
+    def _format(self, ctx: Mapping[str, Any]) -> str:
+        if self._parts is None:
+            return self.source.format(**ctx)
+        out = []
+        for literal, field, spec, convert in self._parts:
+            out.append(literal)
+            if field is not None:
+                value = ctx[field]
+                out.append(format(convert(value) if convert else value, spec))
+        return "".join(out)
+
+    def render(self, ctx: Mapping[str, Any], strict: bool = False) -> str:
+        # Any formatting error (typically a missing field) returns the raw template,
+        # as render_template always has; strict=True raises instead.
+        start = time.perf_counter()
+        fallback = False
+        try:
+            return self._format(ctx)
+        except Exception:
+            if strict:
+                raise
+            fallback = True
+            return self.source
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.renders += 1
+                self.fallbacks += fallback
+                self.seconds += elapsed
+
+    def render_many(self, contexts: Iterable[Mapping[str, Any]], strict: bool = False) -> List[str]:
+        return [self.render(ctx, strict) for ctx in contexts]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"renders": self.renders, "fallbacks": self.fallbacks, "seconds": self.seconds}
+
+
+class Templates(dict):
+    # name -> template string, as load_templates always returned, plus the compiled form
+    # of each template. Built once per load; the compiled entries carry render stats.
+
+    def __init__(self, data: Optional[Mapping[str, str]] = None):
+        super().__init__(data or {})
+        self.compiled: Dict[str, CompiledTemplate] = {
+            name: CompiledTemplate(name, tpl) for name, tpl in self.items() if isinstance(tpl, str)
+        }
+
+    def get_compiled(self, name: str) -> Optional[CompiledTemplate]:
+        return self.compiled.get(name) or self.compiled.get("ack_general")
+
+    def check(self, ctx: Mapping[str, Any]) -> Dict[str, List[str]]:
+        # Templates that would fall back to raw text with this context, and what they lack
+        return {name: missing for name, t in self.compiled.items() if (missing := t.missing(ctx))}
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {name: t.stats() for name, t in self.compiled.items() if t.renders}
+
+
+def compile_templates(data: Mapping[str, str]) -> Templates:
+    return data if isinstance(data, Templates) else Templates(data)
+
+
+def load_templates(path: str) -> Templates:
     with open(path, "r", encoding="utf-8") as f:
         data = yaml.safe_load(f) or {}
     # Expect a mapping name -> template string
-    return data
+    return Templates(data)
 
 
 def render_template(templates: Dict[str, str], name: str, ctx: Dict[str, Any]) -> str:
+    if isinstance(templates, Templates):
+        compiled = templates.get_compiled(name)
+        return compiled.render(ctx) if compiled is not None else ""
     tpl = templates.get(name, templates.get("ack_general", ""))
     try:
         return tpl.format(**ctx)
     except Exception:
         # Fallback render without formatting on error
         return tpl
+
+
+def render_many(templates: Dict[str, str], name: str, contexts: Iterable[Mapping[str, Any]]) -> List[str]:
+    # One template against many contexts; the template is resolved and compiled once
+    compiled = compile_templates(templates).get_compiled(name)
+    if compiled is None:
+        return ["" for _ in contexts]
+    return compiled.render_many(contexts)
@@ -0,0 +1,100 @@
+import hashlib
+import json
+import os
+from typing import Any, Dict, List, Optional
+
+from .intents import DetectedIntent, IntentDetector
+from .models import Message, Thread
+from .pipeline import build_result
+from .policy import Policy
+
+
+def message_key(msg: Message) -> str:
+    # Hash of the fields detect() reads; equal content means equal detections
+    h = hashlib.sha1()
+    for part in (msg.from_name, msg.from_email, msg.body):
+        h.update(part.encode("utf-8", "surrogatepass"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+class ThreadState:
+    # Detections for one conversation, remembered per message so that re-checking a
+    # thread after a new reply only runs the detector on messages it has not seen.
+    # Entries are keyed by message_key and tied to the detector's version; a detector
+    # with different rules or team lists starts from scratch.
+
+    def __init__(self, version: str = "", results: Optional[Dict[str, List[DetectedIntent]]] = None):
+        self.version = version
+        self._results: Dict[str, List[DetectedIntent]] = dict(results or {})
+        # Messages run through the detector by the last update()
+        self.evaluated = 0
+
+    def __len__(self) -> int:
+        return len(self._results)
+
+    def update(self, thread: Thread, detector: IntentDetector) -> List[List[DetectedIntent]]:
+        # Returns the detections for every message of `thread`, in order
+        if detector.version != self.version:
+            self.version = detector.version
+            self._results = {}
+        results: Dict[str, List[DetectedIntent]] = {}
+        out: List[List[DetectedIntent]] = []
+        evaluated = 0
+        for msg in thread.messages:
+            key = message_key(msg)
+            intents = results.get(key)
+            if intents is None:
+                intents = self._results.get(key)
+            if intents is None:
+                intents = detector.detect(msg)
+                evaluated += 1
+            results[key] = intents
+            out.append(intents)
+        # Messages no longer in the thread are forgotten
+        self._results = results
+        self.evaluated = evaluated
+        return out
+
+    def classify(
+        self,
+        thread: Thread,
+        detector: IntentDetector,
+        templates: Dict[str, str],
+        extra_ctx: Optional[Dict[str, Any]] = None,
+        policy: Optional[Policy] = None,
+    ) -> Dict[str, Any]:
+        # Same output as pipeline.classify_thread
+        return build_result(thread, self.update(thread, detector), templates, extra_ctx, policy)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "version": self.version,
+            "messages": {key: [i.__dict__ for i in intents] for key, intents in self._results.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ThreadState":
+        return cls(
+            version=data.get("version", ""),
+            results={
+                key: [DetectedIntent(**i) for i in intents]
+                for key, intents in (data.get("messages") or {}).items()
+            },
+        )
+
+    def save(self, path: str) -> None:
+        # Written to a temporary file and renamed so a crash never leaves half a state
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> "ThreadState":
+        # A missing or unreadable file gives an empty state
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return cls.from_dict(json.load(f))
+        except (OSError, ValueError, TypeError):
+            return cls()
@@ -0,0 +1,114 @@
+import sys
+from array import array
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+from .models import Message, Thread
+
+
+class ThreadStore:
+    # Columnar, append-only storage for many threads. Bodies live in one UTF-8 buffer
+    # addressed by offsets, sender/recipient addresses in a shared string table
+    # referenced by index, and per-message metadata is only kept when non-empty.
+    # Messages are materialized as regular Message/Thread objects on access, so the
+    # rest of the package works on stored threads unchanged.
+
+    def __init__(self):
+        self._strings: List[str] = []
+        self._string_ids: Dict[str, int] = {}
+        self._bodies = bytearray()
+        self._body_offsets = array("Q", [0])
+        self._timestamps: List[str] = []
+        self._from_name = array("L")
+        self._from_email = array("L")
+        # Recipients of message i: _recipients[_rcpt_offsets[i]:_rcpt_offsets[i + 1]],
+        # the first _to_counts[i] of them are "to", the rest "cc"
+        self._recipients = array("L")
+        self._rcpt_offsets = array("Q", [0])
+        self._to_counts = array("L")
+        self._meta: Dict[int, Tuple[Tuple[str, str], ...]] = {}
+        self._subjects: List[str] = []
+        self._thread_offsets = array("Q", [0])
+
+    @classmethod
+    def from_threads(cls, threads: Iterable[Thread]) -> "ThreadStore":
+        store = cls()
+        for thread in threads:
+            store.add(thread)
+        return store
+
+    def _sid(self, value: str) -> int:
+        sid = self._string_ids.get(value)
+        if sid is None:
+            sid = self._string_ids[value] = len(self._strings)
+            self._strings.append(value)
+        return sid
+
+    def add(self, thread: Thread) -> int:
+        # Returns the index of the stored thread
+        for msg in thread.messages:
+            self._bodies += msg.body.encode("utf-8", "surrogatepass")
+            self._body_offsets.append(len(self._bodies))
+            self._timestamps.append(msg.timestamp)
+            self._from_name.append(self._sid(msg.from_name))
+            self._from_email.append(self._sid(msg.from_email))
+            self._recipients.extend(self._sid(a) for a in msg.to)
+            self._recipients.extend(self._sid(a) for a in msg.cc)
+            self._rcpt_offsets.append(len(self._recipients))
+            self._to_counts.append(len(msg.to))
+            if msg.meta:
+                self._meta[len(self._timestamps) - 1] = tuple((sys.intern(k), v) for k, v in msg.meta.items())
+        self._subjects.append(thread.subject)
+        self._thread_offsets.append(len(self._timestamps))
+        return len(self._subjects) - 1
+
+    def __len__(self) -> int:
+        return len(self._subjects)
+
+    @property
+    def message_count(self) -> int:
+        return len(self._timestamps)
+
+    def body(self, i: int) -> str:
+        return self._bodies[self._body_offsets[i]:self._body_offsets[i + 1]].decode("utf-8", "surrogatepass")
+
+    def message(self, i: int) -> Message:
+        strings = self._strings
+        rcpt = self._recipients[self._rcpt_offsets[i]:self._rcpt_offsets[i + 1]]
+        n_to = self._to_counts[i]
+        return Message(
+            timestamp=self._timestamps[i],
+            from_name=strings[self._from_name[i]],
+            from_email=strings[self._from_email[i]],
+            to=[strings[s] for s in rcpt[:n_to]],
+            cc=[strings[s] for s in rcpt[n_to:]],
+            body=self.body(i),
+            meta=dict(self._meta.get(i, ())),
+        )
+
+    def thread(self, t: int) -> Thread:
+        start, end = self._thread_offsets[t], self._thread_offsets[t + 1]
+        return Thread(subject=self._subjects[t], messages=[self.message(i) for i in range(start, end)])
+
+    def __getitem__(self, t: int) -> Thread:
+        if t < 0:
+            t += len(self)
+        if not 0 <= t < len(self):
+            raise IndexError("thread index out of range")
+        return self.thread(t)
+
+    def __iter__(self) -> Iterator[Thread]:
+        for t in range(len(self)):
+            yield self.thread(t)
+
+    def nbytes(self, include_strings: bool = False) -> int:
+        # Size of the columnar buffers (plus the shared string table if asked)
+        total = len(self._bodies) + sum(
+            a.itemsize * len(a)
+            for a in (
+                self._body_offsets, self._from_name, self._from_email,
+                self._recipients, self._rcpt_offsets, self._to_counts, self._thread_offsets,
+            )
+        )
+        if include_strings:
+            total += sum(len(s.encode("utf-8", "surrogatepass")) for s in self._strings)
+        return total
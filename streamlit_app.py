@@ -1,13 +1,20 @@
+import hashlib
 import json
+from collections import OrderedDict
+
 import streamlit as st
+import yaml
+
+from email_behavior_detection.config import normalize_config
+from email_behavior_detection.pipeline import build_detector, thread_from_dict
+from email_behavior_detection.policy import build_policy
+from email_behavior_detection.templating import compile_templates
+from email_behavior_detection.thread_state import ThreadState
 
-from email_behavior_detection.models import Thread, Message
-from email_behavior_detection.config import load_config
-from email_behavior_detection.intents import IntentDetector
-from email_behavior_detection.policy import choose_next_action
-from email_behavior_detection.templating import load_templates, render_template
-from email_behavior_detection.ingest_imap import fetch_thread_by_subject
-from email_behavior_detection.gmail_oauth import get_access_token
+DEFAULT_CONFIG = "configs/default_config.yaml"
+DEFAULT_TEMPLATES = "templates/default_templates.yaml"
+# Per-session thread states kept, least recently used dropped first
+MAX_THREAD_STATES = 32
 
 
 st.set_page_config(page_title="Email Behavior Detection", layout="wide")
@@ -55,9 +62,40 @@ def _load_json_bytes(b: bytes):
     return json.loads(b.decode("utf-8"))
 
 
-def _load_yaml_bytes(b: bytes):
-    import yaml
-    return yaml.safe_load(b.decode("utf-8"))
+def _read_bytes(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def _digest(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+# Streamlit re-runs this script on every interaction. Parsed config and templates and the
+# detector built from them are cached process-wide, keyed by a hash of the file content
+# (arguments starting with "_" are not hashed by Streamlit), so they are rebuilt only when
+# a different file is supplied.
+@st.cache_resource(max_entries=8, show_spinner=False)
+def _engine(key: str, _data: bytes):
+    cfg = normalize_config(yaml.safe_load(_data.decode("utf-8")))
+    return build_detector(cfg), build_policy(cfg)
+
+
+@st.cache_resource(max_entries=8, show_spinner=False)
+def _templates(key: str, _data: bytes):
+    return compile_templates(yaml.safe_load(_data.decode("utf-8")) or {})
+
+
+def _gmail_password(client_secret: str, token_path: str) -> str:
+    # Tokens come from the process-wide cache, which refreshes them ahead of expiry; the
+    # consent flow (and the google-auth import) only runs when there is no usable token
+    from email_behavior_detection.gmail_oauth import get_access_token
+
+    cs_path = ".gmail_client_secret.json"
+    with open(cs_path, "w", encoding="utf-8") as f:
+        f.write(client_secret)
+    token, _ = get_access_token(cs_path, token_path, use_console=True)
+    return f"oauth2:{token}"
 
 
 col1, col2 = st.columns([1, 1])
@@ -67,9 +105,9 @@ if run_btn:
         # Thread source
         if mode == "Upload/Paste JSON":
             if 'thread_file' in locals() and thread_file is not None:
-                thread_data = _load_json_bytes(thread_file.read())
+                thread = thread_from_dict(_load_json_bytes(thread_file.getvalue()))
             elif 'thread_text' in locals() and thread_text.strip():
-                thread_data = json.loads(thread_text)
+                thread = thread_from_dict(json.loads(thread_text))
             else:
                 st.error("Please upload or paste a thread JSON.")
                 st.stop()
@@ -78,20 +116,18 @@ if run_btn:
             if not (imap_host and imap_username and imap_subject):
                 st.error("IMAP: host, username, and subject are required.")
                 st.stop()
+            from email_behavior_detection.imap_pool import shared_pool
+            from email_behavior_detection.ingest_imap import fetch_thread_by_subject
+
             # Determine auth
             pwd = imap_password
             if auth_mode == "Gmail OAuth2":
                 if not gmail_client_secret:
                     st.error("Upload client_secret.json for Gmail OAuth2.")
                     st.stop()
-                # Persist client_secret.json and token file on disk for the helper
-                import os, json as _json
-                cs_path = ".gmail_client_secret.json"
-                with open(cs_path, "w", encoding="utf-8") as f:
-                    f.write(gmail_client_secret)
-                token_path = gmail_token_file or ".gmail_token.json"
-                token, _ = get_access_token(cs_path, token_path, use_console=True)
-                pwd = f"oauth2:{token}"
+                pwd = _gmail_password(gmail_client_secret, gmail_token_file or ".gmail_token.json")
+            # The shared pool keeps each user's authenticated session (keyed by host,
+            # username, mailbox and credential) open between runs
             thread = fetch_thread_by_subject(
                 host=imap_host,
                 port=int(imap_port or 993),
@@ -100,95 +136,31 @@ if run_btn:
                 subject=imap_subject,
                 mailbox=imap_mailbox or "INBOX",
                 limit=int(imap_limit or 0) or None,
+                pool=shared_pool(),
             )
-            thread_data = {
-                "subject": thread.subject,
-                "messages": [
-                    {
-                        "timestamp": m.timestamp,
-                        "from_name": m.from_name,
-                        "from_email": m.from_email,
-                        "to": m.to,
-                        "cc": m.cc,
-                        "body": m.body,
-                        "meta": m.meta,
-                    }
-                    for m in thread.messages
-                ],
-            }
-
-        # Config
-        if config_file is not None:
-            cfg = _load_yaml_bytes(config_file.read()) or {}
-        else:
-            # Fallback to default config in repo
-            cfg = load_config("configs/default_config.yaml")
 
-        # Templates
-        if templates_file is not None:
-            templates = _load_yaml_bytes(templates_file.read()) or {}
-        else:
-            templates = load_templates("templates/default_templates.yaml")
+        # Config and templates: uploaded files, or the defaults in the repo
+        cfg_bytes = config_file.getvalue() if config_file is not None else _read_bytes(DEFAULT_CONFIG)
+        detector, policy = _engine(_digest(cfg_bytes), cfg_bytes)
+        tpl_bytes = templates_file.getvalue() if templates_file is not None else _read_bytes(DEFAULT_TEMPLATES)
+        templates = _templates(_digest(tpl_bytes), tpl_bytes)
 
         # Context
         extra_ctx = json.loads(ctx_text or "{}")
 
-    # Build objects
-        messages = [
-            {
-                "timestamp": m.get("timestamp", ""),
-                "from_name": m.get("from_name", ""),
-                "from_email": m.get("from_email", ""),
-                "to": m.get("to", []),
-                "cc": m.get("cc", []),
-                "body": m.get("body", ""),
-                "meta": m.get("meta", {}),
-            }
-            for m in thread_data.get("messages", [])
-        ]
-
-        # Build Thread object directly
-        thread = Thread(
-            subject=thread_data.get("subject", ""),
-            messages=[
-                Message(
-                    timestamp=m["timestamp"],
-                    from_name=m["from_name"],
-                    from_email=m["from_email"],
-                    to=m.get("to", []),
-                    cc=m.get("cc", []),
-                    body=m.get("body", ""),
-                    meta=m.get("meta", {}),
-                )
-                for m in messages
-            ],
-        )
-
     except Exception as e:
         st.exception(e)
         st.stop()
 
-    # Detect
-    detector = IntentDetector(
-        rules=cfg.get("rules", {}),
-        team_domains=cfg.get("team", {}).get("domains", []),
-        team_addresses=cfg.get("team", {}).get("addresses", []),
-    )
-
-    detections = []
-    for msg in thread.messages:
-        intents = detector.detect(msg)
-        detections.append({"from": msg.from_email, "intents": [i.__dict__ for i in intents]})
-
-    latest_intents = detector.detect(thread.messages[-1]) if thread.messages else []
-    decision = choose_next_action(latest_intents)
-    ctx = {
-        "subject": thread.subject,
-        "latest_from": thread.messages[-1].from_name if thread.messages else "",
-        "latest_email": thread.messages[-1].from_email if thread.messages else "",
-        **extra_ctx,
-    }
-    draft = render_template(templates, decision.get("template", "ack_general"), ctx)
+    # Detect. Per-thread state kept for the session: re-running on a thread that gained a
+    # reply only detects the new messages
+    states = st.session_state.setdefault("thread_states", OrderedDict())
+    state = states.pop(thread.subject, None) or ThreadState()
+    states[thread.subject] = state
+    while len(states) > MAX_THREAD_STATES:
+        states.popitem(last=False)
+    result = state.classify(thread, detector, templates, extra_ctx, policy)
+    detections, decision, draft = result["detections"], result["decision"], result["draft"]
 
     with col1:
         st.subheader("Detections")
@@ -0,0 +1,36 @@
+import pytest
+
+from email_behavior_detection.config import load_config
+from email_behavior_detection.pipeline import build_detector
+from email_behavior_detection.policy import build_policy
+from email_behavior_detection.templating import load_templates
+
+CONFIG = "configs/default_config.yaml"
+TEMPLATES = "templates/default_templates.yaml"
+THREAD = "examples/thread_example.json"
+
+
+@pytest.fixture(scope="session")
+def cfg():
+    return load_config(CONFIG)
+
+
+@pytest.fixture(scope="session")
+def detector(cfg):
+    return build_detector(cfg)
+
+
+@pytest.fixture(scope="session")
+def policy(cfg):
+    return build_policy(cfg)
+
+
+@pytest.fixture(scope="session")
+def templates():
+    return load_templates(TEMPLATES)
+
+
+@pytest.fixture
+def thread_json():
+    with open(THREAD, "r", encoding="utf-8") as f:
+        return f.read()
@@ -0,0 +1,153 @@
+import json
+import mailbox
+from email.message import EmailMessage
+
+import pytest
+
+from email_behavior_detection.archive import ThreadArchive
+from email_behavior_detection.models import Thread
+from email_behavior_detection.pipeline import thread_from_dict
+
+CONFIG = "configs/default_config.yaml"
+TEMPLATES = "templates/default_templates.yaml"
+
+
+def _threads(thread_json):
+    thread_json = json.loads(thread_json)
+    big = dict(thread_json, subject="Ünïcode ✓ " + "x" * 70000)
+    return [thread_json, big, thread_json]
+
+
+def test_json_array_matches_json_load(tmp_path, thread_json):
+    data = _threads(thread_json)
+    path = tmp_path / "a.json"
+    path.write_text(" [\n" + ",\n ".join(json.dumps(d, ensure_ascii=False) for d in data) + "\n]\n", encoding="utf-8")
+    expected = [thread_from_dict(d) for d in data]
+    with ThreadArchive(str(path)) as archive:
+        seen = list(archive)
+        assert [t for _, t in seen] == expected
+        assert [t for _, t in archive.iter_threads(start=seen[1][0])] == expected[1:]
+        assert archive.build_index() == 3
+        assert archive.thread(1) == expected[1]
+    with ThreadArchive(str(path), index_path=f"{path}.idx") as archive:
+        assert archive.indexed and len(archive) == 3 and archive.thread(2) == expected[2]
+
+
+def test_jsonl(tmp_path, thread_json):
+    data = _threads(thread_json)
+    path = tmp_path / "a.jsonl"
+    path.write_text("\n".join(json.dumps(d, ensure_ascii=False) for d in data) + "\n\n", encoding="utf-8")
+    with ThreadArchive(str(path)) as archive:
+        assert [t for _, t in archive] == [thread_from_dict(d) for d in data]
+        assert not archive.indexed
+        assert archive.build_index(path="") == 3 and len(archive) == 3
+
+
+def _mail(i, subject, reply=None):
+    m = EmailMessage()
+    m["From"] = f"P{i} <p{i}@x.com>"
+    m["To"] = "me@y.com"
+    m["Subject"] = subject
+    m["Message-ID"] = f"<m{i}@x>"
+    m["Date"] = f"Mon, {i + 1:02d} Jan 2024 10:00:00 +0000"
+    if reply is not None:
+        m["In-Reply-To"] = m["References"] = f"<m{reply}@x>"
+    m.set_content(f"hello From here\nmsg {i}")
+    return m
+
+
+def _mbox(tmp_path):
+    path = str(tmp_path / "a.mbox")
+    box = mailbox.mbox(path)
+    for m in (_mail(0, "A"), _mail(1, "B"), _mail(2, "Re: A", 0), _mail(3, "Re: B", 1), _mail(4, "Re: A", 2)):
+        box.add(m)
+    box.flush()
+    box.close()
+    return path
+
+
+def test_mbox_threads(tmp_path):
+    path = _mbox(tmp_path)
+    with ThreadArchive(path) as archive:
+        seen = [(t.subject, [m.from_email for m in t.messages]) for _, t in archive]
+        assert seen == [("A", ["p0@x.com", "p2@x.com", "p4@x.com"]), ("B", ["p1@x.com", "p3@x.com"])]
+        assert archive.build_index(path="") == 2
+        assert archive.thread(1).messages[0].body.startswith("hello From here")
+
+
+def test_mbox_resume_keeps_threads_whole(tmp_path):
+    path = _mbox(tmp_path)
+    with ThreadArchive(path) as archive:
+        offsets = [offset for offset, _ in archive]
+        # Resuming inside thread "A" (its replies come later in the file) never re-emits
+        # part of it; only threads starting at or after `start` come back, whole
+        for start in range(0, offsets[-1] + 2, 37):
+            resumed = [(o, [m.from_email for m in t.messages]) for o, t in archive.iter_threads(start=start)]
+            assert [o for o, _ in resumed] == [o for o in offsets if o >= start]
+            if resumed and resumed[-1][0] == offsets[-1]:
+                assert resumed[-1][1] == ["p1@x.com", "p3@x.com"]
+        assert [o for o, _ in archive.iter_threads(start=offsets[1])] == [offsets[1]]
+
+
+def test_malformed_jsonl_lines_become_errors(tmp_path, thread_json):
+    good = json.dumps(json.loads(thread_json))
+    path = tmp_path / "a.jsonl"
+    path.write_text("\n".join([good, "{not json", "[1, 2]", '{"messages": null}', good]) + "\n", encoding="utf-8")
+    with ThreadArchive(str(path)) as archive:
+        items = [item for _, item in archive.records()]
+    assert [type(i).__name__ for i in items] == ["Thread", "JSONDecodeError", "TypeError", "TypeError", "Thread"]
+    assert str(items[2]) == "expected a thread object, got list"
+
+
+def test_malformed_json_array_elements_become_errors(tmp_path, thread_json):
+    good = json.dumps(json.loads(thread_json))
+    path = tmp_path / "a.json"
+    # An invalid value, and one whose brackets only balance when strings are skipped
+    bad = ['{"a": }', '{"s": "}\\"]", "x": [}]']
+    path.write_text("[" + ", ".join([good, *bad, "7", good]) + "]", encoding="utf-8")
+    with ThreadArchive(str(path)) as archive:
+        items = list(archive.records())
+        assert [type(i).__name__ for _, i in items] == ["Thread", "JSONDecodeError", "JSONDecodeError", "TypeError", "Thread"]
+        # Resuming at a good record after the bad ones
+        assert [o for o, _ in archive.records(start=items[4][0])] == [items[4][0]]
+        assert archive.build_index(path="") == 5
+
+
+def test_unterminated_json_value_stops_at_the_size_cap(tmp_path, thread_json):
+    good = json.dumps(json.loads(thread_json))
+    path = tmp_path / "a.json"
+    path.write_text(f'[{good}, {{"messages": [' + "1, " * 20000, encoding="utf-8")
+    with ThreadArchive(str(path), max_record_bytes=1 << 14) as archive:
+        items = list(archive.records())
+        assert isinstance(items[0][1], Thread) and len(items) == 2
+        assert "larger than 16384 bytes" in str(items[1][1])
+        with pytest.raises(ValueError):
+            list(archive)
+
+
+def test_cli_archive_reports_bad_records_and_continues(tmp_path, thread_json, capsys):
+    from email_behavior_detection import cli
+
+    good = json.dumps(json.loads(thread_json))
+    path = tmp_path / "a.jsonl"
+    path.write_text(f"{good}\n{{oops\n{good}\n", encoding="utf-8")
+    cli.main(["--archive", str(path), "--config", CONFIG, "--templates", TEMPLATES])
+    lines = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert [sorted(line) for line in lines] == [
+        ["decision", "detections", "draft", "offset", "subject"],
+        ["error", "offset"],
+        ["decision", "detections", "draft", "offset", "subject"],
+    ]
+    assert lines[1]["offset"] == len(good) + 1
+
+
+def test_no_index_is_built_implicitly(tmp_path, thread_json, monkeypatch):
+    path = tmp_path / "a.jsonl"
+    path.write_text(json.dumps(json.loads(thread_json)) + "\n", encoding="utf-8")
+    with ThreadArchive(str(path)) as archive:
+        monkeypatch.setattr(archive, "build_index", lambda *a, **k: pytest.fail("index built"))
+        assert len(list(archive)) == 1
+        with pytest.raises(TypeError):
+            len(archive)
+        with pytest.raises(ValueError):
+            archive.thread(0)
@@ -0,0 +1,63 @@
+import asyncio
+
+from email_behavior_detection import async_ingest
+from email_behavior_detection.async_ingest import MailboxSource, _Connection, classify_mailboxes
+from email_behavior_detection.imap_pool import ImapPool
+from email_behavior_detection.models import Message
+
+
+class FakeIMAP:
+    def __init__(self, host=None, port=None):
+        self.logged_out = False
+
+    def login(self, username, password):
+        return "OK", [b""]
+
+    def select(self, mailbox):
+        return "OK", [b"1"]
+
+    def logout(self):
+        self.logged_out = True
+        return "BYE", [b""]
+
+
+def test_messages_without_body_are_still_emitted(monkeypatch, detector):
+    def headers(imap, uids, chunk):
+        for uid in uids:
+            yield uid, None, "Rates", Message("", "Ann", "ann@x.com", [], [], "", meta={"subject": "Rates"})
+
+    def text_parts(imap, uids, chunk):
+        # The server returns no body for UID 2
+        for uid in uids:
+            if uid != b"2":
+                yield uid, ("1", "plain", "7bit", "utf-8"), b"What is the price?"
+
+    monkeypatch.setattr(async_ingest, "connect", lambda *a, **k: FakeIMAP())
+    monkeypatch.setattr(async_ingest, "_search", lambda imap, subject: [b"1", b"2", b"3"])
+    monkeypatch.setattr(async_ingest, "_fetch_headers", headers)
+    monkeypatch.setattr(async_ingest, "_fetch_text_parts", text_parts)
+
+    async def collect():
+        source = MailboxSource("h", "u", "pw")
+        return [r async for r in classify_mailboxes([source], detector)]
+
+    results = {r.uid: r for r in asyncio.run(collect())}
+    assert sorted(results) == [1, 2, 3]
+    assert results[2].message.body == "" and results[2].message.meta["body_unavailable"] == "1"
+    assert "ask_pricing" in [i.name for i in results[1].intents]
+
+
+def test_close_after_error_discards_session_without_reraising():
+    pool = ImapPool(factory=FakeIMAP)
+    conn = _Connection(MailboxSource("h", "u", "pw"), pool)
+    imap = conn.open()
+    conn.close(RuntimeError("fetch failed"))
+    assert imap.logged_out
+    assert not any(pool._idle.values())
+
+    conn = _Connection(MailboxSource("h", "u", "pw"), pool)
+    reused = conn.open()
+    conn.close()
+    assert reused is not imap and not reused.logged_out
+    assert sum(len(v) for v in pool._idle.values()) == 1
+    pool.close()
@@ -0,0 +1,94 @@
+import io
+import json
+
+from email_behavior_detection.cli import run_batch
+
+
+def _run(lines, detector, templates, policy):
+    out = io.StringIO()
+    count = run_batch(io.StringIO("\n".join(lines) + "\n"), out, detector, templates, {}, policy)
+    return count, [json.loads(line) for line in out.getvalue().splitlines()]
+
+
+def test_bad_lines_become_numbered_errors(detector, templates, policy, thread_json):
+    good = json.dumps(json.loads(thread_json))
+    lines = [
+        good,
+        "",
+        "not json",
+        '{"messages": null}',
+        '{"messages": "abc"}',
+        '{"messages": [{"body": 5}]}',
+        good,
+    ]
+    count, results = _run(lines, detector, templates, policy)
+    assert count == 6
+    assert "decision" in results[0] and "decision" in results[-1]
+    errors = [r["error"] for r in results[1:-1]]
+    assert [e.split(":", 1)[0] for e in errors] == ["line 3", "line 4", "line 5", "line 6"]
+
+
+def test_good_lines_match_single_thread_output(detector, templates, policy, thread_json):
+    from email_behavior_detection.pipeline import classify_thread, thread_from_dict
+
+    expected = classify_thread(thread_from_dict(json.loads(thread_json)), detector, templates, {}, policy)
+    _, results = _run([json.dumps(json.loads(thread_json))], detector, templates, policy)
+    assert results == [json.loads(json.dumps(expected))]
+
+
+def test_parallel_errors_carry_line_numbers(thread_json):
+    from email_behavior_detection.cli import run_batch_parallel
+
+    good = json.dumps(json.loads(thread_json))
+    src = io.StringIO("\n".join([good, "", "[1, 2]", '{"messages": null}', good]) + "\n")
+    out = io.StringIO()
+    assert run_batch_parallel(src, out, "configs/default_config.yaml", "templates/default_templates.yaml", {}, workers=2) == 4
+    results = [json.loads(line) for line in out.getvalue().splitlines()]
+    assert results[1]["error"] == "line 3: expected a thread object, got list"
+    assert results[2]["error"].startswith("line 4: ")
+    assert "decision" in results[0] and "decision" in results[3]
+
+
+def test_classify_item_rejects_non_threads(detector, templates, policy):
+    from email_behavior_detection.pipeline import classify_item
+
+    assert "error" in classify_item("42", detector, templates, {}, policy)
+    assert "error" in classify_item({"messages": [None]}, detector, templates, {}, policy)
+
+
+def _consumed_lines(thread_json, n, seen):
+    line = json.dumps(json.loads(thread_json))
+    for i in range(n):
+        seen.append(i)
+        yield line
+
+
+def test_classify_parallel_streams_in_order_with_bounded_input(thread_json):
+    from email_behavior_detection.parallel import classify_parallel
+
+    seen = []
+    results = classify_parallel(
+        _consumed_lines(thread_json, 200, seen), "configs/default_config.yaml", "templates/default_templates.yaml",
+        workers=2, chunksize=2,
+    )
+    first = next(results)
+    # One result out: the pool has read at most its window (workers * chunksize * 4)
+    # plus the item it was about to hand out
+    assert first[0] == 0 and len(seen) <= 17
+    rest = list(results)
+    assert [idx for idx, _ in rest] == list(range(1, 200))
+    assert all("decision" in r for _, r in rest)
+
+
+def test_classify_parallel_can_stop_early(thread_json):
+    from email_behavior_detection.parallel import classify_parallel
+
+    seen = []
+    results = classify_parallel(
+        _consumed_lines(thread_json, 1000, seen), "configs/default_config.yaml", "templates/default_templates.yaml",
+        workers=2, chunksize=2,
+    )
+    assert [next(results)[0] for _ in range(5)] == [0, 1, 2, 3, 4]
+    # Closing must not hang on the pool's feeder thread, blocked waiting for a slot
+    results.close()
+    assert len(seen) < 1000
@@ -0,0 +1,22 @@
+import pytest
+
+from email_behavior_detection.config import load_config, normalize_config
+
+
+def test_missing_and_empty_sections_are_filled():
+    expected = {"team": {"domains": [], "addresses": []}, "rules": {}, "settings": {}}
+    assert normalize_config(None) == expected
+    assert normalize_config({"team": None, "rules": None}) == expected
+    cfg = normalize_config({"team": {"domains": ["x.com"]}})
+    assert cfg["team"] == {"domains": ["x.com"], "addresses": []}
+
+
+def test_non_mapping_is_rejected():
+    with pytest.raises(ValueError):
+        normalize_config(["team"])
+
+
+def test_load_config_normalizes(tmp_path):
+    path = tmp_path / "cfg.yaml"
+    path.write_text("team:\n", encoding="utf-8")
+    assert load_config(str(path))["team"] == {"domains": [], "addresses": []}
@@ -0,0 +1,84 @@
+from email_behavior_detection.conversations import base_subject, thread_indices, thread_key, thread_messages
+from email_behavior_detection.models import Message
+
+
+def _msg(n, subject, message_id=None, in_reply_to=None, references=None, day=None):
+    meta = {"subject": subject}
+    if message_id:
+        meta["message_id"] = message_id
+    if in_reply_to:
+        meta["in_reply_to"] = in_reply_to
+    if references:
+        meta["references"] = references
+    timestamp = f"2024-01-{day or n + 1:02d}T10:00:00+00:00"
+    return Message(timestamp, f"P{n}", f"p{n}@x.com", [], [], f"body {n}", meta)
+
+
+def _shape(threads):
+    return [(t.subject, [m.from_name for m in t.messages]) for t in threads]
+
+
+def test_references_chain():
+    msgs = [
+        _msg(0, "Plan", "<a@x>"),
+        _msg(1, "Other", "<o@x>"),
+        _msg(2, "Re: Plan", "<b@x>", "<a@x>", "<a@x>"),
+        # References only, no In-Reply-To
+        _msg(3, "Re: Plan", "<c@x>", None, "<a@x> <b@x>"),
+        _msg(4, "Re: Other", "<p@x>", "<o@x>"),
+    ]
+    assert _shape(thread_messages(msgs)) == [("Plan", ["P0", "P2", "P3"]), ("Other", ["P1", "P4"])]
+
+
+def test_messages_sorted_by_date_within_a_thread():
+    msgs = [_msg(0, "Re: Plan", "<b@x>", "<a@x>", day=5), _msg(1, "Plan", "<a@x>", day=2)]
+    assert _shape(thread_messages(msgs)) == [("Plan", ["P1", "P0"])]
+
+
+def test_reply_to_missing_parent_joins_its_siblings():
+    # <a@x> was never seen: both replies hang under the same empty container
+    msgs = [
+        _msg(0, "Re: Plan", "<b@x>", "<a@x>"),
+        _msg(1, "Unrelated", "<u@x>"),
+        _msg(2, "Re: Plan", "<c@x>", "<a@x>", "<a@x>"),
+    ]
+    assert _shape(thread_messages(msgs)) == [("Plan", ["P0", "P2"]), ("Unrelated", ["P1"])]
+
+
+def test_duplicate_message_ids_keep_both_messages():
+    msgs = [_msg(0, "Plan", "<a@x>"), _msg(1, "Plan", "<a@x>"), _msg(2, "Re: Plan", "<b@x>", "<a@x>")]
+    threads = thread_messages(msgs)
+    assert sorted(m.from_name for t in threads for m in t.messages) == ["P0", "P1", "P2"]
+    # The reply threads under the first message with that id
+    assert ("Plan", ["P0", "P2"]) in _shape(threads)
+
+
+def test_reference_loop_terminates():
+    msgs = [
+        _msg(0, "Loop", "<a@x>", "<b@x>", "<b@x>"),
+        _msg(1, "Re: Loop", "<b@x>", "<a@x>", "<a@x>"),
+        _msg(2, "Self", "<s@x>", "<s@x>", "<s@x>"),
+    ]
+    groups = thread_indices([thread_key(m) for m in msgs])
+    assert sorted(i for g in groups for i in g) == [0, 1, 2]
+    assert [0, 1] in groups and [2] in groups
+
+
+def test_orphan_replies_merge_by_subject_only_without_headers():
+    msgs = [
+        _msg(0, "Plan", "<a@x>"),
+        # A "Re:" with no threading headers joins the thread with the same base subject
+        _msg(1, "RE: Fwd: plan ", "<b@x>"),
+        # Not a reply: stays on its own despite the subject
+        _msg(2, "Plan", "<c@x>"),
+        # A reply whose parent is unknown keeps its own thread
+        _msg(3, "Re: Plan", "<d@x>", "<zz@x>"),
+    ]
+    assert _shape(thread_messages(msgs)) == [("Plan", ["P0", "P1"]), ("Plan", ["P2"]), ("Plan", ["P3"])]
+    assert base_subject("RE: Fwd: plan ") == base_subject("Plan") == "plan"
+
+
+def test_messages_without_ids_stay_separate():
+    msgs = [_msg(0, "A"), _msg(1, "B")]
+    assert _shape(thread_messages(msgs)) == [("A", ["P0"]), ("B", ["P1"])]
+    assert thread_indices([]) == []
@@ -0,0 +1,69 @@
+from email_behavior_detection.detection_cache import DetectionCache
+
+ENTRY = (("meeting_request", 0.9, "schedule"),)
+
+
+def _rows(path):
+    import sqlite3
+
+    with sqlite3.connect(path) as db:
+        return db.execute("SELECT COUNT(*) FROM detections").fetchone()[0]
+
+
+def test_puts_are_written_in_batches(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    cache = DetectionCache(path=path, flush_every=3)
+    cache.bind("v1")
+    cache.put("a", ENTRY)
+    cache.put("b", ENTRY)
+    assert _rows(path) == 0
+    # Buffered entries are still served
+    cache._memory.clear()
+    assert cache.get("a") == ENTRY
+    cache.put("c", ENTRY)
+    assert _rows(path) == 3
+    cache.put("d", ENTRY)
+    cache.close()
+    assert _rows(path) == 4
+
+
+def test_entries_survive_reopen(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    cache = DetectionCache(path=path)
+    cache.bind("v1")
+    cache.put("a", ENTRY)
+    cache.close()
+
+    cache = DetectionCache(path=path)
+    cache.bind("v1")
+    assert cache.get("a") == ENTRY
+    assert cache.stats()["disk_hits"] == 1
+    cache.close()
+
+
+def test_version_change_drops_buffered_and_stored_entries(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    cache = DetectionCache(path=path, flush_every=2)
+    cache.bind("v1")
+    cache.put("a", ENTRY)
+    cache.put("b", ENTRY)
+    cache.put("c", ENTRY)
+    cache.bind("v2")
+    cache.close()
+    assert _rows(path) == 0
+
+
+def test_table_is_capped_to_newest_entries(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    cache = DetectionCache(path=path, flush_every=5, max_disk_entries=10)
+    cache.bind("v1")
+    for i in range(30):
+        cache.put(f"k{i}", ENTRY)
+    cache.close()
+    assert _rows(path) <= 11
+
+    cache = DetectionCache(path=path, max_entries=1)
+    cache.bind("v1")
+    assert cache.get("k29") == ENTRY
+    assert cache.get("k0") is None
+    cache.close()
@@ -0,0 +1,102 @@
+import json
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+pytest.importorskip("google.oauth2.credentials")
+pytest.importorskip("google_auth_oauthlib")
+
+from email_behavior_detection import gmail_oauth  # noqa: E402
+
+
+class _Response:
+    def __init__(self, data):
+        self.status = 200
+        self.headers = {}
+        self.data = json.dumps(data).encode("utf-8")
+
+
+class StubTransport:
+    # Stands in for google.auth.transport.requests.Request: every call is a token
+    # refresh answered with a new access token
+    def __init__(self):
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, url, method="GET", body=None, headers=None, timeout=None, **kwargs):
+        with self._lock:
+            self.calls += 1
+            n = self.calls
+        return _Response({"access_token": f"tok-{n}", "expires_in": 3600})
+
+
+def _token_file(path, seconds, refresh_token="r"):
+    expiry = (datetime.now(timezone.utc) + timedelta(seconds=seconds)).replace(tzinfo=None)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({
+            "token": "old", "refresh_token": refresh_token, "client_id": "c", "client_secret": "s",
+            "token_uri": "https://oauth2.googleapis.com/token", "scopes": gmail_oauth.SCOPES,
+            "expiry": expiry.isoformat() + "Z",
+        }, f)
+    return str(path)
+
+
+def test_concurrent_callers_refresh_once(tmp_path):
+    path = _token_file(tmp_path / "a.json", -10)
+    transport = StubTransport()
+    cache = gmail_oauth.TokenCache(request_factory=lambda: transport, background=False)
+    tokens = []
+    threads = [threading.Thread(target=lambda: tokens.append(cache.token(path))) for _ in range(16)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert set(tokens) == {"tok-1"} and transport.calls == 1
+    with open(path, encoding="utf-8") as f:
+        assert json.load(f)["token"] == "tok-1"
+    assert os.listdir(tmp_path) == ["a.json"]
+
+
+def test_refresh_ahead(tmp_path):
+    path = _token_file(tmp_path / "a.json", 250)
+    transport = StubTransport()
+    cache = gmail_oauth.TokenCache(refresh_ahead=300, request_factory=lambda: transport, background=False)
+    # Still valid: served without a refresh
+    assert cache.token(path) == "old" and transport.calls == 0
+    cache.refresh_due()
+    assert transport.calls == 1
+    assert cache.token(path) == "tok-1"
+    assert cache.status()[path]["seconds_left"] > 300
+    # Nothing due now
+    cache.refresh_due()
+    assert transport.calls == 1
+
+
+def test_consent_flow_runs_without_locks(tmp_path, monkeypatch):
+    path = _token_file(tmp_path / "a.json", -10, refresh_token=None)
+    cache = gmail_oauth.TokenCache(request_factory=StubTransport, background=False)
+    fresh = gmail_oauth.Credentials(
+        "new", refresh_token="r", client_id="c", client_secret="s",
+        token_uri="https://oauth2.googleapis.com/token",
+    )
+
+    class Flow:
+        def run_local_server(self, port):
+            acct = cache._accounts[os.path.realpath(path)]
+            assert not acct.lock.locked()
+            assert not os.path.exists(f"{os.path.realpath(path)}.lock")
+            return fresh
+
+    monkeypatch.setattr(gmail_oauth.InstalledAppFlow, "from_client_secrets_file", lambda *a, **k: Flow())
+    assert cache.token(path, client_secrets_file="secrets.json") == "new"
+    with open(path, encoding="utf-8") as f:
+        assert json.load(f)["token"] == "new"
+
+
+def test_missing_refresh_token_without_secrets(tmp_path):
+    path = _token_file(tmp_path / "a.json", -10, refresh_token=None)
+    cache = gmail_oauth.TokenCache(request_factory=StubTransport, background=False)
+    with pytest.raises(ValueError):
+        cache.token(path)
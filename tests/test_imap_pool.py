@@ -0,0 +1,84 @@
+import imaplib
+
+import pytest
+
+from email_behavior_detection.imap_pool import ImapPool
+
+
+class FakeIMAP:
+    opened = []
+    fail_select = False
+
+    def __init__(self, host, port):
+        self.logged_out = False
+        FakeIMAP.opened.append(self)
+
+    def login(self, username, password):
+        return "OK", [b""]
+
+    def authenticate(self, mech, cb):
+        return "OK", [b""]
+
+    def select(self, mailbox):
+        if self.fail_select:
+            raise imaplib.IMAP4.error("SELECT failed")
+        return "OK", [b"1"]
+
+    def noop(self):
+        return "OK", [b""]
+
+    def logout(self):
+        self.logged_out = True
+        return "BYE", [b""]
+
+
+@pytest.fixture
+def pool():
+    FakeIMAP.opened = []
+    FakeIMAP.fail_select = False
+    p = ImapPool(factory=FakeIMAP)
+    yield p
+    p.close()
+
+
+def test_clean_exit_reuses_session(pool):
+    with pool.session("h", 993, "u", "pw") as a:
+        pass
+    with pool.session("h", 993, "u", "pw") as b:
+        pass
+    assert a is b and len(FakeIMAP.opened) == 1
+
+
+def test_error_inside_block_discards_session(pool):
+    with pytest.raises(imaplib.IMAP4.error):
+        with pool.session("h", 993, "u", "pw") as imap:
+            raise imaplib.IMAP4.error("FETCH failed mid-command")
+    assert imap.logged_out
+    with pool.session("h", 993, "u", "pw") as again:
+        pass
+    assert again is not imap
+
+
+def test_failed_select_discards_session(pool):
+    FakeIMAP.fail_select = True
+    with pytest.raises(imaplib.IMAP4.error):
+        with pool.session("h", 993, "u", "pw", mailbox="Archive"):
+            pass
+    assert FakeIMAP.opened[-1].logged_out
+    assert not any(pool._idle.values())
+
+
+def test_new_credential_evicts_old_sessions(pool):
+    with pool.session("h", 993, "u", "oauth2:old") as old:
+        pass
+    with pool.session("h", 993, "u", "oauth2:new") as new:
+        pass
+    assert old.logged_out and not new.logged_out
+    assert sum(len(v) for v in pool._idle.values()) == 1
+
+
+def test_session_checked_in_after_rotation_is_closed(pool):
+    with pool.session("h", 993, "u", "oauth2:old") as old:
+        with pool.session("h", 993, "u", "oauth2:new"):
+            pass
+    assert old.logged_out
@@ -0,0 +1,189 @@
+import pytest
+
+from email_behavior_detection import ingest_imap
+from email_behavior_detection.models import Message
+
+# BODYSTRUCTURE of a message whose only leaf is an image
+_IMAGE_ONLY = [b"image", b"png", [b"name", b"a.png"], None, None, b"base64", b"10", None]
+_PLAIN = [b"text", b"plain", [b"charset", b"utf-8"], None, None, b"7bit", b"5", b"1"]
+_RAW = b"Subject: hi\r\nContent-Type: text/plain\r\n\r\nfull source body\r\n"
+
+
+def _fake_fetch(answers):
+    calls = []
+
+    def fetch(imap, uids, items, chunk_size):
+        calls.append((items, sorted(uids)))
+        for uid in uids:
+            attrs = answers(uid, items)
+            if attrs is not None:
+                yield {"UID": uid, **attrs}
+
+    return fetch, calls
+
+
+def test_message_without_text_leaf_falls_back_to_full_source(monkeypatch):
+    def answers(uid, items):
+        if items == "(UID BODYSTRUCTURE)":
+            return {"BODYSTRUCTURE": _PLAIN if uid == b"1" else _IMAGE_ONLY}
+        if items == "(UID BODY.PEEK[1])":
+            return {"BODY[1]": b"hello"}
+        return {"BODY[]": _RAW}
+
+    fetch, calls = _fake_fetch(answers)
+    monkeypatch.setattr(ingest_imap, "_uid_fetch", fetch)
+    by_uid = {b"1": Message("", "", "a@x.com", [], [], ""), b"2": Message("", "", "b@x.com", [], [], "")}
+    ingest_imap._fetch_bodies(None, by_uid, 10)
+    assert by_uid[b"1"].body == "hello"
+    assert by_uid[b"2"].body == "full source body"
+    assert ("(UID BODY.PEEK[])", [b"2"]) in calls
+
+
+def test_unreturned_messages_are_flagged(monkeypatch):
+    def answers(uid, items):
+        if items == "(UID BODYSTRUCTURE)":
+            return {"BODYSTRUCTURE": _PLAIN}
+        return None
+
+    fetch, _ = _fake_fetch(answers)
+    monkeypatch.setattr(ingest_imap, "_uid_fetch", fetch)
+    by_uid = {b"1": Message("", "", "a@x.com", [], [], "")}
+    ingest_imap._fetch_bodies(None, by_uid, 10)
+    assert by_uid[b"1"].body == ""
+    assert by_uid[b"1"].meta["body_unavailable"] == "1"
+
+
+def _legacy_html_to_text(html):
+    # The three-regex stripper the single-pass scanner replaced, kept as the reference
+    import re
+    from html import unescape
+
+    if not html:
+        return ""
+    text = re.sub(r"<style[\s\S]*?</style>", " ", html, flags=re.I)
+    text = re.sub(r"<script[\s\S]*?</script>", " ", text, flags=re.I)
+    text = re.sub(r"<[^>]+>", " ", text)
+    return ingest_imap._clean_text(unescape(text))
+
+
+def test_html_to_text_matches_legacy_on_plain_markup():
+    import random
+
+    rng = random.Random(0)
+    pieces = [
+        "<p>", "</p>", "<br/>", "<br>", "<div class='x'>", "</div>", "<b>", "</b>", '<a href="mailto:a@b.com">',
+        "</a>", "<STYLE>p { color: red }</STYLE>", "<script type='x'>var a = 1 < 2;</script>", "Hello", "world",
+        "&amp;", "&lt;3", "caf&eacute;", "  ", "\n", "price?", "<td>", "</td>", "<Span style='x'>", "</SPAN>",
+    ]
+    for _ in range(3000):
+        html = "".join(rng.choice(pieces) for _ in range(rng.randint(0, 12)))
+        assert ingest_imap._html_to_text(html) == _legacy_html_to_text(html), html
+
+
+def test_html_to_text_drops_quoted_replies():
+    html = (
+        "<html><head><title>t</title></head><body><div>Sounds good</div>"
+        '<div class="gmail_quote">On Mon, Bob wrote:<blockquote>price?</blockquote></div>'
+        "<blockquote><blockquote>nested</blockquote> still quoted</blockquote>after</body></html>"
+    )
+    assert ingest_imap._html_to_text(html) == "Sounds good after"
+
+
+def test_limit_bounds_headers_fetched_from_search_all(monkeypatch):
+    from datetime import datetime, timezone
+
+    all_ids = [str(i).encode() for i in range(1, 1001)]
+
+    def uid(imap, command, *args):
+        if args[-2:] == ("SUBJECT", '"Plan"'):
+            return "OK", [b""]
+        return "OK", [b" ".join(all_ids)]
+
+    fetched = []
+
+    def fetch_headers(imap, uids, chunk_size):
+        fetched.extend(uids)
+        for u in uids:
+            n = int(u)
+            sub = "Re: Plan" if n % 10 == 0 else "other"
+            msg = Message("", "", "a@x.com", [], [], "", {"subject": sub})
+            yield u, datetime.fromtimestamp(n, timezone.utc), sub, msg
+
+    monkeypatch.setattr(ingest_imap, "_uid", uid)
+    monkeypatch.setattr(ingest_imap, "_fetch_headers", fetch_headers)
+    monkeypatch.setattr(ingest_imap, "_fetch_bodies", lambda imap, by_uid, chunk_size: None)
+
+    thread = ingest_imap._fetch_thread(None, "Plan", 15, 100)
+    assert len(thread.messages) == 15
+    # Newest 200 UIDs hold the 20 newest matches; nothing older was fetched
+    assert sorted(int(u) for u in fetched) == list(range(801, 1001))
+    assert thread.messages[-1].meta["subject"] == "Re: Plan"
+
+    fetched.clear()
+    thread = ingest_imap._fetch_thread(None, "Plan", None, 100)
+    assert len(thread.messages) == 100 and len(fetched) == 1000
+    assert thread.subject == "Plan"
+
+
+@pytest.mark.parametrize("html, expected", [
+    # Unclosed <head>, and a <title> that is never closed inside it
+    ("<html><head><meta charset='utf-8'><body><p>Please proceed</p></body></html>", "Please proceed"),
+    ("<html><head><title>Offer<body>Please proceed", "Please proceed"),
+    # Self-closing skip tags skip nothing
+    ("<title/>Please proceed<blockquote/> today", "Please proceed today"),
+    ("<HEAD/><p>Please proceed</p>", "Please proceed"),
+    # A quote container left open still drops the quoted tail
+    ("Sounds good<blockquote>On Mon you wrote: price?", "Sounds good"),
+])
+def test_html_to_text_survives_unclosed_and_self_closing_skip_tags(html, expected):
+    assert ingest_imap._html_to_text(html) == expected
+
+
+def test_parse_fetch_rebuilds_literals_and_nested_lists():
+    header = b"Subject: hi\r\nFrom: a@x.com\r\n\r\n"
+    data = [
+        (b"1 (UID 5 BODY[HEADER.FIELDS (SUBJECT FROM)] {%d}" % len(header), header),
+        b")",
+        b'2 (UID 7 FLAGS (\\Seen) BODYSTRUCTURE ("text" "plain" ("charset" "utf-8") NIL NIL "7bit" 5 1))',
+        (b"3 (UID 9 BODY[1] {6}", b"a (b)\""),
+        b' INTERNALDATE "say \\"hi\\"")',
+    ]
+    assert list(ingest_imap._parse_fetch(data)) == [
+        {"UID": b"5", "BODY[HEADER.FIELDS (SUBJECT FROM)]": header},
+        {"UID": b"7", "FLAGS": [b"\\Seen"], "BODYSTRUCTURE": _PLAIN[:3] + [None, None, b"7bit", b"5", b"1"]},
+        {"UID": b"9", "BODY[1]": b"a (b)\"", "INTERNALDATE": b'say "hi"'},
+    ]
+
+
+def test_parse_fetch_ignores_untagged_noise():
+    assert list(ingest_imap._parse_fetch([None, b"", b"4 EXISTS"])) == []
+
+
+@pytest.mark.parametrize("uids, expected", [
+    ([], ""),
+    ([b"7"], "7"),
+    ([b"4", b"1", b"2", b"3", b"9", b"12", b"13", b"2"], "1:4,9,12:13"),
+    ([b"10", b"9", b"11", b"1"], "1,9:11"),
+])
+def test_uid_set_compresses_runs(uids, expected):
+    assert ingest_imap._uid_set(uids) == expected
+
+
+def test_uid_fetch_sends_one_command_per_chunk():
+    class FakeImap:
+        def __init__(self):
+            self.sets = []
+
+        def uid(self, command, uid_set, items):
+            self.sets.append(uid_set)
+            uids = []
+            for part in uid_set.split(","):
+                lo, _, hi = part.partition(":")
+                uids.extend(range(int(lo), int(hi or lo) + 1))
+            return "OK", [b"%d (UID %d)" % (n, u) for n, u in enumerate(uids, 1)]
+
+    imap = FakeImap()
+    uids = [b"1", b"2", b"3", b"7", b"8"]
+    got = [a["UID"] for a in ingest_imap._uid_fetch(imap, uids, "(UID)", 3)]
+    assert imap.sets == ["1:3", "7:8"]
+    assert got == uids
@@ -0,0 +1,86 @@
+import random
+import re
+
+import pytest
+
+from email_behavior_detection.intents import DetectedIntent, IntentDetector
+from email_behavior_detection.models import Message
+
+TEAM = (["yourcompany.com"], ["reply-team@yourcompany.com"])
+
+
+def _legacy_detect(msg, team_domains, team_addresses):
+    # The regex-per-rule detector the keyword scanner replaced, kept as the reference
+    text = f"{msg.from_name}\n{msg.body}".lower()
+    intents = []
+
+    def add(name, conf, ev):
+        intents.append(DetectedIntent(name=name, confidence=conf, evidence=ev))
+
+    if re.search(r"out of office|ooo|auto[- ]?reply|vacation responder", text):
+        add("auto_reply_ooo", 0.95, "OOO/auto-reply patterns")
+    if re.search(r"write to|contact|reach (out )?to", text) and re.search(r"@", text):
+        add("redirect", 0.7, "Mentions contacting another email")
+    if re.search(r"interested|sounds good|please proceed|go ahead", text):
+        add("interest", 0.7, "Interest keywords")
+    if re.search(r"price|pricing|rate|cost", text):
+        add("ask_pricing", 0.65, "Price keywords")
+    if re.search(r"breakfast|wi[- ]?fi|late checkout|late check[- ]?out", text):
+        add("ask_inclusions", 0.6, "Inclusion keywords")
+    if re.search(r"adding|cc'ing|ccing|looping|include|add (.+?) from our team", text):
+        add("add_teammate", 0.6, "Add teammate phrasing")
+    if re.search(r"billing|invoice|bill to|payment details", text) and re.search(r"confirm|provide|name|email", text):
+        add("ask_billing_info", 0.75, "Billing info request")
+    if re.search(r"please proceed|we aim to confirm|confirm by|let's move forward|go ahead", text):
+        add("proceed", 0.7, "Proceed phrasing")
+    if re.search(r"pause reminders|stop reminders|hold off|we'll reply", text):
+        add("pause_reminders", 0.8, "Pause reminders phrasing")
+    if re.search(r"not interested|no thanks|pass for now", text):
+        add("not_interested", 0.9, "Not interested phrasing")
+    if re.search(r"\?", msg.body):
+        add("question", 0.4, "Contains question mark")
+    from_domain = msg.from_email.split("@")[-1].lower() if "@" in msg.from_email else ""
+    if msg.from_email.lower() in team_addresses or from_domain in team_domains:
+        add("from_internal_team", 1.0, "Sender is internal")
+    return intents
+
+
+_FRAGMENTS = [
+    "out of office", "ooo", "auto-reply", "auto reply", "autoreply", "vacation responder", "write to", "contact",
+    "reach out to", "reach to", "reach  to", "@", "interested", "not interested", "sounds good", "please proceed",
+    "go ahead", "price", "pricing", "rate", "cost", "breakfast", "wi-fi", "wi fi", "wifi", "wi_fi", "late checkout",
+    "late check-out", "late check out", "adding", "add bob from our team", "add\nx from our team", "cc'ing", "ccing",
+    "looping", "include", "billing", "invoice", "bill to", "payment details", "confirm", "provide", "name", "email",
+    "we aim to confirm", "confirm by", "let's move forward", "pause reminders", "stop reminders", "hold off",
+    "we'll reply", "no thanks", "pass for now", "?", "HELLO", "Wi-Fi", "NOT INTERESTED", "x", " ", "\n", "Ä", "İ",
+]
+_SENDERS = ["a@yourcompany.com", "reply-team@yourcompany.com", "Reply-Team@YourCompany.com", "x@other.com", "bad", ""]
+
+
+def _random_messages(n, seed=0):
+    rng = random.Random(seed)
+    for _ in range(n):
+        body = "".join(rng.choice(_FRAGMENTS) + rng.choice(["", " "]) for _ in range(rng.randint(0, 8)))
+        name = "".join(rng.choice(_FRAGMENTS) for _ in range(rng.randint(0, 2)))
+        yield Message("", name, rng.choice(_SENDERS), [], [], body)
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_scanner_matches_legacy_regexes(seed):
+    detector = IntentDetector({}, *TEAM, strip_quoted=False)
+    messages = list(_random_messages(2000, seed))
+    for msg in messages:
+        assert detector.detect(msg) == _legacy_detect(msg, *TEAM), (msg.from_name, msg.body)
+    matrix = detector.detect_batch(messages)
+    for i, msg in enumerate(messages):
+        assert sorted(matrix.row(i)) == sorted(it.name for it in _legacy_detect(msg, *TEAM))
+
+
+def test_example_thread_matches_legacy(thread_json):
+    import json
+
+    from email_behavior_detection.pipeline import thread_from_dict
+
+    detector = IntentDetector({}, *TEAM, strip_quoted=False)
+    for msg in thread_from_dict(json.loads(thread_json)).messages:
+        assert detector.detect(msg) == _legacy_detect(msg, *TEAM)
@@ -0,0 +1,92 @@
+from datetime import datetime, timezone
+
+from email_behavior_detection import ingest_imap
+from email_behavior_detection.mail_cache import MailboxCache
+from email_behavior_detection.models import Message
+
+
+def _msg(subject):
+    return Message("", "Ann", "ann@x.com", [], [], "", meta={"subject": subject})
+
+
+def test_find_subject_filters_in_sql(tmp_path):
+    cache = MailboxCache(str(tmp_path / "mail.sqlite"))
+    cache.begin_sync("acct", "INBOX", 1)
+    subjects = {1: "Quote for Group Stay", 2: "Re: quote for group stay", 3: "Invoice", 4: "ÉTÉ booking"}
+    dt = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    cache.add_headers("acct", "INBOX", [(uid, dt, sub, _msg(sub)) for uid, sub in subjects.items()], 4)
+    cache.set_bodies("acct", "INBOX", {1: "body one", 3: "body three"})
+
+    found = cache.find_subject("acct", "INBOX", "GROUP stay")
+    assert sorted(uid for uid, *_ in found) == [1, 2]
+    by_uid = {uid: (msg, has_body) for uid, _, _, msg, has_body in found}
+    assert by_uid[1][1] is True and by_uid[1][0].body == "body one"
+    assert by_uid[2][1] is False
+
+    assert [uid for uid, *_ in cache.find_subject("acct", "INBOX", "été")] == [4]
+    assert [uid for uid, *_ in cache.find_subject("acct", "INBOX", "100%")] == []
+    assert len(cache.find_subject("acct", "INBOX", "")) == 4
+    cache.close()
+
+
+class _Server:
+    # Stand-in for one IMAP mailbox: its UIDVALIDITY and the UIDs it currently holds
+    def __init__(self, uidvalidity, uids):
+        self.uidvalidity = uidvalidity
+        self.uids = uids
+        self.header_fetches = []
+
+
+def _serve(monkeypatch, server):
+    def uid(imap, command, *args):
+        assert (command, args) == ("SEARCH", (None, "ALL"))
+        return "OK", [b" ".join(str(u).encode() for u in server.uids)]
+
+    def fetch_headers(imap, uids, chunk_size):
+        server.header_fetches.append(sorted(int(u) for u in uids))
+        for u in uids:
+            yield u, None, f"subject {int(u)}", _msg(f"subject {int(u)}")
+
+    monkeypatch.setattr(ingest_imap, "_uidvalidity", lambda imap, mailbox: server.uidvalidity)
+    monkeypatch.setattr(ingest_imap, "_uid", uid)
+    monkeypatch.setattr(ingest_imap, "_fetch_headers", fetch_headers)
+
+
+def _sync(cache):
+    assert ingest_imap._sync_cache(None, cache, "acct", "INBOX", 10)
+    return sorted(uid for uid, *_ in cache.find_subject("acct", "INBOX", ""))
+
+
+def test_sync_drops_expunged_uids(tmp_path, monkeypatch):
+    cache = MailboxCache(str(tmp_path / "mail.sqlite"))
+    server = _Server(1, [1, 2, 3, 4])
+    _serve(monkeypatch, server)
+    assert _sync(cache) == [1, 2, 3, 4]
+    cache.set_bodies("acct", "INBOX", {2: "two", 3: "three"})
+
+    server.uids = [1, 3, 5]
+    assert _sync(cache) == [1, 3, 5]
+    assert server.header_fetches == [[1, 2, 3, 4], [5]]
+    found = {uid: has_body for uid, *_, has_body in cache.find_subject("acct", "INBOX", "")}
+    assert found == {1: False, 3: True, 5: False}
+
+    # Everything expunged
+    server.uids = []
+    assert _sync(cache) == []
+    assert cache.total_bytes() == 0
+    cache.close()
+
+
+def test_sync_refetches_everything_after_uidvalidity_reset(tmp_path, monkeypatch):
+    cache = MailboxCache(str(tmp_path / "mail.sqlite"))
+    server = _Server(1, [1, 2, 3])
+    _serve(monkeypatch, server)
+    assert _sync(cache) == [1, 2, 3]
+    cache.set_bodies("acct", "INBOX", {1: "old body"})
+
+    # Renumbered mailbox: same UIDs now name different messages
+    server.uidvalidity, server.uids = 2, [1, 2]
+    assert _sync(cache) == [1, 2]
+    assert server.header_fetches == [[1, 2, 3], [1, 2]]
+    assert all(not has_body for *_, has_body in cache.find_subject("acct", "INBOX", ""))
+    cache.close()
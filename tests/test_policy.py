@@ -0,0 +1,21 @@
+from email_behavior_detection.intents import DetectedIntent
+from email_behavior_detection.policy import Policy, choose_next_action
+
+
+def test_decisions_are_independent_copies():
+    intents = [DetectedIntent("ask_pricing", 0.9, "price")]
+    first = choose_next_action(intents)
+    first["note"] = "changed"
+    first["template"] = "other"
+    assert choose_next_action(intents) == {"action": "send_price_list", "template": "send_pricing"}
+
+    default = choose_next_action([])
+    default.clear()
+    assert choose_next_action([]) == {"action": "acknowledge_and_offer_help", "template": "ack_general"}
+
+
+def test_priority_and_thresholds():
+    intents = [DetectedIntent("interest", 0.9, "x"), DetectedIntent("proceed", 0.4, "y")]
+    assert choose_next_action(intents)["action"] == "send_agreement_and_form"
+    policy = Policy(thresholds={"proceed": 0.5})
+    assert choose_next_action(intents, policy)["action"] == "send_materials_and_questions"
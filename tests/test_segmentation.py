@@ -0,0 +1,36 @@
+import pytest
+
+from email_behavior_detection.intents import IntentDetector
+from email_behavior_detection.models import Message
+from email_behavior_detection.segmentation import new_text, split_reply
+
+
+@pytest.mark.parametrize("body, expected", [
+    ("Sounds good, please proceed.\n\nOn Mon, Bob wrote:\n> What is the price?", "Sounds good, please proceed."),
+    ("Thanks!\n\nOn Mon, Jan 1, 2024 at 10:00 AM Bob <bob@x.com>\nwrote:\n> old", "Thanks!"),
+    ("Danke.\n\nAm 01.01.2024 um 10:00 schrieb Bob <bob@x.com>:\n> alt", "Danke."),
+    ("Merci.\n\nLe lun. 1 janv. 2024, Bob a écrit :\n> ancien", "Merci."),
+    ("See below.\n\nFrom: Bob\nSent: Monday\nTo: Ann\nSubject: Rates\n\nold text", "See below."),
+    ("Booked.\n-- \nAnn Smith\nSales", "Booked."),
+    ("Inline reply\n> quoted question?\nmore new text", "Inline reply\nmore new text"),
+])
+def test_split_reply_keeps_new_text(body, expected):
+    assert split_reply(body) == expected
+
+
+@pytest.mark.parametrize("body", [
+    "On Mon, Bob wrote:\n> Please share the pricing?\n> Not interested",
+    "> Please share the pricing?\n> Not interested",
+    "---------- Forwarded message ----------\nFrom: Bob\nPlease share the pricing?",
+    "",
+])
+def test_split_reply_is_empty_without_new_text(body):
+    assert split_reply(body) == ""
+
+
+def test_quoted_intents_do_not_fire_again():
+    detector = IntentDetector(rules={}, team_domains=[], team_addresses=[])
+    msg = Message("", "Ann", "ann@x.com", [], [], "On Mon, Bob wrote:\n> Please share the pricing?\n> Not interested")
+    assert new_text(msg) == ""
+    assert detector.detect(msg) == []
+    assert detector.detect_batch([msg]).row(0) == []
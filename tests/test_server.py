@@ -0,0 +1,95 @@
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+
+import pytest
+
+from email_behavior_detection.server import ClassificationService, make_server
+
+CONFIG = "configs/default_config.yaml"
+TEMPLATES = "templates/default_templates.yaml"
+
+
+@pytest.fixture
+def service():
+    return ClassificationService(CONFIG, TEMPLATES, reload_interval=0)
+
+
+@pytest.fixture
+def post(service):
+    server = make_server(service, port=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+
+    def post(path, payload):
+        data = payload if isinstance(payload, bytes) else json.dumps(payload).encode("utf-8")
+        req = urllib.request.Request(base + path, data=data, method="POST")
+        try:
+            with urllib.request.urlopen(req, timeout=5) as r:
+                return r.status, json.loads(r.read())
+        except urllib.error.HTTPError as e:
+            return e.code, json.loads(e.read())
+
+    post.port = server.server_address[1]
+    yield post
+    server.shutdown()
+    server.server_close()
+
+
+def _latency(service, endpoint, count):
+    # Recorded after the response is written, so wait for the handler to get there
+    deadline = time.monotonic() + 5
+    while True:
+        stats = service.stats()["latency"][endpoint]
+        if stats["count"] >= count or time.monotonic() > deadline:
+            return stats
+        time.sleep(0.01)
+
+
+def test_classify(post, thread_json):
+    status, body = post("/classify", thread_json.encode("utf-8"))
+    assert status == 200 and "decision" in body
+
+
+def test_malformed_thread(post, service):
+    status, body = post("/classify", {"messages": None})
+    assert status == 422 and "error" in body
+    status, body = post("/classify", b"{not json")
+    assert status == 400 and "error" in body
+    assert _latency(service, "classify", 2)["errors"] == 2
+
+
+def test_malformed_batch_items(post, service, thread_json):
+    good = json.loads(thread_json)
+    status, body = post("/classify_batch", [good, {"messages": None}, {"messages": [None]}, 5])
+    assert status == 200
+    results = body["results"]
+    assert "decision" in results[0]
+    assert all(set(r) == {"error"} for r in results[1:])
+    stats = _latency(service, "classify_batch", 1)
+    assert stats["count"] == 1 and stats["errors"] == 0
+
+
+def test_unexpected_error_is_500(post, service, monkeypatch):
+    def boom(thread):
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(service, "classify", boom)
+    status, body = post("/classify", {"messages": []})
+    assert status == 500 and "error" in body
+    stats = _latency(service, "classify", 1)
+    assert stats["count"] == 1 and stats["errors"] == 1
+
+
+@pytest.mark.parametrize("length", [b"-1", b"abc"])
+def test_invalid_content_length_is_rejected_without_reading(post, service, length):
+    import socket
+
+    port = post.port
+    with socket.create_connection(("127.0.0.1", port), timeout=5) as sock:
+        sock.sendall(b"POST /classify HTTP/1.1\r\nHost: x\r\nContent-Length: " + length + b"\r\n\r\n{}")
+        response = sock.recv(65536)
+    assert response.startswith(b"HTTP/1.1 400")
+    assert _latency(service, "classify", 1)["errors"] == 1
@@ -0,0 +1,28 @@
+import pytest
+
+from email_behavior_detection.intents import IntentDetector
+from email_behavior_detection.models import TeamIndex
+from email_behavior_detection.pipeline import build_detector
+
+
+def test_subdomains_are_opt_in():
+    assert "a@eu.yourcompany.com" not in TeamIndex(["yourcompany.com"])
+    assert "a@yourcompany.com" in TeamIndex(["yourcompany.com"])
+    assert "a@eu.yourcompany.com" in TeamIndex(["yourcompany.com"], include_subdomains=True)
+    assert "a@notyourcompany.com" not in TeamIndex(["yourcompany.com"], include_subdomains=True)
+
+
+def test_from_config_reads_include_subdomains():
+    cfg = {"team": {"domains": ["yourcompany.com"]}}
+    assert not TeamIndex.from_config(cfg).include_subdomains
+    cfg["team"]["include_subdomains"] = True
+    assert "a@eu.yourcompany.com" in build_detector(cfg).team
+
+
+def test_team_and_lists_are_exclusive():
+    team = TeamIndex(["yourcompany.com"])
+    with pytest.raises(ValueError):
+        IntentDetector({}, ["other.com"], [], team=team)
+    detector = IntentDetector({}, team=team)
+    assert detector.team is team
+    assert detector.team_domains == ["yourcompany.com"]
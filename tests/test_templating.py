@@ -0,0 +1,69 @@
+import random
+
+import pytest
+
+from email_behavior_detection.templating import CompiledTemplate, compile_templates, render_template
+
+CONTEXTS = [
+    {},
+    {"name": "Ana", "subject": "Plan", "n": 3, "price": 12.5},
+    {"name": "{x}", "subject": "", "n": -1, "price": 0, "extra": "unused"},
+    {"name": None, "subject": ["a"], "n": 10 ** 6, "price": 1e-3},
+]
+
+SOURCES = [
+    "Hi {name},\n\nRe: {subject}",
+    "{n:>5} rooms at {price:.2f} ({name!r}, {name!s:^9}, {name!a})",
+    "{{literal}} {name}",
+    "{subject[0]} {name.upper}",
+    "{price:{n}}",
+    "unbalanced {",
+    "stray }",
+    "{0} {}",
+    "{missing}",
+    "",
+    "no fields",
+]
+
+
+def _legacy_render(tpl, ctx):
+    try:
+        return tpl.format(**ctx)
+    except Exception:
+        return tpl
+
+
+@pytest.mark.parametrize("source", SOURCES)
+def test_compiled_matches_str_format(source):
+    compiled = CompiledTemplate("t", source)
+    for ctx in CONTEXTS:
+        assert compiled.render(ctx) == _legacy_render(source, ctx)
+
+
+def test_random_templates_match_str_format():
+    rng = random.Random(0)
+    pieces = ["{name}", "{n:03d}", "{price:.1f}", "{subject!r}", "{{", "}}", "text ", "\n", "{n:x}", "{name:>4}", "{"]
+    for _ in range(2000):
+        source = "".join(rng.choice(pieces) for _ in range(rng.randint(0, 6)))
+        compiled = CompiledTemplate("t", source)
+        for ctx in CONTEXTS:
+            assert compiled.render(ctx) == _legacy_render(source, ctx), (source, ctx)
+
+
+def test_render_template_matches_for_plain_and_compiled(templates):
+    ctx = {"subject": "Plan", "latest_from": "Ana", "latest_email": "a@x.com"}
+    plain = dict(templates)
+    for name in list(plain) + ["no_such_template"]:
+        assert render_template(templates, name, ctx) == render_template(plain, name, ctx)
+    assert compile_templates(plain).keys() == templates.keys()
+
+
+def test_render_stats_are_exact_under_concurrent_renders():
+    from concurrent.futures import ThreadPoolExecutor
+
+    tpl = CompiledTemplate("t", "Hi {name}")
+    contexts = [{"name": "Ana"}, {}] * 2000
+    with ThreadPoolExecutor(8) as pool:
+        list(pool.map(tpl.render, contexts))
+    stats = tpl.stats()
+    assert (stats["renders"], stats["fallbacks"]) == (len(contexts), len(contexts) // 2)
@@ -0,0 +1,64 @@
+import json
+
+from email_behavior_detection.pipeline import classify_thread, thread_from_dict
+from email_behavior_detection.thread_state import ThreadState
+
+
+def _thread(thread_json, n=None):
+    thread = thread_from_dict(json.loads(thread_json))
+    if n is not None:
+        thread.messages = thread.messages[:n]
+    return thread
+
+
+def test_only_new_messages_are_detected(thread_json, detector, templates):
+    full = _thread(thread_json)
+    state = ThreadState()
+    state.classify(_thread(thread_json, len(full.messages) - 1), detector, templates)
+    assert state.evaluated == len(full.messages) - 1
+    assert state.classify(full, detector, templates) == classify_thread(full, detector, templates)
+    assert state.evaluated == 1
+    state.update(full, detector)
+    assert state.evaluated == 0
+    assert len(state) == len({(m.from_name, m.from_email, m.body) for m in full.messages})
+
+
+def test_removed_messages_are_forgotten(thread_json, detector):
+    state = ThreadState()
+    state.update(_thread(thread_json), detector)
+    state.update(_thread(thread_json, 1), detector)
+    assert len(state) == 1
+
+
+def test_detector_version_change_starts_from_scratch(thread_json, detector):
+    thread = _thread(thread_json)
+    state = ThreadState()
+    state.update(thread, detector)
+    stale = ThreadState.from_dict(dict(state.to_dict(), version="old-rules"))
+    assert len(stale) == len(state)
+    assert stale.update(thread, detector) == state.update(thread, detector)
+    assert stale.evaluated == len(thread.messages)
+    assert stale.version == detector.version
+
+
+def test_save_load_round_trip(tmp_path, thread_json, detector, templates):
+    thread = _thread(thread_json)
+    path = str(tmp_path / "state.json")
+    state = ThreadState()
+    expected = state.classify(thread, detector, templates)
+    state.save(path)
+    assert not (tmp_path / "state.json.tmp").exists()
+
+    loaded = ThreadState.load(path)
+    assert loaded.version == detector.version
+    assert loaded.to_dict() == state.to_dict()
+    assert loaded.classify(thread, detector, templates) == expected
+    assert loaded.evaluated == 0
+
+
+def test_missing_or_corrupt_file_loads_empty(tmp_path):
+    assert len(ThreadState.load(str(tmp_path / "missing.json"))) == 0
+    bad = tmp_path / "bad.json"
+    bad.write_text("{not json", encoding="utf-8")
+    state = ThreadState.load(str(bad))
+    assert len(state) == 0 and state.version == ""
@@ -0,0 +1,55 @@
+import json
+
+import pytest
+
+from email_behavior_detection.models import Message, Thread
+from email_behavior_detection.pipeline import thread_from_dict
+from email_behavior_detection.thread_store import ThreadStore
+
+
+def _threads(thread_json):
+    base = thread_from_dict(json.loads(thread_json))
+    extra = Thread(
+        subject="Ünïcode ✓",
+        messages=[
+            Message("2024-01-01T10:00:00", "Zoë", "zoe@x.com", ["a@x.com", "b@x.com"], ["c@x.com"],
+                    "naïve café \U0001f600", {"message_id": "<z@x>", "subject": "Ünïcode ✓"}),
+            Message("2024-01-02T10:00:00", "A", "a@x.com", [], [], ""),
+        ],
+    )
+    return [base, extra, Thread(subject="empty", messages=[])]
+
+
+def test_threads_round_trip(thread_json):
+    threads = _threads(thread_json)
+    store = ThreadStore.from_threads(threads)
+    assert len(store) == 3
+    assert store.message_count == sum(len(t.messages) for t in threads)
+    assert list(store) == threads
+    assert store[-2] == threads[1]
+    assert store.thread(2).messages == []
+
+
+def test_to_and_cc_are_kept_apart_and_meta_is_copied(thread_json):
+    store = ThreadStore.from_threads(_threads(thread_json))
+    msg = store[1].messages[0]
+    assert (msg.to, msg.cc) == (["a@x.com", "b@x.com"], ["c@x.com"])
+    msg.meta["subject"] = "changed"
+    assert store[1].messages[0].meta["subject"] == "Ünïcode ✓"
+    assert store[1].messages[1].meta == {}
+
+
+def test_addresses_are_stored_once(thread_json):
+    store = ThreadStore()
+    store.add(_threads(thread_json)[1])
+    strings = store.nbytes(include_strings=True) - store.nbytes()
+    store.add(_threads(thread_json)[1])
+    assert store.nbytes(include_strings=True) - store.nbytes() == strings
+
+
+def test_index_out_of_range(thread_json):
+    store = ThreadStore.from_threads(_threads(thread_json))
+    with pytest.raises(IndexError):
+        store[3]
+    with pytest.raises(IndexError):
+        store[-4]